@@ -1,38 +1,72 @@
-from langchain_community.chat_models import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from app.core.config import config
+from app.core.llm import GatewayChatModel
+from app.core.telemetry import get_logger
+
+logger = get_logger("agents.answer")
+
+# Returned (or streamed as the last token) when the LLM call fails; the graph marks such states with "error"
+ERROR_ANSWER = "I apologize, but I encountered an error while converting your request into an answer. Please check if the Ollama model is running."
+
+def format_document(doc):
+    return f"Source: {doc.metadata.get('source', 'Unknown')}\nContent: {doc.page_content}"
 
 class AnswerAgent:
-    def __init__(self):
-        self.llm = ChatOllama(model=config.LLM_MODEL, temperature=0.1) # Low temp for factual answers
+    def __init__(self, llm=None):
+        self.llm = llm or GatewayChatModel(temperature=0.1) # Low temp for factual answers
         
         self.prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a helpful assistant. Use the following context to answer the user's question.
+            # The system prompt is fully static and the per-request context follows it, so the
+            # backend can reuse the instructions' KV cache across requests
+            ("system", """You are a helpful assistant. Use the context in the user's message to answer their question.
             If the answer is not in the context, say "I couldn't find the answer in the provided documents."
             Always cite the source (filename) if possible.
             Be concise. Do not repeat yourself.
-            
-            Context:
-            {context}
             """),
-            ("user", "{question}")
+            ("user", "Context:\n{context}\n\nQuestion: {question}")
         ])
         
         self.chain = self.prompt | self.llm | StrOutputParser()
 
+    def _format_context(self, context_docs: list):
+        return "\n\n".join(format_document(doc) for doc in context_docs)
+
     def generate_answer(self, question: str, context_docs: list):
         # Format context
-        context_text = "\n\n".join([f"Source: {doc.metadata.get('source', 'Unknown')}\nContent: {doc.page_content}" for doc in context_docs])
+        context_text = self._format_context(context_docs)
         
-        print(f"Generating answer for: {question}")
+        logger.info("Generating answer", extra={"question": question, "context_docs": len(context_docs)})
         try:
             result = self.chain.invoke({"question": question, "context": context_text})
-            print(f"Answer generated: {result}")
+            logger.info("Answer generated", extra={"chars": len(result)})
             return result
         except Exception as e:
-            print(f"Error generating answer: {e}")
-            return "I apologize, but I encountered an error while converting your request into an answer. Please check if the Ollama model is running."
+            logger.error("Error generating answer", extra={"error": str(e)})
+            return ERROR_ANSWER
+
+    async def agenerate_answer(self, question: str, context_docs: list):
+        context_text = self._format_context(context_docs)
+        
+        logger.info("Generating answer", extra={"question": question, "context_docs": len(context_docs)})
+        try:
+            result = await self.chain.ainvoke({"question": question, "context": context_text})
+            logger.info("Answer generated", extra={"chars": len(result)})
+            return result
+        except Exception as e:
+            logger.error("Error generating answer", extra={"error": str(e)})
+            return ERROR_ANSWER
+
+    async def astream_answer(self, question: str, context_docs: list):
+        # Yields tokens as the LLM produces them instead of waiting for the full completion
+        context_text = self._format_context(context_docs)
+        
+        logger.info("Streaming answer", extra={"question": question, "context_docs": len(context_docs)})
+        try:
+            async for token in self.chain.astream({"question": question, "context": context_text}):
+                yield token
+        except Exception as e:
+            logger.error("Error generating answer", extra={"error": str(e)})
+            yield ERROR_ANSWER
 
 if __name__ == "__main__":
     # Test with dummy context
@@ -0,0 +1,101 @@
+import re
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from app.agents.rerank import truncate_tokens
+from app.core.config import config
+from app.core.llm import GatewayChatModel
+from app.core.telemetry import get_logger
+
+logger = get_logger("agents.condense")
+
+# Questions that lean on earlier turns ("what about the blue one?", "does it ship to Canada?")
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|it's|they|them|their|this|that|these|those|he|she|his|her|there|same|above|previous|"
+    r"earlier|also|instead|else|another|other|one)\b|^(and|but|so|or|what about|how about|why|then)\b")
+
+def looks_like_follow_up(question: str):
+    text = " ".join(question.lower().split())
+    return len(text.split()) <= 3 or bool(FOLLOW_UP_PATTERN.search(text))
+
+class CondenseAgent:
+    """Turns a follow-up into a standalone question, and folds old turns into a running summary,
+    so the prompt stays the same size however long the conversation runs."""
+
+    def __init__(self, llm=None):
+        self.llm = llm or GatewayChatModel(temperature=0)
+
+        self.rewrite_prompt = ChatPromptTemplate.from_messages([
+            ("system", """Rewrite the user's follow-up question as a standalone question that can be understood without the conversation.
+            Resolve pronouns and references using the conversation. Keep names, codes and numbers exactly.
+            If the question is already standalone, return it unchanged.
+            Return ONLY the question.
+            """),
+            ("user", "Conversation summary:\n{summary}\n\nRecent turns:\n{history}\n\nFollow-up question: {question}")
+        ])
+        self.summary_prompt = ChatPromptTemplate.from_messages([
+            ("system", """Maintain a short running summary of a support conversation.
+            Merge the new exchange into the summary. Keep product names, error codes, order numbers and decisions.
+            Return ONLY the updated summary.
+            """),
+            ("user", "Summary so far:\n{summary}\n\nNew exchange:\n{exchange}")
+        ])
+        self.rewrite_chain = self.rewrite_prompt | self.llm | StrOutputParser()
+        self.summary_chain = self.summary_prompt | self.llm | StrOutputParser()
+
+    @staticmethod
+    def format_turn(turn: dict):
+        answer = truncate_tokens(turn.get("answer", ""), config.MEMORY_ANSWER_TOKENS)
+        return f"User: {turn['question']}\nAssistant: {answer}"
+
+    def _rewrite_inputs(self, question: str, summary: str, turns: list):
+        return {"question": question, "summary": summary or "(none)",
+                "history": "\n\n".join(self.format_turn(turn) for turn in turns) or "(none)"}
+
+    def _clean(self, question: str, rewritten: str):
+        rewritten = rewritten.strip().strip('"').strip()
+        return rewritten.splitlines()[0] if rewritten else question
+
+    def condense(self, question: str, summary: str, turns: list):
+        if not turns and not summary or not looks_like_follow_up(question):
+            return question
+        try:
+            rewritten = self._clean(question, self.rewrite_chain.invoke(self._rewrite_inputs(question, summary, turns)))
+            logger.info("Condensed follow-up", extra={"question": question, "standalone": rewritten})
+            return rewritten
+        except Exception as e:
+            logger.warning("Follow-up rewrite failed", extra={"error": str(e)})
+            return question
+
+    async def acondense(self, question: str, summary: str, turns: list):
+        if not turns and not summary or not looks_like_follow_up(question):
+            return question
+        try:
+            rewritten = self._clean(question, await self.rewrite_chain.ainvoke(
+                self._rewrite_inputs(question, summary, turns)))
+            logger.info("Condensed follow-up", extra={"question": question, "standalone": rewritten})
+            return rewritten
+        except Exception as e:
+            logger.warning("Follow-up rewrite failed", extra={"error": str(e)})
+            return question
+
+    def summarize(self, summary: str, turn: dict):
+        try:
+            updated = self.summary_chain.invoke({"summary": summary or "(none)", "exchange": self.format_turn(turn)})
+            return truncate_tokens(updated.strip(), config.MEMORY_SUMMARY_TOKENS)
+        except Exception as e:
+            logger.warning("Summary update failed", extra={"error": str(e)})
+            return summary
+
+    async def asummarize(self, summary: str, turn: dict):
+        try:
+            updated = await self.summary_chain.ainvoke({"summary": summary or "(none)",
+                                                        "exchange": self.format_turn(turn)})
+            return truncate_tokens(updated.strip(), config.MEMORY_SUMMARY_TOKENS)
+        except Exception as e:
+            logger.warning("Summary update failed", extra={"error": str(e)})
+            return summary
+
+if __name__ == "__main__":
+    agent = CondenseAgent()
+    turns = [{"question": "What does error E4 mean on the X200 router?", "answer": "E4 means the WAN cable is unplugged."}]
+    print(agent.condense("How do I fix it?", "", turns))
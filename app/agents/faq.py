@@ -0,0 +1,61 @@
+import json
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from app.core.config import config
+from app.core.llm import GatewayChatModel
+from app.core.telemetry import get_logger
+
+logger = get_logger("agents.faq")
+
+class FAQAgent:
+    """Writes the questions a customer could ask that a chunk answers, with short answers taken from it."""
+
+    def __init__(self, llm=None, pairs_per_chunk=config.FAQ_PAIRS_PER_CHUNK, concurrency=config.FAQ_CONCURRENCY):
+        self.llm = llm or GatewayChatModel(format="json", temperature=0)
+        self.pairs_per_chunk = pairs_per_chunk
+        self.concurrency = concurrency
+
+        self.prompt = ChatPromptTemplate.from_messages([
+            ("system", """You write FAQ entries for a customer support knowledge base.
+            Given a passage from a manual or policy document, write the questions a customer would ask that the passage fully answers.
+            Each answer must be short, self-contained and use only facts from the passage.
+            Skip passages that are tables of contents, legal boilerplate or too fragmentary to answer anything.
+            Return ONLY a JSON object with the following format:
+            {{"pairs": [{{"question": "...", "answer": "..."}}]}}
+            """),
+            ("user", "Source: {source}\nPassage:\n{passage}")
+        ])
+        self.chain = self.prompt | self.llm | StrOutputParser()
+
+    def _parse(self, text: str):
+        data = json.loads(text)
+        pairs = data.get("pairs", []) if isinstance(data, dict) else data
+        parsed = []
+        for pair in pairs if isinstance(pairs, list) else []:
+            if not isinstance(pair, dict):
+                continue
+            question, answer = str(pair.get("question", "")).strip(), str(pair.get("answer", "")).strip()
+            if question and answer:
+                parsed.append({"question": question, "answer": answer})
+        return parsed[:self.pairs_per_chunk]
+
+    def generate(self, chunks: list):
+        # One list of {"question", "answer"} per chunk; None where generation failed (retried on the next ingest)
+        inputs = [{"source": doc.metadata.get("source", "unknown"), "passage": doc.page_content} for doc in chunks]
+        outputs = self.chain.batch(inputs, config={"max_concurrency": self.concurrency}, return_exceptions=True)
+        results = []
+        for doc, output in zip(chunks, outputs):
+            try:
+                if isinstance(output, Exception):
+                    raise output
+                results.append(self._parse(output))
+            except Exception as e:
+                logger.warning("FAQ generation failed", extra={"chunk_id": doc.metadata.get("chunk_id"), "error": str(e)})
+                results.append(None)
+        return results
+
+if __name__ == "__main__":
+    from langchain_core.documents import Document
+    agent = FAQAgent()
+    print(agent.generate([Document(page_content="Hold the Wi-Fi button for 3 seconds to reset the wireless settings.",
+                                   metadata={"source": "manual.txt"})]))
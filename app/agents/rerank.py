@@ -0,0 +1,163 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+import numpy as np
+from langchain_core.documents import Document
+from app.agents.answer import format_document
+from app.core.config import config
+from app.core.embeddings import CachedEmbeddings
+from app.core.telemetry import CONTEXT_TOKENS, CONTEXT_TOKENS_SAVED, get_logger
+
+logger = get_logger("agents.rerank")
+
+SEPARATOR_TOKENS = 2 # The "\n\n" between context chunks
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(config.CONTEXT_TOKENIZER)
+    except Exception as e:
+        # tiktoken downloads its BPE files on first use; offline, fall back to ~4 characters per token
+        logger.warning("tiktoken unavailable, estimating token counts", extra={"error": str(e)})
+        return None
+
+def count_tokens(text: str):
+    encoding = _encoding()
+    return len(encoding.encode(text)) if encoding else (len(text) + 3) // 4
+
+def truncate_tokens(text: str, max_tokens: int):
+    encoding = _encoding()
+    if encoding:
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    return text[:max_tokens * 4]
+
+@dataclass
+class RerankResult:
+    documents: list
+    stats: dict = field(default_factory=dict)
+
+class RerankAgent:
+    def __init__(self, embeddings=None, model_name=config.RERANK_MODEL,
+                 token_budget=config.CONTEXT_TOKEN_BUDGET, duplicate_threshold=config.RERANK_DUPLICATE_THRESHOLD):
+        self.embeddings = embeddings or CachedEmbeddings()
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.cross_encoder = None
+        if model_name:
+            try:
+                from sentence_transformers import CrossEncoder
+                self.cross_encoder = CrossEncoder(model_name)
+                logger.info("Loaded cross-encoder reranker", extra={"model": model_name})
+            except Exception as e:
+                logger.warning("Cross-encoder unavailable, reranking by embedding similarity",
+                               extra={"model": model_name, "error": str(e)})
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _pack(self, docs: list, query_vector, doc_vectors, cross_scores, start: float):
+        doc_vectors = self._normalize(doc_vectors)
+        if cross_scores is not None:
+            scores = np.asarray(cross_scores, dtype=np.float32)
+        else:
+            scores = doc_vectors @ self._normalize(query_vector)
+
+        tokens = [count_tokens(format_document(doc)) + SEPARATOR_TOKENS for doc in docs]
+        kept, duplicates, over_budget, used = [], 0, 0, 0
+        for i in np.argsort(-scores, kind="stable"):
+            # Near-duplicates of a better-ranked chunk add tokens but no information
+            if kept and float(np.max(doc_vectors[kept] @ doc_vectors[i])) >= self.duplicate_threshold:
+                duplicates += 1
+                continue
+            # Greedy packing: skip chunks that don't fit, a shorter lower-ranked one still might
+            if used + tokens[i] > self.token_budget:
+                over_budget += 1
+                continue
+            kept.append(int(i))
+            used += tokens[i]
+
+        packed = [docs[i] for i in kept]
+        if not packed and docs:
+            # Nothing fits whole: keep the best chunk, cut to the budget
+            best = docs[int(np.argmax(scores))]
+            overhead = count_tokens(format_document(Document(page_content="", metadata=best.metadata)))
+            content = truncate_tokens(best.page_content, max(self.token_budget - overhead - SEPARATOR_TOKENS, 0))
+            packed = [Document(page_content=content, metadata=best.metadata)]
+            used = count_tokens(format_document(packed[0])) + SEPARATOR_TOKENS
+
+        tokens_in = sum(tokens)
+        stats = {
+            "scorer": "cross-encoder" if cross_scores is not None else "embedding",
+            "candidates": len(docs),
+            "kept": len(packed),
+            "duplicates": duplicates,
+            "over_budget": over_budget,
+            "tokens_in": tokens_in,
+            "tokens_out": used,
+            "tokens_saved": tokens_in - used,
+            "ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+        CONTEXT_TOKENS.inc(tokens_in, stage="candidates")
+        CONTEXT_TOKENS.inc(used, stage="packed")
+        CONTEXT_TOKENS_SAVED.inc(tokens_in - used)
+        logger.info("Reranked context", extra={"rerank": stats})
+        return RerankResult(packed, stats)
+
+    def rerank(self, question: str, docs: list):
+        # Rescore, drop near-duplicates, then pack the best chunks into the token budget
+        start = time.perf_counter()
+        if not docs:
+            return RerankResult([], {"candidates": 0, "kept": 0, "tokens_saved": 0})
+        try:
+            texts = [doc.page_content for doc in docs]
+            doc_vectors = self.embeddings.embed_documents(texts)
+            query_vector = None
+            cross_scores = None
+            if self.cross_encoder is not None:
+                cross_scores = self.cross_encoder.predict([(question, text) for text in texts])
+            else:
+                query_vector = self.embeddings.embed_query(question)
+            return self._pack(docs, query_vector, doc_vectors, cross_scores, start)
+        except Exception as e:
+            # Reranking is an optimization: on failure, answer from the fused retrieval order
+            logger.error("Rerank error", extra={"error": str(e)})
+            return RerankResult(docs, {"error": str(e)})
+
+    async def arerank(self, question: str, docs: list):
+        start = time.perf_counter()
+        if not docs:
+            return RerankResult([], {"candidates": 0, "kept": 0, "tokens_saved": 0})
+        try:
+            texts = [doc.page_content for doc in docs]
+            query_vector = None
+            cross_scores = None
+            if self.cross_encoder is not None:
+                doc_vectors, cross_scores = await asyncio.gather(
+                    self.embeddings.aembed_documents(texts),
+                    asyncio.to_thread(self.cross_encoder.predict, [(question, text) for text in texts]),
+                )
+            else:
+                doc_vectors, query_vector = await asyncio.gather(
+                    self.embeddings.aembed_documents(texts), self.embeddings.aembed_query(question)
+                )
+            return self._pack(docs, query_vector, doc_vectors, cross_scores, start)
+        except Exception as e:
+            logger.error("Rerank error", extra={"error": str(e)})
+            return RerankResult(docs, {"error": str(e)})
+
+if __name__ == "__main__":
+    agent = RerankAgent()
+    docs = [
+        Document(page_content="Refunds are processed within 30 days.", metadata={"source": "policy.pdf"}),
+        Document(page_content="Refunds are processed within 30 days.", metadata={"source": "policy_copy.pdf"}),
+        Document(page_content="Our office is closed on public holidays.", metadata={"source": "hours.txt"}),
+    ]
+    result = agent.rerank("How long do refunds take?", docs)
+    print(result.stats)
+    for doc in result.documents:
+        print(f"{doc.metadata.get('source')}: {doc.page_content}")
@@ -1,71 +1,144 @@
+import asyncio
+import logging
 import os
-import pickle
-from langchain_community.vectorstores import Milvus
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.retrievers import BM25Retriever
-from langchain.retrievers import EnsembleRetriever
+import threading
+import time
 from app.core.config import config
+from app.core.embeddings import CachedEmbeddings
+from app.core.telemetry import RETRIEVAL_HITS, SPAN_SECONDS, get_logger
+from app.index.generations import GenerationWatcher, legacy_generation
+from app.index.hybrid import HybridResult, HybridRetriever, RetrievalLeg
+from app.index.sparse import SparseIndex, SparseRetriever
+from app.index.vector_store import create_vector_store, supports_filter
+
+logger = get_logger("agents.retrieval")
 
 class RetrievalAgent:
-    def __init__(self):
-        print("Initializing Retrieval Agent...")
-        self.embeddings = OllamaEmbeddings(
-            model=config.EMBEDDING_MODEL,
-            base_url=config.OLLAMA_BASE_URL
-        )
-        self.vector_store = Milvus(
-            embedding_function=self.embeddings,
-            collection_name=config.COLLECTION_NAME,
-            connection_args={"host": config.MILVUS_HOST, "port": config.MILVUS_PORT}
-        )
-        self.milvus_retriever = self.vector_store.as_retriever(search_kwargs={"k": 5})
+    def __init__(self, embeddings=None, vector_store=None):
+        logger.info("Initializing Retrieval Agent")
+        self.embeddings = embeddings or CachedEmbeddings()
+        # Search the published index generation; without an explicit vector store, also switch to
+        # each new one ingestion publishes (see app/index/generations.py)
+        watcher = GenerationWatcher()
+        self.generation = watcher.current()
+        self.generations = watcher if vector_store is None else None
+        self.reloads = 0
+        self._failed = (None, 0.0) # Generation that failed to open, and when
+        self._reload_lock = threading.Lock()
+        self._open(self.generation or legacy_generation(), vector_store)
+
+    def _open(self, generation, vector_store=None):
+        vector_store = vector_store or create_vector_store(self.embeddings, generation)
+        milvus_retriever = vector_store.as_retriever(search_kwargs={"k": config.HYBRID_LEG_K})
+        legs = [RetrievalLeg("dense", milvus_retriever, config.HYBRID_DENSE_WEIGHT,
+                             config.HYBRID_DENSE_TIMEOUT_SECONDS, filterable=supports_filter(vector_store))]
         
-        # Load chunks for BM25
-        self.ensemble_retriever = None
-        data_path = "data/chunks.pkl"
-        if os.path.exists(data_path):
-            print("Loading chunks for Hybrid Search (BM25)...")
+        # Load the memory-mapped BM25 index written by ingestion
+        bm25_retriever = None
+        if os.path.exists(os.path.join(generation.sparse_dir, "meta.json")):
+            logger.info("Loading sparse index for Hybrid Search (BM25)")
             try:
-                with open(data_path, "rb") as f:
-                    chunks = pickle.load(f)
+                index = SparseIndex(generation.sparse_dir)
                 
-                if chunks:
-                    print(f"Loaded {len(chunks)} chunks for BM25.")
-                    self.bm25_retriever = BM25Retriever.from_documents(chunks)
-                    self.bm25_retriever.k = 5
-                    
-                    # Create Ensemble (Hybrid)
-                    # Weights: 0.5 Dense (Milvus) + 0.5 Sparse (BM25)
-                    self.ensemble_retriever = EnsembleRetriever(
-                        retrievers=[self.milvus_retriever, self.bm25_retriever],
-                        weights=[0.5, 0.5]
-                    )
-                    print("Hybrid Search Enabled.")
+                if len(index):
+                    logger.info("Mapped sparse index", extra={"chunks": len(index)})
+                    bm25_retriever = SparseRetriever(index=index, k=config.HYBRID_LEG_K)
+                    legs.append(RetrievalLeg("sparse", bm25_retriever, config.HYBRID_SPARSE_WEIGHT,
+                                             config.HYBRID_SPARSE_TIMEOUT_SECONDS, filterable=True))
+                    logger.info("Hybrid Search Enabled")
                 else:
-                    print("Chunks file is empty.")
+                    logger.warning("Sparse index is empty")
             except Exception as e:
-                print(f"Error loading BM25: {e}")
+                logger.error("Error loading BM25", extra={"error": str(e)})
+        else:
+            logger.warning("No sparse index found. Hybrid search disabled (dense only)")
+
+        # Dense and sparse legs run concurrently and are fused with weighted RRF. Searches take the
+        # hybrid retriever once, so both legs of a search read the same generation.
+        self.vector_store, self.milvus_retriever, self.bm25_retriever = vector_store, milvus_retriever, bm25_retriever
+        self.hybrid_retriever = HybridRetriever(legs)
+
+    def _newer_generation(self):
+        if self.generations is None:
+            return None
+        generation = self.generations.current()
+        if generation is None or generation == self.generation:
+            return None
+        if self._failed[0] == generation and time.time() - self._failed[1] < config.AGENT_INIT_RETRY_SECONDS:
+            return None
+        return generation
+
+    def current(self):
+        # The hybrid retriever over the published generation, reopened when a newer one was published
+        generation = self._newer_generation()
+        if generation is not None:
+            with self._reload_lock:
+                if generation != self.generation:
+                    logger.info("Switching to new index generation",
+                                extra={"old": self.generation and self.generation.id, "new": generation.id})
+                    try:
+                        self._open(generation)
+                    except Exception as e:
+                        # Keep serving the old generation (e.g. Milvus is down) and try again later
+                        logger.error("Could not open index generation", extra={"generation": generation.id,
+                                                                                "error": str(e)})
+                        self._failed = (generation, time.time())
+                        return self.hybrid_retriever
+                    self.generation = generation
+                    self.reloads += 1
+        return self.hybrid_retriever
+
+    def index_stats(self):
+        return {"generation": self.generation.id if self.generation else None, "reloads": self.reloads}
+
+    def _report(self, result: HybridResult):
+        for leg, timing in result.timings.items():
+            RETRIEVAL_HITS.observe(timing["hits"], leg=leg)
+            SPAN_SECONDS.observe(timing["ms"] / 1000, span=f"retrieval.{leg}")
+        if result.error:
+            logger.error("Retrieval error", extra={"error": result.error, "legs": result.timings})
         else:
-            print("No chunks.pkl found. Hybrid search disabled (Milvus only).")
+            logger.info("Search complete", extra={"documents": len(result.documents), "legs": result.timings})
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, doc in enumerate(result.documents):
+                logger.debug("Retrieved chunk", extra={"rank": i, "preview": doc.page_content[:200]})
+        return result
 
-    def retrieve(self, query: str):
-        print(f"Retrieving for: {query}")
+    def search(self, query: str, filter: dict = None):
+        # Like retrieve(), but also returns per-leg timings. A metadata filter (from the router) is pushed
+        # down into the legs; if nothing matches it, the search is repeated unfiltered.
+        logger.info("Retrieving", extra={"query": query, "filter": filter})
         try:
-            if self.ensemble_retriever:
-                docs = self.ensemble_retriever.invoke(query)
-                print(f"Hybrid Search found {len(docs)} documents.")
-            else:
-                docs = self.milvus_retriever.invoke(query)
-                print(f"Vector Search found {len(docs)} documents.")
-            
-            for i, doc in enumerate(docs):
-                print(f"Doc {i}: {doc.page_content[:200]}...")
+            hybrid_retriever = self.current()
+            result = hybrid_retriever.retrieve(query, filter=filter)
+            if filter and not result.documents and not result.error:
+                logger.info("No documents match the filter, searching unfiltered", extra={"filter": filter})
+                result = hybrid_retriever.retrieve(query)
+            return self._report(result)
+        except Exception as e:
+            logger.error("Retrieval error", extra={"error": str(e)})
+            # Do not crash, return no documents so AnswerAgent can try (or fail gracefully with 'no context')
+            return HybridResult([], {}, error=str(e))
 
-            return docs
+    async def asearch(self, query: str, filter: dict = None):
+        logger.info("Retrieving", extra={"query": query, "filter": filter})
+        try:
+            # Opening a new generation (mmaps, Milvus collection load) stays off the event loop
+            hybrid_retriever = await asyncio.to_thread(self.current) if self._newer_generation() else self.current()
+            result = await hybrid_retriever.aretrieve(query, filter=filter)
+            if filter and not result.documents and not result.error:
+                logger.info("No documents match the filter, searching unfiltered", extra={"filter": filter})
+                result = await hybrid_retriever.aretrieve(query)
+            return self._report(result)
         except Exception as e:
-            print(f"CRITICAL RETRIEVAL ERROR: {e}")
-            # Do not crash, return empty list so AnswerAgent can try (or fail gracefully with 'no context')
-            return []
+            logger.error("Retrieval error", extra={"error": str(e)})
+            return HybridResult([], {}, error=str(e))
+
+    def retrieve(self, query: str, filter: dict = None):
+        return self.search(query, filter).documents
+
+    async def aretrieve(self, query: str, filter: dict = None):
+        return (await self.asearch(query, filter)).documents
 
 if __name__ == "__main__":
     agent = RetrievalAgent()
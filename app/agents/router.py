@@ -1,11 +1,81 @@
-from langchain_community.chat_models import ChatOllama
+import asyncio
+import re
+import numpy as np
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
+from app.core.concurrency import stage_limiter
 from app.core.config import config
+from app.core.llm import GatewayChatModel
+from app.core.telemetry import get_logger
+
+logger = get_logger("agents.router")
+
+# Tier 1: patterns that are unambiguous enough to skip the LLM
+# Only aggregations over the orders table; anything looser (e.g. "how many days do I have to return my order")
+# catches policy questions, so those are left to the centroid and LLM tiers
+NOT_POLICY = r"(?! (i|you|we|a customer|customers) (can|may|could|should|must)\b)"
+RULES = [
+    ("structured_query", re.compile(r"\bhow many (\w+ ){0,2}orders (are|were|did|do we|does|have|has|in|with|from|by|over|under|above|below)\b"
+                                    r"|\bhow many (\w+ ){0,2}orders\W*$")),
+    ("structured_query", re.compile(r"\b(count|total|sum|average|avg|mean|median|max(imum)?|min(imum)?|highest|lowest)\b( \w+){0,3} "
+                                    r"(of|across|over|for) (all |the |our |every )?(\w+ )?orders\b" + NOT_POLICY)),
+    ("structured_query", re.compile(r"\b(average|avg|mean|median|total|sum)( \w+)? order (prices?|values?|amounts?|totals?)\b")),
+    ("structured_query", re.compile(r"^count (the |all )?(\w+ )?orders\b")),
+    ("structured_query", re.compile(r"\b(list|show)( me)? (all|every)\b.*\borders?\b")),
+    ("general_chat", re.compile(r"^(hi|hello|hey|howdy|yo|good (morning|afternoon|evening)|thanks|thank you|bye|goodbye)\b[\w\s,!.?']{0,20}$")),
+    ("general_chat", re.compile(r"^(who|what) are you\b.{0,10}$")),
+    ("general_chat", re.compile(r"^how are you\b.{0,10}$")),
+]
+
+# Hints that narrow vector search to some document types, or to a file named in the question
+TYPE_HINTS = [
+    (["excel", "csv"], re.compile(r"\b(spreadsheets?|excel|xlsx|csv)\b")),
+    (["pdf"], re.compile(r"\bpdfs?\b")),
+    (["pptx"], re.compile(r"\b(slides?|slide decks?|presentations?|powerpoint|pptx)\b")),
+    (["docx"], re.compile(r"\b(word (documents?|files?)|docx)\b")),
+]
+FILENAME_PATTERN = re.compile(r"[\w\-]+\.(pdf|txt|docx|pptx|xlsx|xls|csv)\b", re.I)
+
+# Tier 2: seed questions per route; their mean embeddings are the class centroids
+ROUTE_EXAMPLES = {
+    "vector_store": [
+        "What is the refund policy?",
+        "How do I reset the Wi-Fi on my router?",
+        "What does a blinking amber light mean?",
+        "What does error code E4 mean?",
+        "How long does shipping take according to the policy?",
+        "How do I return a damaged product?",
+        "What is the warranty period?",
+        "Steps to troubleshoot the device when it won't turn on",
+    ],
+    "structured_query": [
+        "How many orders are there?",
+        "What is the average price of pending orders?",
+        "List all orders with status Shipped",
+        "What is the total value of all orders?",
+        "Which customer placed the most orders?",
+        "Show the five most expensive orders",
+        "How many orders were cancelled last month?",
+        "What is the status of order 1042?",
+    ],
+    "general_chat": [
+        "Hi, how are you?",
+        "Hello there",
+        "Thanks for your help!",
+        "Who are you?",
+        "What can you do?",
+        "Tell me a joke",
+        "Good morning",
+        "Goodbye",
+    ],
+}
 
 class RouterAgent:
-    def __init__(self):
-        self.llm = ChatOllama(model=config.LLM_MODEL, format="json", temperature=0)
+    def __init__(self, llm=None, embeddings=None, fast_path=config.ROUTER_FAST_PATH_ENABLED):
+        self.llm = llm or GatewayChatModel(format="json", temperature=0)
+        self.embeddings = embeddings if fast_path else None
+        self.fast_path = fast_path
+        self._centroids = None # (labels, unit-norm centroid matrix), built on first use
         
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are an expert query router. Your job is to route the user's query to the correct data source.
@@ -26,16 +96,155 @@ class RouterAgent:
         
         self.chain = self.prompt | self.llm | JsonOutputParser()
 
+    @staticmethod
+    def _search_filter(question: str):
+        # Metadata filter for the retrieval node, e.g. {"type": ["excel", "csv"]} or {"source": "manual.pdf"}
+        filenames = [match.group(0) for match in FILENAME_PATTERN.finditer(question)]
+        if filenames:
+            return {"source": filenames[0] if len(filenames) == 1 else filenames}
+        text = question.lower()
+        types = [t for types, pattern in TYPE_HINTS if pattern.search(text) for t in types]
+        return {"type": types} if types else None
+
+    def speculative_filter(self, question: str):
+        # The filter retrieval would get if the question routes to vector_store (for speculative retrieval)
+        return self._with_filter(question, {"datasource": "vector_store"}).get("filter")
+
+    def _with_filter(self, question: str, result: dict):
+        if config.ROUTER_FILTER_ENABLED and result.get("datasource") in ("vector_store", "excel_sheet"):
+            search_filter = self._search_filter(question)
+            if search_filter is None and result["datasource"] == "excel_sheet":
+                search_filter = {"type": ["excel", "csv"]}
+            if search_filter:
+                result["filter"] = search_filter
+        return result
+
+    def _match_rules(self, question: str):
+        text = " ".join(question.lower().split())
+        for datasource, pattern in RULES:
+            if pattern.search(text):
+                return {"datasource": datasource, "reasoning": f"Matched rule /{pattern.pattern}/", "tier": "rules"}
+        return None
+
+    @staticmethod
+    def _unit_rows(vectors):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def _build_centroids(self, vectors_by_label):
+        labels = list(vectors_by_label)
+        centroids = np.stack([self._unit_rows(vectors_by_label[label]).mean(axis=0) for label in labels])
+        self._centroids = (labels, self._unit_rows(centroids))
+
+    def _ensure_centroids(self):
+        if self._centroids is None:
+            self._build_centroids({label: self.embeddings.embed_documents(examples)
+                                   for label, examples in ROUTE_EXAMPLES.items()})
+
+    async def _aensure_centroids(self):
+        if self._centroids is None:
+            self._build_centroids({label: await self.embeddings.aembed_documents(examples)
+                                   for label, examples in ROUTE_EXAMPLES.items()})
+
+    def _classify(self, vector):
+        labels, centroids = self._centroids
+        scores = centroids @ self._unit_rows(vector)
+        order = np.argsort(scores)[::-1]
+        best, runner_up = float(scores[order[0]]), float(scores[order[1]])
+        if best >= config.ROUTER_CENTROID_MIN_SIMILARITY and best - runner_up >= config.ROUTER_CENTROID_MARGIN:
+            return {"datasource": labels[order[0]],
+                    "reasoning": f"Nearest centroid (similarity {best:.2f}, margin {best - runner_up:.2f})",
+                    "tier": "centroid"}
+        return None
+
+    def _fast_route(self, question: str):
+        result = self._match_rules(question) if self.fast_path else None
+        if result is None and self.embeddings is not None:
+            try:
+                self._ensure_centroids()
+                result = self._classify(self.embeddings.embed_query(question))
+            except Exception as e:
+                logger.warning("Centroid routing error", extra={"error": str(e)})
+        return result
+
+    async def _afast_route(self, question: str):
+        result = self._match_rules(question) if self.fast_path else None
+        if result is None and self.embeddings is not None:
+            try:
+                await self._aensure_centroids()
+                result = self._classify(await self.embeddings.aembed_query(question))
+            except Exception as e:
+                logger.warning("Centroid routing error", extra={"error": str(e)})
+        return result
+
     def route(self, question: str):
-        print(f"Routing query: {question}")
+        logger.info("Routing query", extra={"question": question})
+        result = self._fast_route(question)
+        if result is not None:
+            result = self._with_filter(question, result)
+            logger.info("Route decision", extra={"route": result})
+            return result
         try:
             result = self.chain.invoke({"question": question})
-            print(f"Route decision: {result}")
+            result["tier"] = "llm"
+            result = self._with_filter(question, result)
+            logger.info("Route decision", extra={"route": result})
+            return result
+        except Exception as e:
+            logger.error("Routing error", extra={"error": str(e)})
+            return {"datasource": "general_chat", "reasoning": "Error in routing, defaulting to general chat"}
+
+    async def _allm_route(self, question: str):
+        try:
+            result = await self.chain.ainvoke({"question": question})
+            result["tier"] = "llm"
+            result = self._with_filter(question, result)
+            logger.info("Route decision", extra={"route": result})
             return result
         except Exception as e:
-            print(f"Routing error: {e}")
+            logger.error("Routing error", extra={"error": str(e)})
             return {"datasource": "general_chat", "reasoning": "Error in routing, defaulting to general chat"}
 
+    async def aroute(self, question: str):
+        logger.info("Routing query", extra={"question": question})
+        result = await self._afast_route(question)
+        if result is not None:
+            result = self._with_filter(question, result)
+            logger.info("Route decision", extra={"route": result})
+            return result
+        return await self._allm_route(question)
+
+    async def aroute_batch(self, questions: list):
+        # Rules per question, then one batched embedding pass for the centroid tier, then the LLM
+        # (concurrently) for whatever is left
+        results = [self._match_rules(q) if self.fast_path else None for q in questions]
+        results = [result and self._with_filter(q, result) for q, result in zip(questions, results)]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending and self.embeddings is not None:
+            try:
+                await self._aensure_centroids()
+                texts = [questions[i] for i in pending]
+                if hasattr(self.embeddings, "aembed_queries"):
+                    vectors = await self.embeddings.aembed_queries(texts)
+                else:
+                    vectors = await asyncio.gather(*(self.embeddings.aembed_query(text) for text in texts))
+                for i, vector in zip(pending, vectors):
+                    results[i] = self._classify(vector)
+                    if results[i] is not None:
+                        results[i] = self._with_filter(questions[i], results[i])
+            except Exception as e:
+                logger.warning("Centroid routing error", extra={"error": str(e)})
+        pending = [i for i, result in enumerate(results) if result is None]
+
+        async def llm_route(question):
+            async with stage_limiter.stage("router"):
+                return await self._allm_route(question)
+        for i, result in zip(pending, await asyncio.gather(*(llm_route(questions[i]) for i in pending))):
+            results[i] = result
+        logger.info("Routed batch", extra={"questions": len(questions), "llm": len(pending)})
+        return results
+
 if __name__ == "__main__":
     # Test the router
     router = RouterAgent()
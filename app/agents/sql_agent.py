@@ -1,35 +1,207 @@
+import asyncio
+import os
+import re
+import threading
+from collections import OrderedDict
+from sqlalchemy import create_engine, event, text
 from langchain_community.utilities import SQLDatabase
 from langchain_community.agent_toolkits import create_sql_agent
 from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
-from langchain_community.chat_models import ChatOllama
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
 from app.core.config import config
+from app.core.llm import GatewayChatModel
+from app.core.shared_cache import SharedCache
+from app.core.telemetry import get_logger, span
+
+logger = get_logger("agents.sql")
+
+ERROR_ANSWER = "I encountered an error querying the database."
+
+WRITE_KEYWORDS = re.compile(r"\b(insert|update|delete|drop|alter|create|replace|attach|detach|pragma|vacuum)\b", re.I)
+
+def extract_sql(llm_output: str):
+    match = re.search(r"```(?:sql)?\s*(.*?)```", llm_output, re.S | re.I)
+    sql = (match.group(1) if match else llm_output).strip()
+    return sql.rstrip(";").strip()
+
+def normalize_sql(sql: str):
+    return " ".join(sql.split()).rstrip(";").lower()
+
+def is_read_only(sql: str):
+    return bool(re.match(r"^\s*(select|with)\b", sql, re.I)) and ";" not in sql and not WRITE_KEYWORDS.search(sql)
+
+def format_result(sql: str, columns: list, rows: list, max_rows: int = config.SQL_MAX_RESULT_ROWS):
+    if len(rows) == 1 and len(columns) == 1:
+        body = f"**{columns[0]}**: {rows[0][0]}"
+    elif not rows:
+        body = "The query returned no rows."
+    else:
+        header = "| " + " | ".join(str(c) for c in columns) + " |\n|" + "---|" * len(columns)
+        lines = ["| " + " | ".join(str(v) for v in row) + " |" for row in rows[:max_rows]]
+        body = header + "\n" + "\n".join(lines)
+        if len(rows) > max_rows:
+            body += f"\n\n_Showing {max_rows} of {len(rows)} rows._"
+    return f"{body}\n\nSQL: `{sql}`"
 
 class SQLAgent:
-    def __init__(self):
-        # Initialize DB
-        self.db = SQLDatabase.from_uri("sqlite:///data/orders.db")
+    def __init__(self, llm=None, db_uri=config.SQL_DB_URI, fast_path=config.SQL_FAST_PATH_ENABLED,
+                 shared_path=config.SHARED_CACHE_PATH, raw_result=config.SQL_RAW_RESULT_ENABLED):
+        self.db_uri = db_uri
+        self.db_path = db_uri[len("sqlite:///"):] if db_uri.startswith("sqlite:///") else None
+        self.fast_path = fast_path
+        self.raw_result = raw_result
         
         # Initialize LLM
-        self.llm = ChatOllama(model=config.LLM_MODEL, temperature=0)
+        self.llm = llm or GatewayChatModel(temperature=0)
+        
+        self.sql_prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are a SQLite expert. Write ONE read-only SQLite query that answers the user's question.
+            Use only the tables and columns below. Return ONLY the SQL, no explanation.
+            
+            Schema and sample rows:
+            {schema}
+            """),
+            ("user", "{question}")
+        ])
+        self.sql_chain = self.sql_prompt | self.llm | StrOutputParser()
+        
+        self.answer_prompt = ChatPromptTemplate.from_messages([
+            ("system", """Answer the user's question from the result of the SQL query below, in plain language.
+            Use only the result. Be concise.
+            """),
+            ("user", "Question: {question}\n\nQuery result:\n{result}")
+        ])
+        self.answer_chain = self.answer_prompt | self.llm | StrOutputParser()
+        
+        # Results by normalized SQL; cleared whenever the database file changes. With shared_path they are
+        # shared by all API workers, tagged with the database file's signature instead of being cleared.
+        self.result_cache = OrderedDict()
+        self.shared = SharedCache(shared_path, "sql_results", config.SQL_RESULT_CACHE_MAX_ENTRIES) if shared_path else None
+        self.cache_stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._db_signature = None
+        self.engine = create_engine(self.db_uri)
+        if self.engine.dialect.name == "sqlite":
+            # The database refuses writes itself, whatever SQL the fast path or the agent loop sends
+            event.listen(self.engine, "connect", lambda conn, _: conn.execute("PRAGMA query_only = ON"))
+        self._load_database()
+
+    def _signature(self):
+        if not self.db_path or not os.path.exists(self.db_path):
+            return None
+        stat = os.stat(self.db_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load_database(self):
+        # (Re)read the schema, precompute the schema prompt, and (re)create the agent loop used as fallback.
+        # The engine is kept; its pooled connections are closed so new ones open the rewritten file.
+        self.engine.dispose()
+        self.db = SQLDatabase(self.engine, sample_rows_in_table_info=config.SQL_SAMPLE_ROWS)
+        self.schema = self.db.get_table_info()
         
         # Create Toolkit & Agent
         self.toolkit = SQLDatabaseToolkit(db=self.db, llm=self.llm)
         self.agent_executor = create_sql_agent(
             llm=self.llm,
             toolkit=self.toolkit,
-            verbose=True,
+            verbose=False,
             handle_parsing_errors=True
         )
+        self.result_cache.clear()
+        self._db_signature = self._signature()
+
+    def _check_database(self):
+        # convert_db.py rewrites orders.db in place; reload schema and drop cached results when it does
+        with self._lock:
+            if self._signature() != self._db_signature:
+                logger.info("Database changed, reloading schema and clearing SQL result cache")
+                self._load_database()
+
+    def _execute(self, sql: str):
+        if not is_read_only(sql):
+            raise ValueError(f"Refusing non read-only SQL: {sql}")
+        key = normalize_sql(sql)
+        if self.shared is not None:
+            return self._execute_shared(sql, key)
+        with self._lock:
+            if key in self.result_cache:
+                self.result_cache.move_to_end(key)
+                self.cache_stats["hits"] += 1
+                return self.result_cache[key]
+            self.cache_stats["misses"] += 1
+        columns, rows = self._run(sql)
+        with self._lock:
+            self.result_cache[key] = (columns, rows)
+            while len(self.result_cache) > config.SQL_RESULT_CACHE_MAX_ENTRIES:
+                self.result_cache.popitem(last=False)
+        return columns, rows
+
+    def _run(self, sql: str):
+        with span("sql.execute"), self.engine.connect() as conn:
+            conn.execute(text(f"EXPLAIN {sql}")) # Validates tables/columns without running the query
+            result = conn.execute(text(sql))
+            return list(result.keys()), [tuple(row) for row in result.fetchall()]
+
+    def _execute_shared(self, sql: str, key: str):
+        key, tag = f"{self.db_uri}\0{key}", repr(self._db_signature)
+        cached = self.shared.get(key, tag=tag)
+        with self._lock:
+            self.cache_stats["hits" if cached is not None else "misses"] += 1
+        if cached is not None:
+            return cached
+        columns, rows = self._run(sql)
+        self.shared.put(key, (columns, rows), tag=tag)
+        return columns, rows
+
+    def _fast_query(self, user_query: str):
+        sql = extract_sql(self.sql_chain.invoke({"question": user_query, "schema": self.schema}))
+        logger.info("Generated SQL", extra={"sql": sql})
+        columns, rows = self._execute(sql)
+        result = format_result(sql, columns, rows)
+        if self.raw_result:
+            return result
+        return self.answer_chain.invoke({"question": user_query, "result": result})
+
+    async def _afast_query(self, user_query: str):
+        sql = extract_sql(await self.sql_chain.ainvoke({"question": user_query, "schema": self.schema}))
+        logger.info("Generated SQL", extra={"sql": sql})
+        columns, rows = await asyncio.to_thread(self._execute, sql)
+        result = format_result(sql, columns, rows)
+        if self.raw_result:
+            return result
+        return await self.answer_chain.ainvoke({"question": user_query, "result": result})
 
     def query(self, user_query: str):
-        print(f"Executing SQL Query for: {user_query}")
+        logger.info("Executing SQL query", extra={"question": user_query})
+        self._check_database()
+        if self.fast_path:
+            try:
+                return self._fast_query(user_query)
+            except Exception as e:
+                logger.warning("SQL fast path failed, falling back to the SQL agent", extra={"error": str(e)})
         try:
             # The agent will: 1. Get Table Info, 2. Generate SQL, 3. Execute, 4. Answer
             response = self.agent_executor.invoke(user_query)
             return response["output"]
         except Exception as e:
-            print(f"SQL Agent Error: {e}")
-            return "I encountered an error querying the database."
+            logger.error("SQL agent error", extra={"error": str(e)})
+            return ERROR_ANSWER
+
+    async def aquery(self, user_query: str):
+        logger.info("Executing SQL query", extra={"question": user_query})
+        await asyncio.to_thread(self._check_database)
+        if self.fast_path:
+            try:
+                return await self._afast_query(user_query)
+            except Exception as e:
+                logger.warning("SQL fast path failed, falling back to the SQL agent", extra={"error": str(e)})
+        try:
+            response = await self.agent_executor.ainvoke(user_query)
+            return response["output"]
+        except Exception as e:
+            logger.error("SQL agent error", extra={"error": str(e)})
+            return ERROR_ANSWER
 
 if __name__ == "__main__":
     agent = SQLAgent()
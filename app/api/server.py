@@ -1,13 +1,64 @@
-from fastapi import FastAPI, HTTPException
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import uvicorn
-from app.workflow.graph import app_graph
+from app.core.config import config
+from app.core.telemetry import configure_logging, get_logger, new_trace_id, record_span, render_prometheus
+from app.workflow.batch import parse_batch, run_batch
+from app.workflow.graph import registry
 
-app = FastAPI(title="Customer Support Agent API")
+configure_logging()
+logger = get_logger("api")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start serving immediately; agents (Milvus, BM25 index, LLM clients) come up in the background
+    if config.PRELOAD_AGENTS:
+        registry.start_background()
+    yield
+
+app = FastAPI(title="Customer Support Agent API", lifespan=lifespan)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Every log line and span emitted while handling the request carries the same trace ID
+    trace_id = new_trace_id()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        record_span(route_span(request), time.perf_counter() - start, failed=True)
+        raise
+    record_span(route_span(request), time.perf_counter() - start)
+    response.headers["X-Trace-Id"] = trace_id
+    return response
+
+def route_span(request: Request):
+    # Labelled by route template (set on the scope during routing), not the raw path, so the number
+    # of span series stays bounded however many distinct URLs clients send
+    route = request.scope.get("route")
+    return f"http.{route.path}" if route is not None else "http.unmatched"
+
+async def ready_graph():
+    try:
+        return await registry.aget_graph()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Agents are not ready: {e}")
 
 class QueryRequest(BaseModel):
     question: str
+    session_id: Optional[str] = None # Follow-ups in the same session are answered in the context of earlier turns
+
+    def graph_inputs(self):
+        inputs = {"question": self.question}
+        if self.session_id:
+            inputs["session_id"] = self.session_id
+        return inputs
 
 class DocumentResponse(BaseModel):
     content: str
@@ -18,13 +69,27 @@ class QueryResponse(BaseModel):
     answer: str
     documents: List[DocumentResponse]
     datasource: str
+    cached: bool = False
+    session_id: Optional[str] = None
+    standalone_question: Optional[str] = None # The follow-up as it was rewritten against the conversation
+
+def to_document_response(doc):
+    return DocumentResponse(
+        content=doc.page_content,
+        source=doc.metadata.get("source", "unknown"),
+        type=doc.metadata.get("type", "unknown")
+    )
+
+def sse_event(event: str, data: dict):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @app.post("/query", response_model=QueryResponse)
 async def query_agent(request: QueryRequest):
-    print(f"Received query: {request.question}")
+    logger.info("Received query", extra={"question": request.question})
+    app_graph = await ready_graph()
     try:
-        # Run the graph
-        final_state = app_graph.invoke({"question": request.question})
+        # Run the graph without blocking the event loop
+        final_state = await app_graph.ainvoke(request.graph_inputs())
         
         # Extract results
         answer = final_state.get("generation", "No answer generated.")
@@ -34,20 +99,126 @@ async def query_agent(request: QueryRequest):
         doc_responses = []
         if docs:
             for doc in docs:
-                doc_responses.append(DocumentResponse(
-                    content=doc.page_content,
-                    source=doc.metadata.get("source", "unknown"),
-                    type=doc.metadata.get("type", "unknown")
-                ))
+                doc_responses.append(to_document_response(doc))
         
         return QueryResponse(
             answer=answer,
             documents=doc_responses,
-            datasource=datasource
+            datasource=datasource,
+            cached=final_state.get("cached", False),
+            session_id=final_state.get("session_id"),
+            standalone_question=final_state.get("standalone_question")
         )
     except Exception as e:
-        print(f"Error processing query: {e}")
+        logger.exception("Error processing query")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/query/stream")
+async def query_agent_stream(request: QueryRequest):
+    # Server-Sent Events: "rewrite" (follow-ups in a session), "route" and "documents" first, then "token"
+    # events as the LLM produces them, then a final "done" event with timings.
+    logger.info("Received streaming query", extra={"question": request.question})
+    app_graph = await ready_graph()
+
+    async def event_stream():
+        start = time.perf_counter()
+        first_token_at = None
+        datasource = "unknown"
+        try:
+            async for mode, chunk in app_graph.astream(
+                request.graph_inputs(), stream_mode=["updates", "custom"]
+            ):
+                if mode == "custom" and "token" in chunk:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    yield sse_event("token", {"token": chunk["token"]})
+                    continue
+                if mode != "updates":
+                    continue
+                for node, update in chunk.items():
+                    if not update:
+                        continue
+                    if "standalone_question" in update:
+                        yield sse_event("rewrite", {"standalone_question": update["standalone_question"]})
+                    if "datasource" in update:
+                        datasource = update["datasource"]
+                        yield sse_event("route", {"datasource": datasource})
+                    if "documents" in update:
+                        docs = [to_document_response(doc).model_dump() for doc in update["documents"]]
+                        yield sse_event("documents", {"documents": docs})
+                    if node == "sql_agent":
+                        # The SQL agent answers in one piece
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        yield sse_event("token", {"token": update.get("generation", "")})
+        except Exception as e:
+            logger.exception("Error processing streaming query")
+            yield sse_event("error", {"detail": str(e)})
+        end = time.perf_counter()
+        yield sse_event("done", {
+            "datasource": datasource,
+            "ttft_ms": round((first_token_at - start) * 1000, 1) if first_token_at else None,
+            "total_ms": round((end - start) * 1000, 1),
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/batch")
+async def query_batch(request: Request, concurrency: int = config.BATCH_CONCURRENCY):
+    # Body: JSONL of {"id", "question"}. Response: JSONL, one result per question as it finishes,
+    # then a {"summary": {...}} line with questions/sec. Clients resume by resending only missing ids.
+    try:
+        items = parse_batch((await request.body()).decode("utf-8"))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info("Received batch", extra={"questions": len(items)})
+    app_graph = await ready_graph()
+    concurrency = max(1, min(concurrency, config.BATCH_MAX_CONCURRENCY))
+
+    async def lines():
+        async for result in run_batch(app_graph, registry.agents["router"], registry.agents["retriever"].embeddings,
+                                      items, concurrency):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.delete("/sessions/{session_id}")
+async def end_session(session_id: str):
+    store = getattr(registry.get_graph(), "store", None) if registry.ready else None
+    if store is None:
+        raise HTTPException(status_code=404, detail="Conversation memory is disabled")
+    return {"session_id": session_id, "dropped": store.drop(session_id)}
+
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    status = registry.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    if not config.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    cache = getattr(registry.get_graph(), "cache", None) if registry.ready else None
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Each worker builds its own agents; indexes are memory-mapped (shared page cache) and, with
+    # SHARED_CACHE_PATH set, answer / SQL / conversation caches live in one SQLite file they all use.
+    # Workers re-import config, so the path reaches them through the environment, decided here at start-up
+    if config.API_WORKERS > 1 and not config.SHARED_CACHE_PATH:
+        os.environ["RAG_SHARED_CACHE_PATH"] = config.SHARED_CACHE_PATH = config.SHARED_CACHE_DEFAULT_PATH
+    uvicorn.run("app.api.server:app", host="0.0.0.0", port=8000, workers=config.API_WORKERS)
@@ -0,0 +1,249 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.core.config import config
+from app.core.index_version import read_index_version
+from app.core.shared_cache import SharedCache
+from app.core.telemetry import get_logger
+
+logger = get_logger("cache.answers")
+
+def normalize_question(question: str):
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+class AnswerCache:
+    """LRU + TTL cache of final graph states, keyed on normalized question text with an
+    embedding-similarity fallback for near-duplicates. With shared_path, entries live in a SQLite
+    file every API worker uses instead of in this process."""
+
+    def __init__(self, embeddings=None, max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+                 ttl_seconds=config.ANSWER_CACHE_TTL_SECONDS,
+                 similarity_threshold=config.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+                 version_path=config.INDEX_VERSION_PATH, shared_path=config.SHARED_CACHE_PATH):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.version_path = version_path
+        # Shared entries are tagged with the index version they were answered from
+        self.shared = SharedCache(shared_path, "answers", max_entries, ttl_seconds) if shared_path else None
+
+        self._entries = OrderedDict() # normalized question -> (created_at, vector, state)
+        self._matrix = None # Stacked unit vectors, rebuilt lazily after writes
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+        self._index_version = read_index_version(self.version_path)
+        self.counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["exact_hits"] + self.counters["semantic_hits"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            entries = len(self.shared) if self.shared is not None else len(self._entries)
+            return {**self.counters, "entries": entries,
+                    "hit_rate": round(hits / lookups, 4) if lookups else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.shared is not None:
+                self.shared.clear()
+            self._matrix = None
+            self.counters["invalidations"] += 1
+
+    def _check_index_version(self):
+        # Answers are only valid for the index they were generated from
+        version = read_index_version(self.version_path)
+        if version != self._index_version:
+            logger.info("Index version changed, clearing answer cache",
+                        extra={"old_version": self._index_version, "new_version": version})
+            self._index_version = version
+            if self.shared is None:
+                self.clear()
+                return
+            # Other workers may already be caching answers for the new version; only older ones go
+            with self._lock:
+                self.shared.delete_other_tags(version)
+                self._matrix = None
+                self.counters["invalidations"] += 1
+
+    def _expired(self, created_at):
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def _lookup_exact(self, key):
+        if self.shared is not None:
+            state = self.shared.get(key, tag=self._index_version)
+            if state is not None:
+                with self._lock:
+                    self.counters["exact_hits"] += 1
+            return state
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[0]):
+                del self._entries[key]
+                self._matrix = None
+                return None
+            self._entries.move_to_end(key)
+            self.counters["exact_hits"] += 1
+            return entry[2]
+
+    def _lookup_semantic_shared(self, vector):
+        with self._lock:
+            # Reload the vectors when another worker has written (our own writes reset the matrix)
+            if self._matrix is None or self.shared.changed():
+                self._matrix_keys, self._matrix = self.shared.vectors(tag=self._index_version)
+            if self._matrix is None:
+                return None
+            scores = self._matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                return None
+            key = self._matrix_keys[best]
+        state = self.shared.get(key, tag=self._index_version)
+        with self._lock:
+            if state is None: # Expired, or evicted by another worker
+                self._matrix = None
+                return None
+            self.counters["semantic_hits"] += 1
+        return state
+
+    def _lookup_semantic(self, vector):
+        if self.shared is not None:
+            return self._lookup_semantic_shared(vector)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix_keys = [k for k, e in self._entries.items() if e[1] is not None]
+                self._matrix = (np.stack([self._entries[k][1] for k in self._matrix_keys])
+                                if self._matrix_keys else None)
+            if self._matrix is None:
+                return None
+            scores = self._matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                return None
+            key = self._matrix_keys[best]
+            entry = self._entries[key]
+            if self._expired(entry[0]):
+                del self._entries[key]
+                self._matrix = None
+                return None
+            self._entries.move_to_end(key)
+            self.counters["semantic_hits"] += 1
+            return entry[2]
+
+    def _miss(self):
+        with self._lock:
+            self.counters["misses"] += 1
+
+    def _store(self, key, vector, state):
+        if self.shared is not None:
+            evicted = self.shared.put(key, state, vector, tag=self._index_version)
+            with self._lock:
+                self.counters["evictions"] += evicted
+                self._matrix = None
+            return
+        with self._lock:
+            self._entries[key] = (time.time(), vector, state)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+            self._matrix = None
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def cacheable(state):
+        # SQL answers depend on orders.db rather than the document index, so they are not cached here.
+        # Nor are fallbacks after a failed node ("error"), or the apology would be served until the TTL expires
+        return bool(state.get("generation")) and not state.get("error") and state.get("datasource") != "structured_db"
+
+    def get(self, question: str):
+        self._check_index_version()
+        key = normalize_question(question)
+        state = self._lookup_exact(key)
+        if state is None and self.embeddings is not None:
+            state = self._lookup_semantic(self._unit(self.embeddings.embed_query(key)))
+        if state is None:
+            self._miss()
+        return state
+
+    async def aget(self, question: str):
+        self._check_index_version()
+        key = normalize_question(question)
+        state = self._lookup_exact(key)
+        if state is None and self.embeddings is not None:
+            state = self._lookup_semantic(self._unit(await self.embeddings.aembed_query(key)))
+        if state is None:
+            self._miss()
+        return state
+
+    def put(self, question: str, state: dict):
+        if not self.cacheable(state):
+            return
+        key = normalize_question(question)
+        vector = self._unit(self.embeddings.embed_query(key)) if self.embeddings is not None else None
+        self._store(key, vector, state)
+
+    async def aput(self, question: str, state: dict):
+        if not self.cacheable(state):
+            return
+        key = normalize_question(question)
+        vector = self._unit(await self.embeddings.aembed_query(key)) if self.embeddings is not None else None
+        self._store(key, vector, state)
+
+class CachedGraph:
+    """Wraps a compiled graph so cache hits return a stored final state without running any agent."""
+
+    def __init__(self, graph, cache: AnswerCache):
+        self.graph = graph
+        self.cache = cache
+
+    @staticmethod
+    def _hit(state):
+        return {**state, "cached": True}
+
+    def invoke(self, inputs: dict, *args, **kwargs):
+        state = self.cache.get(inputs["question"])
+        if state is not None:
+            return self._hit(state)
+        state = self.graph.invoke(inputs, *args, **kwargs)
+        self.cache.put(inputs["question"], state)
+        return state
+
+    async def ainvoke(self, inputs: dict, *args, **kwargs):
+        state = await self.cache.aget(inputs["question"])
+        if state is not None:
+            return self._hit(state)
+        state = await self.graph.ainvoke(inputs, *args, **kwargs)
+        await self.cache.aput(inputs["question"], state)
+        return state
+
+    async def astream(self, inputs: dict, *args, stream_mode=None, **kwargs):
+        # Only the ["updates", "custom"] multi-mode stream used by /query/stream is replayed on a hit
+        state = await self.cache.aget(inputs["question"])
+        if state is not None:
+            yield ("updates", {"cache": {"datasource": state.get("datasource"),
+                                         "documents": state.get("documents", [])}})
+            yield ("custom", {"token": state.get("generation", "")})
+            return
+
+        state = dict(inputs)
+        async for mode, chunk in self.graph.astream(inputs, *args, stream_mode=stream_mode, **kwargs):
+            if mode == "updates":
+                for update in chunk.values():
+                    state.update(update or {})
+            yield mode, chunk
+        await self.cache.aput(inputs["question"], state)
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
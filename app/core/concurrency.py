@@ -0,0 +1,43 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from app.core.config import config
+from app.core.telemetry import SPAN_SECONDS
+
+class StageLimiter:
+    """Caps the number of in-flight async calls per workflow stage."""
+
+    def __init__(self, limits: dict):
+        self.limits = dict(limits)
+        self.in_flight = {stage: 0 for stage in self.limits}
+        self._semaphores = {}
+
+    def _semaphore(self, stage: str):
+        # Semaphores must belong to the running loop, so rebuild them if the loop changed
+        loop = asyncio.get_running_loop()
+        entry = self._semaphores.get(stage)
+        if entry is None or entry[0] is not loop:
+            entry = (loop, asyncio.Semaphore(self.limits[stage]))
+            self._semaphores[stage] = entry
+        return entry[1]
+
+    @asynccontextmanager
+    async def stage(self, stage: str):
+        if stage not in self.limits:
+            yield
+            return
+        queued_at = time.perf_counter()
+        async with self._semaphore(stage):
+            SPAN_SECONDS.observe(time.perf_counter() - queued_at, span=f"queue.{stage}")
+            self.in_flight[stage] += 1
+            try:
+                yield
+            finally:
+                self.in_flight[stage] -= 1
+
+stage_limiter = StageLimiter({
+    "router": config.ROUTER_CONCURRENCY,
+    "retrieval": config.RETRIEVAL_CONCURRENCY,
+    "answer": config.ANSWER_CONCURRENCY,
+    "sql_agent": config.SQL_CONCURRENCY,
+})
@@ -1,13 +1,153 @@
 
+import os
+
 class Config:
+    # Vector store
+    VECTOR_STORE_BACKEND = "milvus" # or "embedded": in-process memory-mapped index, no Milvus server needed
+
     # Milvus
     MILVUS_HOST = "localhost"
     MILVUS_PORT = "19530"
     COLLECTION_NAME = "agentic_rag_docs"
-    
+    MILVUS_INDEX_TYPE = "HNSW" # "HNSW", "IVF_FLAT", "IVF_PQ" or "AUTOINDEX"; changing it needs an ingest --full
+    MILVUS_METRIC_TYPE = "COSINE"
+    MILVUS_HNSW_M = 16
+    MILVUS_HNSW_EF_CONSTRUCTION = 200
+    MILVUS_HNSW_EF = 64 # Search breadth: higher = better recall, slower queries
+    MILVUS_IVF_NLIST = 1024 # Clusters (IVF_FLAT / IVF_PQ)
+    MILVUS_IVF_NPROBE = 16 # Clusters scanned per search
+    MILVUS_PQ_M = 16 # IVF_PQ sub-quantizers; must divide the embedding dimension
+    MILVUS_PQ_NBITS = 8
+    MILVUS_NUM_PARTITIONS = 16 # Partitions the document type is hashed into (partition key)
+
+    # Embedded vector store
+    EMBEDDED_INDEX_DIR = "data/vector_index" # Pre-generation layout, served until the first index generation is published
+    EMBEDDED_DTYPE = "float32" # "float16" halves memory and disk; exact scans get slower, so pair it with "ivf"
+    EMBEDDED_INDEX_TYPE = "flat" # "flat" (exact), "ivf", or "hnsw" (needs hnswlib)
+    EMBEDDED_ANN_MIN_ROWS = 20000 # Smaller indexes always use exact search
+    EMBEDDED_IVF_NLIST = 0 # Inverted lists; 0 = 4 * sqrt(chunks)
+    EMBEDDED_IVF_NPROBE = 16 # Lists scanned per query
+    EMBEDDED_HNSW_M = 16
+    EMBEDDED_HNSW_EF_CONSTRUCTION = 200
+    EMBEDDED_HNSW_EF_SEARCH = 64
+    EMBEDDED_FILTER_FIELDS = ("type", "source") # Metadata fields usable in search filters
+
     # LLM
     OLLAMA_BASE_URL = "http://localhost:11434"
     LLM_MODEL = "llama3.2:1b"
+    LLM_BACKEND = "ollama" # "stub" answers locally and deterministically (benchmarks, offline runs)
+    LLM_KEEP_ALIVE = "30m" # How long Ollama keeps the model loaded after a request
+    LLM_NUM_CTX = 4096 # Same context size on every request, so Ollama never reloads the model between agents
+    LLM_MAX_CONNECTIONS = 8 # Pooled keep-alive HTTP connections to Ollama
+    LLM_TIMEOUT_SECONDS = 300.0
+    LLM_COALESCE_ENABLED = True # Identical in-flight prompts share one generation
+    LLM_STUB_LATENCY = 0.2 # Stub backend: seconds before the first token
+    LLM_STUB_TOKEN_LATENCY = 0.0 # Stub backend: seconds per generated word
     EMBEDDING_MODEL = "nomic-embed-text" # or "all-minilm"
+    EMBEDDING_BATCH_SIZE = 64 # Texts per /api/embed request
+    EMBEDDING_MAX_CONCURRENCY = 4 # In-flight embedding requests
+    EMBEDDING_MAX_RETRIES = 3
+    EMBEDDING_CACHE_PATH = "data/embedding_cache.sqlite" # None disables the on-disk cache
+    
+    # Ingestion
+    DATA_DIR = "data"
+    INDEX_ROOT = "data/index" # Index generations (one directory per ingest) and the CURRENT pointer to the served one
+    INDEX_GENERATIONS_KEEP = 2 # Published generations kept; the previous one finishes searches still in flight
+    INGEST_MANIFEST_PATH = "data/ingest_manifest.json" # Pre-generation layout (each generation has its manifest.json)
+    INGEST_WORKERS = 4 # Processes used to parse new/changed files
+    INGEST_FILE_TIMEOUT = 300 # Seconds a document may take to parse before its worker is killed and the file skipped
+    INGEST_PARSE_CACHE_DIR = "data/parse_cache" # Extracted page text by file hash, so re-ingest skips parsing (None disables)
+    INGEST_BATCH_SIZE = 1000 # Chunks per embed + insert batch (and rows per spreadsheet read)
+    INGEST_QUEUE_SIZE = 4 # Batches buffered between pipeline stages
+    INGEST_CHECKPOINT_PATH = "data/ingest_checkpoint.json" # Progress of an unfinished ingest, for resuming
+    SPARSE_INDEX_DIR = "data/sparse_index" # Pre-generation layout of the memory-mapped BM25 index + chunk store
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+    
+    # Hybrid Retrieval (dense + BM25 run in parallel, fused with weighted reciprocal rank)
+    HYBRID_LEG_K = 5 # Candidates fetched per leg
+    HYBRID_TOP_K = 10 # Fused results returned
+    HYBRID_RRF_K = 60
+    HYBRID_DENSE_WEIGHT = 0.5
+    HYBRID_SPARSE_WEIGHT = 0.5
+    HYBRID_DENSE_TIMEOUT_SECONDS = 5.0 # Query embedding + vector store search
+    HYBRID_SPARSE_TIMEOUT_SECONDS = 1.0
+    HYBRID_LEG_THREADS = 8 # Threads running the legs of sync searches, shared by every index generation
+
+    # Rerank + context packing (between retrieval and answer)
+    RERANK_ENABLED = True
+    RERANK_MODEL = None # sentence-transformers cross-encoder, e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2"; None = embedding similarity
+    RERANK_DUPLICATE_THRESHOLD = 0.95 # Chunks this similar to a better-ranked one are dropped
+    CONTEXT_TOKEN_BUDGET = 1200 # Prompt tokens available for retrieved context
+    CONTEXT_TOKENIZER = "cl100k_base" # tiktoken encoding used to count them
+    
+    # SQL Agent
+    SQL_DB_URI = "sqlite:///data/orders.db"
+    SQL_FAST_PATH_ENABLED = True # One-shot text-to-SQL before the multi-step agent loop
+    SQL_SAMPLE_ROWS = 3 # Sample rows per table included in the one-shot prompt
+    SQL_MAX_RESULT_ROWS = 20
+    SQL_RAW_RESULT_ENABLED = False # Fast path returns the result table + SQL as is, skipping the LLM call that phrases the answer
+    SQL_RESULT_CACHE_MAX_ENTRIES = 256
+    
+    # Observability
+    LOG_ENABLED = True
+    LOG_LEVEL = "INFO" # DEBUG also logs retrieved chunk previews
+    LOG_JSON = True # One JSON object per line; False for plain text
+    METRICS_ENABLED = True # Served at GET /metrics in Prometheus text format
+    
+    # Serving
+    API_WORKERS = 1 # Processes started by `python -m app.api.server`; memory-mapped indexes share their pages across them
+    # Answer / SQL result / conversation caches in one SQLite WAL file all workers use; None = per-process memory.
+    # Read from the environment because workers are fresh processes; `python -m app.api.server` sets it when API_WORKERS > 1
+    SHARED_CACHE_PATH = os.environ.get("RAG_SHARED_CACHE_PATH") or None
+    SHARED_CACHE_DEFAULT_PATH = "data/shared_cache.sqlite" # Used by the server for API_WORKERS > 1 if none is set
+
+    # Startup
+    PRELOAD_AGENTS = True # Build agents in the background when the API starts (otherwise on first request)
+    STARTUP_WAIT_SECONDS = 30 # How long a request waits for agents that are still initializing
+    AGENT_INIT_RETRY_SECONDS = 5 # Minimum gap between init attempts after a failure (e.g. Milvus down)
+    
+    # Concurrency (max in-flight calls per graph stage)
+    ROUTER_CONCURRENCY = 8
+    RETRIEVAL_CONCURRENCY = 16
+    ANSWER_CONCURRENCY = 4 # Generation is the expensive stage on a local Ollama
+    SQL_CONCURRENCY = 2
+    BATCH_CONCURRENCY = 4 # Default concurrent graph runs per /query/batch request
+    BATCH_MAX_CONCURRENCY = 16 # Upper bound a client may ask for
+    
+    # Router (rules -> embedding centroids -> LLM)
+    ROUTER_FAST_PATH_ENABLED = True
+    ROUTER_CENTROID_MIN_SIMILARITY = 0.55 # Best centroid must be at least this close...
+    ROUTER_CENTROID_MARGIN = 0.05 # ...and beat the runner-up by this much, otherwise ask the LLM
+    ROUTER_FILTER_ENABLED = True # Narrow search to the document type / file a question names (e.g. "in the spreadsheet")
+    
+    # Answer Cache (in front of the LangGraph workflow)
+    ANSWER_CACHE_ENABLED = True
+    ANSWER_CACHE_MAX_ENTRIES = 1000
+    ANSWER_CACHE_TTL_SECONDS = 3600
+    ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.92 # Cosine similarity for a near-duplicate hit
+    INDEX_VERSION_PATH = "data/index_version" # Bumped by ingestion; caches tied to the index watch it
+
+    # Speculative retrieval: start embedding + hybrid search while the router decides (async requests)
+    SPECULATIVE_RETRIEVAL_ENABLED = True
+    SPECULATIVE_MAX_AGE_SECONDS = 60 # Uncollected speculative searches are cancelled after this long
+
+    # Precomputed FAQ answers: generated per chunk at ingest, served before retrieval + generation
+    FAQ_ENABLED = False # Costs one LLM call per new chunk at ingest
+    FAQ_INDEX_DIR = "data/faq_index" # Pre-generation layout; each generation has its own faq/ directory
+    FAQ_SOURCES = None # Filenames to generate FAQ entries for, e.g. ("manual.txt",); None = every document
+    FAQ_PAIRS_PER_CHUNK = 3
+    FAQ_CONCURRENCY = 4 # Concurrent LLM calls while generating
+    FAQ_BATCH_SIZE = 32 # Chunks generated between progress saves
+    FAQ_SIMILARITY_THRESHOLD = 0.9 # Cosine similarity to a stored question needed to serve its answer
+
+    # Conversation memory (requests that carry a session_id)
+    MEMORY_ENABLED = True
+    MEMORY_MAX_SESSIONS = 1000
+    MEMORY_TTL_SECONDS = 1800 # Sessions idle this long start over
+    MEMORY_RECENT_TURNS = 3 # Turns kept verbatim; older ones are folded into a running summary
+    MEMORY_ANSWER_TOKENS = 150 # Per-answer budget when recent turns are shown to the question rewriter
+    MEMORY_SUMMARY_TOKENS = 200 # Cap on the running summary
+    MEMORY_REUSE_SIMILARITY = 0.8 # A follow-up this close to the previous question reuses its chunks instead of searching
     
 config = Config()
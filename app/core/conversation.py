@@ -0,0 +1,256 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import numpy as np
+from app.core.config import config
+from app.core.index_version import read_index_version
+from app.core.shared_cache import SharedCache
+from app.core.telemetry import get_logger
+
+logger = get_logger("memory.conversations")
+
+RETRIEVAL_ROUTES = ("vector_store", "excel_sheet")
+
+def _turn_key(turn: dict):
+    return (turn["question"], turn["standalone"], turn["answer"])
+
+@dataclass
+class Session:
+    session_id: str
+    # Recent turns, oldest first: {"question", "standalone", "answer", "datasource", "documents", "vector",
+    # "index_version"}. Only the newest turn keeps its documents.
+    turns: list = field(default_factory=list)
+    summary: str = "" # Running summary of the turns that fell out of `turns`
+    overflow: list = field(default_factory=list) # Turns waiting to be folded into the summary
+    folding: bool = False
+    last_used: float = field(default_factory=time.time)
+
+class ConversationStore:
+    """Server-side conversation state per session ID, with LRU + TTL eviction. With shared_path, sessions
+    are kept in a SQLite file every API worker uses, so a follow-up can land on any worker."""
+
+    def __init__(self, max_sessions=config.MEMORY_MAX_SESSIONS, ttl_seconds=config.MEMORY_TTL_SECONDS,
+                 recent_turns=config.MEMORY_RECENT_TURNS, shared_path=config.SHARED_CACHE_PATH):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.recent_turns = recent_turns
+        self.shared = SharedCache(shared_path, "sessions", max_sessions, ttl_seconds) if shared_path else None
+        self._sessions = OrderedDict() # session_id -> Session
+        self._lock = threading.Lock()
+        self.counters = {"turns": 0, "rewrites": 0, "reused_retrievals": 0, "summaries": 0,
+                         "evictions": 0, "expirations": 0}
+
+    def stats(self):
+        sessions = len(self.shared) if self.shared is not None else len(self._sessions)
+        with self._lock:
+            return {**self.counters, "sessions": sessions}
+
+    def count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, session_id: str):
+        # Existing session, or a fresh one if it is unknown or has been idle longer than the TTL
+        if self.shared is not None:
+            session = self.shared.get(session_id) or Session(session_id) # SharedCache applies the TTL
+            session.last_used = time.time()
+            return session
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and self.ttl_seconds is not None and now - session.last_used > self.ttl_seconds:
+                session = None
+                self.counters["expirations"] += 1
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.counters["evictions"] += 1
+            return session
+
+    def save(self, session: Session):
+        # Local sessions are updated in place; shared ones are written back for the other workers
+        if self.shared is not None:
+            self.shared.put(session.session_id, session)
+
+    def save_summary(self, session: Session, folded: list):
+        # After folding `folded` into session.summary. Another worker may have saved newer turns during the
+        # LLM calls, so only the summary and the removal of the folded turns are merged into the stored session.
+        if self.shared is None:
+            return
+        keys = {_turn_key(turn) for turn in folded}
+
+        def merge(latest):
+            if latest is None:
+                return None # Dropped or expired meanwhile
+            latest.summary = session.summary
+            latest.overflow = [turn for turn in latest.overflow if _turn_key(turn) not in keys]
+            return latest
+        self.shared.update(session.session_id, merge)
+
+    def drop(self, session_id: str):
+        if self.shared is not None:
+            return self.shared.delete(session_id)
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def add_turn(self, session: Session, turn: dict):
+        # Appends a turn; returns True when older turns were moved to session.overflow for summarizing
+        with self._lock:
+            for previous in session.turns:
+                previous["documents"] = None
+            session.turns.append(turn)
+            overflow = session.turns[:-self.recent_turns] if self.recent_turns else session.turns[:]
+            session.turns = session.turns[len(overflow):]
+            session.overflow.extend(overflow)
+            self.counters["turns"] += 1
+            return bool(session.overflow)
+
+class ConversationalGraph:
+    """Wraps the (cached) graph. Questions that carry a session_id are rewritten into standalone questions
+    against the conversation before they run, and same-topic follow-ups reuse the previous turn's chunks."""
+
+    def __init__(self, graph, store: ConversationStore, condenser, embeddings=None,
+                 reuse_similarity=config.MEMORY_REUSE_SIMILARITY):
+        self.graph = graph
+        self.store = store
+        self.condenser = condenser
+        self.embeddings = embeddings
+        self.reuse_similarity = reuse_similarity
+        self._tasks = set() # Background summary updates (kept referenced until they finish)
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _inputs(self, inputs: dict, session: Session, standalone: str, vector):
+        inputs = {k: v for k, v in inputs.items() if k != "session_id"}
+        inputs["question"] = standalone
+        last = session.turns[-1] if session.turns else None
+        if (last is not None and vector is not None and last["vector"] is not None and last["documents"]
+                and last["datasource"] in RETRIEVAL_ROUTES and last["index_version"] == read_index_version()
+                and float(last["vector"] @ vector) >= self.reuse_similarity):
+            inputs["reuse_documents"] = last["documents"]
+            self.store.count("reused_retrievals")
+        return inputs
+
+    def _turn(self, question: str, standalone: str, vector, state: dict):
+        return {"question": question, "standalone": standalone, "answer": state.get("generation", ""),
+                "datasource": state.get("datasource"), "documents": state.get("documents") or None,
+                "vector": vector, "index_version": read_index_version()}
+
+    def _result(self, session: Session, standalone: str, state: dict):
+        return {**state, "session_id": session.session_id, "standalone_question": standalone}
+
+    def _fold(self, session: Session):
+        folded = []
+        try:
+            while session.overflow:
+                session.summary = self.condenser.summarize(session.summary, session.overflow[0])
+                folded.append(session.overflow.pop(0))
+                self.store.count("summaries")
+        finally:
+            self.store.save_summary(session, folded)
+
+    async def _afold(self, session: Session):
+        # Off the request path; one fold at a time per session
+        session.folding = True
+        folded = []
+        try:
+            while session.overflow:
+                session.summary = await self.condenser.asummarize(session.summary, session.overflow[0])
+                folded.append(session.overflow.pop(0))
+                self.store.count("summaries")
+        finally:
+            session.folding = False
+            self.store.save_summary(session, folded)
+
+    def _prepare(self, question: str, standalone: str):
+        if standalone != question:
+            self.store.count("rewrites")
+        if self.embeddings is None:
+            return None
+        try:
+            return self._unit(self.embeddings.embed_query(standalone))
+        except Exception as e:
+            logger.warning("Could not embed the question for retrieval reuse", extra={"error": str(e)})
+            return None
+
+    async def _aprepare(self, question: str, standalone: str):
+        if standalone != question:
+            self.store.count("rewrites")
+        if self.embeddings is None:
+            return None
+        try:
+            return self._unit(await self.embeddings.aembed_query(standalone))
+        except Exception as e:
+            logger.warning("Could not embed the question for retrieval reuse", extra={"error": str(e)})
+            return None
+
+    def _record(self, session: Session, question: str, standalone: str, vector, state: dict):
+        overflowed = self.store.add_turn(session, self._turn(question, standalone, vector, state))
+        self.store.save(session)
+        if overflowed:
+            self._fold(session)
+
+    def _arecord(self, session: Session, question: str, standalone: str, vector, state: dict):
+        overflowed = self.store.add_turn(session, self._turn(question, standalone, vector, state))
+        self.store.save(session) # Before the summary is folded in, so the next turn sees this one
+        if overflowed and not session.folding:
+            task = asyncio.ensure_future(self._afold(session))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def invoke(self, inputs: dict, *args, **kwargs):
+        if not inputs.get("session_id"):
+            return self.graph.invoke(inputs, *args, **kwargs)
+        session = self.store.get(inputs["session_id"])
+        question = inputs["question"]
+        standalone = self.condenser.condense(question, session.summary, session.turns)
+        vector = self._prepare(question, standalone)
+        state = self.graph.invoke(self._inputs(inputs, session, standalone, vector), *args, **kwargs)
+        self._record(session, question, standalone, vector, state)
+        return self._result(session, standalone, state)
+
+    async def ainvoke(self, inputs: dict, *args, **kwargs):
+        if not inputs.get("session_id"):
+            return await self.graph.ainvoke(inputs, *args, **kwargs)
+        session = self.store.get(inputs["session_id"])
+        question = inputs["question"]
+        standalone = await self.condenser.acondense(question, session.summary, session.turns)
+        vector = await self._aprepare(question, standalone)
+        state = await self.graph.ainvoke(self._inputs(inputs, session, standalone, vector), *args, **kwargs)
+        self._arecord(session, question, standalone, vector, state)
+        return self._result(session, standalone, state)
+
+    async def astream(self, inputs: dict, *args, stream_mode=None, **kwargs):
+        if not inputs.get("session_id"):
+            async for item in self.graph.astream(inputs, *args, stream_mode=stream_mode, **kwargs):
+                yield item
+            return
+        session = self.store.get(inputs["session_id"])
+        question = inputs["question"]
+        standalone = await self.condenser.acondense(question, session.summary, session.turns)
+        if standalone != question:
+            yield ("updates", {"memory": {"standalone_question": standalone}})
+        vector = await self._aprepare(question, standalone)
+        graph_inputs = self._inputs(inputs, session, standalone, vector)
+        state, tokens = dict(graph_inputs), []
+        async for mode, chunk in self.graph.astream(graph_inputs, *args, stream_mode=stream_mode, **kwargs):
+            if mode == "updates":
+                for update in chunk.values():
+                    state.update(update or {})
+            elif mode == "custom" and "token" in chunk:
+                tokens.append(chunk["token"])
+            yield mode, chunk
+        state.setdefault("generation", "".join(tokens)) # Cache hits replay the answer as a single token
+        self._arecord(session, question, standalone, vector, state)
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.core.config import config
+from app.core.telemetry import span
+
+class EmbeddingCache:
+    """Persistent (model, text) -> float32 vector store in SQLite."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, text: str):
+        return hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+    def get_many(self, keys: list):
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500): # Stay under SQLite's bound-parameter limit
+                batch = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update((key, np.frombuffer(blob, dtype=np.float32).tolist()) for key, blob in rows)
+        return found
+
+    def put_many(self, items: dict):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+class CachedEmbeddings(Embeddings):
+    """Ollama embeddings client that batches texts per request, keeps a bounded number of requests
+    in flight, retries with exponential backoff, and never embeds the same (model, text) twice."""
+
+    def __init__(self, model=config.EMBEDDING_MODEL, base_url=config.OLLAMA_BASE_URL,
+                 batch_size=config.EMBEDDING_BATCH_SIZE, max_concurrency=config.EMBEDDING_MAX_CONCURRENCY,
+                 max_retries=config.EMBEDDING_MAX_RETRIES, cache_path=config.EMBEDDING_CACHE_PATH,
+                 # Same prefixes as langchain's OllamaEmbeddings, so vectors stay comparable
+                 embed_instruction="passage: ", query_instruction="query: ",
+                 backoff_seconds=0.5, timeout=120.0):
+        self.model = model
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.embed_instruction = embed_instruction
+        self.query_instruction = query_instruction
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.cache = EmbeddingCache(cache_path) if cache_path else None
+        self.stats = {"requests": 0, "texts_embedded": 0, "cache_hits": 0, "retries": 0}
+        self._stats_lock = threading.Lock() # Updated from the request pool, to_thread workers and the event loop
+
+        limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        self._client = httpx.Client(base_url=base_url, timeout=timeout, limits=limits)
+        self._async_client = None # Bound to an event loop, so created on first async use
+        self._async_loop = None
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def _count(self, name: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def _batches(self, texts):
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    @staticmethod
+    def _retryable(error):
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code == 429 or error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError)
+
+    def _request_batch(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._count("requests")
+                with span("embedding.request", texts=len(batch)):
+                    response = self._client.post("/api/embed", json={"model": self.model, "input": batch})
+                response.raise_for_status()
+                return response.json()["embeddings"]
+            except Exception as e:
+                if attempt == self.max_retries or not self._retryable(e):
+                    raise
+                self._count("retries")
+                time.sleep(self.backoff_seconds * 2 ** attempt)
+
+    def _get_async_client(self):
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            limits = httpx.Limits(max_connections=self.max_concurrency,
+                                  max_keepalive_connections=self.max_concurrency)
+            self._async_client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits)
+            self._async_loop = loop
+        return self._async_client
+
+    async def _arequest_batch(self, batch, semaphore):
+        client = self._get_async_client()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    self._count("requests")
+                    with span("embedding.request", texts=len(batch)):
+                        response = await client.post("/api/embed", json={"model": self.model, "input": batch})
+                response.raise_for_status()
+                return response.json()["embeddings"]
+            except Exception as e:
+                if attempt == self.max_retries or not self._retryable(e):
+                    raise
+                self._count("retries")
+                await asyncio.sleep(self.backoff_seconds * 2 ** attempt)
+
+    def _lookup(self, texts):
+        # Returns (cache keys per text, cached vectors, unique texts still to embed)
+        keys = [EmbeddingCache.key(self.model, text) for text in texts]
+        cached = self.cache.get_many(list(set(keys))) if self.cache else {}
+        self._count("cache_hits", sum(1 for key in keys if key in cached))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        return keys, cached, missing
+
+    def _store(self, cached, missing, vectors):
+        fresh = dict(zip(missing.keys(), vectors))
+        self._count("texts_embedded", len(fresh))
+        if self.cache and fresh:
+            self.cache.put_many(fresh)
+        cached.update(fresh)
+
+    def _embed(self, texts):
+        keys, cached, missing = self._lookup(texts)
+        if missing:
+            batches = self._batches(list(missing.values()))
+            vectors = [v for batch_vectors in self._pool.map(self._request_batch, batches) for v in batch_vectors]
+            self._store(cached, missing, vectors)
+        return [cached[key] for key in keys]
+
+    async def _aembed(self, texts):
+        # The SQLite cache reads and commits run in threads, so they never stall other requests on the loop
+        keys, cached, missing = await asyncio.to_thread(self._lookup, texts)
+        if missing:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            batches = self._batches(list(missing.values()))
+            results = await asyncio.gather(*(self._arequest_batch(batch, semaphore) for batch in batches))
+            await asyncio.to_thread(self._store, cached, missing, [v for batch_vectors in results for v in batch_vectors])
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed([f"{self.embed_instruction}{text}" for text in texts])
+
+    def embed_query(self, text):
+        return self._embed([f"{self.query_instruction}{text}"])[0]
+
+    async def aembed_documents(self, texts):
+        return await self._aembed([f"{self.embed_instruction}{text}" for text in texts])
+
+    async def aembed_query(self, text):
+        return (await self._aembed([f"{self.query_instruction}{text}"]))[0]
+
+    def embed_queries(self, texts):
+        # Many queries in batched requests; with the cache on, later embed_query calls for them are hits
+        return self._embed([f"{self.query_instruction}{text}" for text in texts])
+
+    async def aembed_queries(self, texts):
+        return await self._aembed([f"{self.query_instruction}{text}" for text in texts])
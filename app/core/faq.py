@@ -0,0 +1,99 @@
+import threading
+from langchain_core.documents import Document
+from app.core.config import config
+from app.core.telemetry import get_logger
+from app.index.dense import EmbeddedVectorStore
+from app.index.generations import GenerationWatcher
+
+logger = get_logger("cache.faq")
+
+class FAQIndex:
+    """Query-time lookup of the question/answer pairs generated at ingest (see app/ingestion/faq.py).
+    A question close enough to a stored one is answered with the stored answer and its source chunk."""
+
+    def __init__(self, embeddings, index_dir=None, similarity_threshold=config.FAQ_SIMILARITY_THRESHOLD):
+        # index_dir: None follows the FAQ index of the published index generation
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.generations = GenerationWatcher() if index_dir is None else None
+        self._generation = None
+        self._store = EmbeddedVectorStore(embeddings, index_dir=index_dir) if index_dir else None
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0}
+
+    @property
+    def store(self):
+        # A rebuilt FAQ index within one generation is reopened by the store itself
+        if self.generations is not None:
+            generation = self.generations.current()
+            if generation is not None and generation != self._generation:
+                self._store, self._generation = EmbeddedVectorStore(self.embeddings, index_dir=generation.faq_dir), generation
+        return self._store
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {**self.counters, "entries": len(self.store) if self.store is not None else 0,
+                    "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _state(self, store, vector):
+        results = store.similarity_search_with_score_by_vector(vector, k=1)
+        if not results or results[0][1] < self.similarity_threshold:
+            self._count("misses")
+            return None
+        entry, score = results[0]
+        self._count("hits")
+        metadata = entry.metadata
+        source = {k: metadata[k] for k in ("source", "type", "page", "slide", "chunk_id") if k in metadata}
+        logger.info("FAQ hit", extra={"matched": entry.page_content, "score": round(float(score), 4)})
+        return {"generation": f"{metadata['answer']}\n\nSource: {metadata['source']}",
+                "documents": [Document(page_content=metadata["chunk"], metadata=source)],
+                "datasource": "faq", "faq": {"question": entry.page_content, "score": round(float(score), 4)}}
+
+    def lookup(self, question: str):
+        store = self.store
+        if store is None or not len(store):
+            return None # No FAQ built: skip embedding the question
+        return self._state(store, self.embeddings.embed_query(question))
+
+    async def alookup(self, question: str):
+        store = self.store
+        if store is None or not len(store):
+            return None
+        return self._state(store, await self.embeddings.aembed_query(question))
+
+class FAQGraph:
+    """Wraps a compiled graph so questions matching a precomputed FAQ entry skip retrieval and generation."""
+
+    def __init__(self, graph, faq: FAQIndex):
+        self.graph = graph
+        self.faq = faq
+
+    def invoke(self, inputs: dict, *args, **kwargs):
+        state = self.faq.lookup(inputs["question"])
+        if state is not None:
+            return {**inputs, **state}
+        return self.graph.invoke(inputs, *args, **kwargs)
+
+    async def ainvoke(self, inputs: dict, *args, **kwargs):
+        state = await self.faq.alookup(inputs["question"])
+        if state is not None:
+            return {**inputs, **state}
+        return await self.graph.ainvoke(inputs, *args, **kwargs)
+
+    async def astream(self, inputs: dict, *args, stream_mode=None, **kwargs):
+        # A hit is replayed like an answer cache hit: one update with the source, then the answer as a token
+        state = await self.faq.alookup(inputs["question"])
+        if state is not None:
+            yield ("updates", {"faq": state})
+            yield ("custom", {"token": state["generation"]})
+            return
+        async for item in self.graph.astream(inputs, *args, stream_mode=stream_mode, **kwargs):
+            yield item
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
@@ -0,0 +1,24 @@
+import os
+import time
+import uuid
+from app.core.config import config
+
+# Ingestion runs in a separate process, so it announces a rebuilt index by rewriting a small
+# version file. Anything caching results derived from the index compares against it.
+
+def bump_index_version(version: str = None, path: str = config.INDEX_VERSION_PATH):
+    # Ingest passes the ID of the index generation it just published
+    version = version or f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+def read_index_version(path: str = config.INDEX_VERSION_PATH):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,374 @@
+import asyncio
+import contextlib
+import hashlib
+import inspect
+import json
+import threading
+import time
+from typing import Any, Optional
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from app.core.config import config
+from app.core.telemetry import span
+
+ROLES = {"system": "system", "human": "user", "ai": "assistant", "tool": "tool"}
+
+def to_chat_messages(messages):
+    # Static system instructions go first, in canonical form (dedented), so every request with the same
+    # instructions shares a byte-identical prefix that Ollama can reuse from its KV cache
+    converted = [{"role": ROLES.get(m.type, "user"), "content": m.content} for m in messages]
+    system = [{"role": "system", "content": inspect.cleandoc(m["content"])} for m in converted if m["role"] == "system"]
+    return system + [m for m in converted if m["role"] != "system"]
+
+class OllamaBackend:
+    """Talks to Ollama's /api/chat over pooled keep-alive connections."""
+
+    def __init__(self, base_url=config.OLLAMA_BASE_URL, keep_alive=config.LLM_KEEP_ALIVE,
+                 max_connections=config.LLM_MAX_CONNECTIONS, timeout=config.LLM_TIMEOUT_SECONDS):
+        self.base_url = base_url
+        self.keep_alive = keep_alive
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client = httpx.Client(base_url=base_url, timeout=timeout, limits=self._limits())
+        self._async_client = None # Bound to an event loop, so created on first async use
+        self._async_loop = None
+
+    def _limits(self):
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+
+    def _get_async_client(self):
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self._limits())
+            self._async_loop = loop
+        return self._async_client
+
+    def _payload(self, model, messages, options, stream):
+        options = dict(options)
+        payload = {"model": model, "messages": messages, "stream": stream, "keep_alive": self.keep_alive}
+        response_format = options.pop("format", None)
+        if response_format:
+            payload["format"] = response_format
+        payload["options"] = {"num_ctx": config.LLM_NUM_CTX, **{k: v for k, v in options.items() if v is not None}}
+        return payload
+
+    @staticmethod
+    def _result(data):
+        return {"content": data.get("message", {}).get("content", ""),
+                "prompt_eval_count": data.get("prompt_eval_count"), "eval_count": data.get("eval_count")}
+
+    def chat(self, model, messages, options):
+        response = self._client.post("/api/chat", json=self._payload(model, messages, options, False))
+        response.raise_for_status()
+        return self._result(response.json())
+
+    async def achat(self, model, messages, options):
+        response = await self._get_async_client().post("/api/chat", json=self._payload(model, messages, options, False))
+        response.raise_for_status()
+        return self._result(response.json())
+
+    def stream(self, model, messages, options):
+        with self._client.stream("POST", "/api/chat", json=self._payload(model, messages, options, True)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield self._result(json.loads(line))
+
+    async def astream(self, model, messages, options):
+        client = self._get_async_client()
+        async with client.stream("POST", "/api/chat", json=self._payload(model, messages, options, True)) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    yield self._result(json.loads(line))
+
+class StubBackend:
+    """Deterministic local stand-in for Ollama: same answer for the same prompt, fixed latency."""
+
+    def __init__(self, response=None, latency=config.LLM_STUB_LATENCY, token_latency=config.LLM_STUB_TOKEN_LATENCY,
+                 slots=None):
+        self.response = response
+        self.latency = latency
+        self.token_latency = token_latency
+        # Like OLLAMA_NUM_PARALLEL: at most this many generations at once (None = unlimited)
+        self.slots = slots
+        self._sync_slots = threading.BoundedSemaphore(slots) if slots else contextlib.nullcontext()
+        self._async_slots = {} # event loop -> asyncio.Semaphore
+
+    def _aslots(self):
+        if not self.slots:
+            return contextlib.nullcontext()
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_slots:
+            self._async_slots[loop] = asyncio.Semaphore(self.slots)
+        return self._async_slots[loop]
+
+    def _respond(self, messages, options):
+        if self.response is not None:
+            return self.response
+        if options.get("format") == "json":
+            return '{"datasource": "vector_store", "reasoning": "stub"}'
+        digest = hashlib.sha1(json.dumps(messages).encode()).hexdigest()[:8]
+        return f"Stub answer {digest} for: {messages[-1]['content'][:80]}"
+
+    def _tokens(self, messages, options):
+        words = self._respond(messages, options).split(" ")
+        return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+    @staticmethod
+    def _prompt_tokens(messages):
+        return sum(len(m["content"].split()) for m in messages)
+
+    def chat(self, model, messages, options):
+        tokens = self._tokens(messages, options)
+        with self._sync_slots:
+            time.sleep(self.latency + self.token_latency * len(tokens))
+        return {"content": "".join(tokens), "prompt_eval_count": self._prompt_tokens(messages), "eval_count": len(tokens)}
+
+    async def achat(self, model, messages, options):
+        tokens = self._tokens(messages, options)
+        async with self._aslots():
+            await asyncio.sleep(self.latency + self.token_latency * len(tokens))
+        return {"content": "".join(tokens), "prompt_eval_count": self._prompt_tokens(messages), "eval_count": len(tokens)}
+
+    def stream(self, model, messages, options):
+        tokens = self._tokens(messages, options)
+        with self._sync_slots:
+            time.sleep(self.latency)
+            for token in tokens:
+                time.sleep(self.token_latency)
+                yield {"content": token}
+        yield {"content": "", "prompt_eval_count": self._prompt_tokens(messages), "eval_count": len(tokens)}
+
+    async def astream(self, model, messages, options):
+        tokens = self._tokens(messages, options)
+        async with self._aslots():
+            await asyncio.sleep(self.latency)
+            for token in tokens:
+                await asyncio.sleep(self.token_latency)
+                yield {"content": token}
+        yield {"content": "", "prompt_eval_count": self._prompt_tokens(messages), "eval_count": len(tokens)}
+
+BACKENDS = {"ollama": OllamaBackend, "stub": StubBackend}
+
+class _PendingCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class _SharedStream:
+    # Chunks of one generation, replayed to every consumer that asked for the same prompt
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.consumers = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def push(self, chunk=None, error=None, finished=False):
+        if chunk is not None:
+            self.chunks.append(chunk)
+        self.error = error or self.error
+        self.finished = self.finished or finished
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def replay(self):
+        i = 0
+        while True:
+            changed = self._changed
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.finished:
+                if self.error:
+                    raise self.error
+                return
+            await changed.wait()
+
+class LLMGateway:
+    """Single entry point for chat completions: one pooled backend client for all agents, plus
+    coalescing of identical in-flight prompts into one generation."""
+
+    def __init__(self, backend=None, model=config.LLM_MODEL, coalesce=config.LLM_COALESCE_ENABLED):
+        self.backend = backend or BACKENDS[config.LLM_BACKEND]()
+        self.model = model
+        self.coalesce = coalesce
+        self.stats = {"requests": 0, "backend_calls": 0, "coalesced": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._pending = {} # prompt key -> _PendingCall (sync callers)
+        self._apending = {} # (loop, prompt key) -> asyncio.Task
+        self._streams = {} # (loop, prompt key) -> _SharedStream
+
+    def _key(self, messages, options):
+        blob = json.dumps({"model": self.model, "messages": messages, "options": options}, sort_keys=True)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _call(self, messages, options):
+        self._count("backend_calls")
+        try:
+            with span("llm.backend"):
+                return self.backend.chat(self.model, messages, options)
+        except Exception:
+            self._count("errors")
+            raise
+
+    async def _acall(self, messages, options):
+        self._count("backend_calls")
+        try:
+            with span("llm.backend"):
+                return await self.backend.achat(self.model, messages, options)
+        except Exception:
+            self._count("errors")
+            raise
+
+    def chat(self, messages, **options):
+        self._count("requests")
+        if not self.coalesce:
+            return self._call(messages, options)
+        key = self._key(messages, options)
+        with self._lock:
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _PendingCall()
+            else:
+                self.stats["coalesced"] += 1
+        if leader:
+            try:
+                pending.result = self._call(messages, options)
+            except Exception as e:
+                pending.error = e
+            finally:
+                with self._lock:
+                    self._pending.pop(key, None)
+                pending.done.set()
+        else:
+            pending.done.wait()
+        if pending.error:
+            raise pending.error
+        return pending.result
+
+    async def achat(self, messages, **options):
+        self._count("requests")
+        if not self.coalesce:
+            return await self._acall(messages, options)
+        key = (id(asyncio.get_running_loop()), self._key(messages, options))
+        task = self._apending.get(key)
+        if task is None:
+            task = self._apending[key] = asyncio.ensure_future(self._acall(messages, options))
+            task.add_done_callback(lambda _: self._apending.pop(key, None))
+        else:
+            self._count("coalesced")
+        # Shielded so one caller going away does not cancel the generation the others are waiting on
+        return await asyncio.shield(task)
+
+    def stream(self, messages, **options):
+        self._count("requests")
+        self._count("backend_calls")
+        yield from self.backend.stream(self.model, messages, options)
+
+    async def astream(self, messages, **options):
+        self._count("requests")
+        if not self.coalesce:
+            self._count("backend_calls")
+            async for chunk in self.backend.astream(self.model, messages, options):
+                yield chunk
+            return
+        key = (id(asyncio.get_running_loop()), self._key(messages, options))
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = self._streams[key] = _SharedStream()
+            shared.task = asyncio.ensure_future(self._pump(key, shared, messages, options))
+        else:
+            self._count("coalesced")
+        shared.consumers += 1
+        try:
+            async for chunk in shared.replay():
+                yield chunk
+        finally:
+            shared.consumers -= 1
+            if not shared.consumers and not shared.finished:
+                shared.task.cancel() # Nobody is listening any more
+                self._streams.pop(key, None)
+
+    async def _pump(self, key, shared, messages, options):
+        # Runs the generation once, independently of any single consumer
+        self._count("backend_calls")
+        try:
+            with span("llm.backend"):
+                async for chunk in self.backend.astream(self.model, messages, options):
+                    shared.push(chunk)
+            shared.push(finished=True)
+        except Exception as e:
+            self._count("errors")
+            shared.push(error=e, finished=True)
+        finally:
+            if self._streams.get(key) is shared:
+                del self._streams[key]
+
+_default_gateway = None
+_default_lock = threading.Lock()
+
+def get_gateway():
+    # Process-wide gateway shared by every agent that isn't handed its own LLM
+    global _default_gateway
+    with _default_lock:
+        if _default_gateway is None:
+            _default_gateway = LLMGateway()
+        return _default_gateway
+
+class GatewayChatModel(BaseChatModel):
+    """LangChain chat model backed by the shared LLMGateway."""
+
+    gateway: Any = None
+    temperature: Optional[float] = None
+    format: Optional[str] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "llm-gateway"
+
+    def _gateway(self):
+        return self.gateway or get_gateway()
+
+    def _options(self, stop):
+        return {"temperature": self.temperature, "format": self.format, "stop": stop}
+
+    @staticmethod
+    def _info(result):
+        return {k: result[k] for k in ("prompt_eval_count", "eval_count") if result.get(k) is not None}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        result = self._gateway().chat(to_chat_messages(messages), **self._options(stop))
+        message = AIMessage(content=result["content"])
+        return ChatResult(generations=[ChatGeneration(message=message, generation_info=self._info(result))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        result = await self._gateway().achat(to_chat_messages(messages), **self._options(stop))
+        message = AIMessage(content=result["content"])
+        return ChatResult(generations=[ChatGeneration(message=message, generation_info=self._info(result))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for result in self._gateway().stream(to_chat_messages(messages), **self._options(stop)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=result["content"]),
+                                        generation_info=self._info(result) or None)
+            if run_manager and result["content"]:
+                run_manager.on_llm_new_token(result["content"], chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        async for result in self._gateway().astream(to_chat_messages(messages), **self._options(stop)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=result["content"]),
+                                        generation_info=self._info(result) or None)
+            if run_manager and result["content"]:
+                await run_manager.on_llm_new_token(result["content"], chunk=chunk)
+            yield chunk
@@ -0,0 +1,120 @@
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+
+class SharedCache:
+    """Key -> value table in a SQLite WAL database that every API worker on the box opens, with LRU + TTL
+    eviction. Values are pickled. An entry can carry a vector (for similarity lookups) and a tag (the index
+    version or database signature it was computed from); lookups only see entries with the current tag."""
+
+    def __init__(self, path: str, namespace: str, max_entries=None, ttl_seconds=None):
+        if not re.fullmatch(r"[a-z_]+", namespace):
+            raise ValueError(f"Invalid cache namespace: {namespace!r}")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.table = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL") # Readers in other workers never block the writer
+        self._conn.execute("PRAGMA synchronous=NORMAL") # A cache can afford to lose the last commits on power loss
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, tag TEXT, "
+                           "created_at REAL NOT NULL, used_at REAL NOT NULL, vector BLOB, value BLOB NOT NULL)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_used_at ON {self.table} (used_at)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._data_version = None
+
+    def _expired(self, created_at):
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def get(self, key: str, tag=None):
+        with self._lock:
+            row = self._conn.execute(f"SELECT created_at, value FROM {self.table} WHERE key = ? AND tag IS ?",
+                                     (key, tag)).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[0]):
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET used_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return pickle.loads(row[1])
+
+    def put(self, key: str, value, vector=None, tag=None):
+        # Returns the number of least recently used entries evicted to stay under max_entries
+        now = time.time()
+        blob = np.asarray(vector, dtype=np.float32).tobytes() if vector is not None else None
+        with self._lock:
+            self._conn.execute(f"INSERT OR REPLACE INTO {self.table} (key, tag, created_at, used_at, vector, value) "
+                               "VALUES (?, ?, ?, ?, ?, ?)", (key, tag, now, now, blob, pickle.dumps(value)))
+            evicted = 0
+            if self.max_entries is not None:
+                evicted = self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} "
+                    "ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)).rowcount
+            self._conn.commit()
+            return evicted
+
+    def update(self, key: str, merge, tag=None):
+        # Atomic read-modify-write across workers: merge(current value or None) returns the value to store,
+        # or None to leave the entry alone. Returns what merge returned.
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE") # Holds the write lock from the read until the commit
+            try:
+                row = self._conn.execute(f"SELECT created_at, value FROM {self.table} WHERE key = ? AND tag IS ?",
+                                         (key, tag)).fetchone()
+                value = merge(pickle.loads(row[1]) if row is not None and not self._expired(row[0]) else None)
+                if value is not None:
+                    now = time.time()
+                    self._conn.execute(f"INSERT OR REPLACE INTO {self.table} (key, tag, created_at, used_at, vector, "
+                                       "value) VALUES (?, ?, ?, ?, NULL, ?)", (key, tag, now, now, pickle.dumps(value)))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            return value
+
+    def delete(self, key: str):
+        with self._lock:
+            deleted = self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,)).rowcount
+            self._conn.commit()
+            return deleted > 0
+
+    def delete_other_tags(self, tag):
+        # Drops entries computed from an older index / database; safe for every worker to run
+        with self._lock:
+            deleted = self._conn.execute(f"DELETE FROM {self.table} WHERE tag IS NOT ?", (tag,)).rowcount
+            self._conn.commit()
+            return deleted
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def vectors(self, tag=None):
+        # (keys, unit-vector matrix or None) of the live entries with this tag
+        with self._lock:
+            rows = self._conn.execute(f"SELECT key, created_at, vector FROM {self.table} "
+                                      "WHERE tag IS ? AND vector IS NOT NULL", (tag,)).fetchall()
+        rows = [(key, vector) for key, created_at, vector in rows if not self._expired(created_at)]
+        if not rows:
+            return [], None
+        return [key for key, _ in rows], np.stack([np.frombuffer(vector, dtype=np.float32) for _, vector in rows])
+
+    def changed(self):
+        # True when another worker has written since the last call (PRAGMA data_version ignores our own writes)
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        changed, self._data_version = version != self._data_version, version
+        return changed
@@ -0,0 +1,202 @@
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+from app.core.config import config
+
+# Structured logging, spans and a small Prometheus-compatible metrics registry (no extra dependency)
+
+trace_id_var = contextvars.ContextVar("trace_id", default=None)
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        trace_id = trace_id_var.get()
+        if trace_id:
+            payload["trace_id"] = trace_id
+        payload.update({k: v for k, v in vars(record).items() if k not in _STANDARD_ATTRS})
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+def get_logger(name: str):
+    return logging.getLogger(f"app.{name}")
+
+def configure_logging():
+    root = logging.getLogger("app")
+    root.handlers.clear()
+    root.propagate = False
+    if not config.LOG_ENABLED:
+        root.addHandler(logging.NullHandler())
+        root.setLevel(logging.CRITICAL + 1)
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if config.LOG_JSON else
+                         logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(config.LOG_LEVEL)
+
+def new_trace_id():
+    trace_id = uuid.uuid4().hex[:16]
+    trace_id_var.set(trace_id)
+    return trace_id
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.buckets = name, help_text, tuple(buckets)
+        self._series = {} # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets): # Above the last bound only counts toward +Inf
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(key, le=bound)} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(key, le='+Inf')} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(key)} {series[-1]}")
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name, self.help = name, help_text
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines += [f"{self.name}{_labels(key)} {value}" for key, value in sorted(self._series.items())]
+        return lines
+
+def _labels(key, **extra):
+    items = list(key) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+SPAN_SECONDS = Histogram("rag_span_duration_seconds", "Duration of graph nodes and external calls")
+SPAN_ERRORS = Counter("rag_span_errors_total", "Spans that raised")
+LLM_CALLS = Counter("rag_llm_calls_total", "LLM completions")
+LLM_PROMPT_TOKENS = Counter("rag_llm_prompt_tokens_total", "Prompt tokens sent to the LLM")
+LLM_COMPLETION_TOKENS = Counter("rag_llm_completion_tokens_total", "Tokens generated by the LLM")
+LLM_TOKENS_PER_SECOND = Histogram("rag_llm_tokens_per_second", "Generation speed per completion",
+                                  buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 200))
+RETRIEVAL_HITS = Histogram("rag_retrieval_hits", "Documents returned per retrieval leg",
+                           buckets=(0, 1, 2, 5, 10, 20, 50))
+CONTEXT_TOKENS = Counter("rag_context_tokens_total", "Context tokens before (candidates) and after (packed) reranking")
+CONTEXT_TOKENS_SAVED = Counter("rag_context_tokens_saved_total", "Prompt tokens removed by rerank + packing")
+_METRICS = [SPAN_SECONDS, SPAN_ERRORS, LLM_CALLS, LLM_PROMPT_TOKENS, LLM_COMPLETION_TOKENS,
+            LLM_TOKENS_PER_SECOND, RETRIEVAL_HITS, CONTEXT_TOKENS, CONTEXT_TOKENS_SAVED]
+
+_collectors = {} # name -> callable returning {metric_name: value} gauges (e.g. cache stats)
+
+def register_collector(name, collect):
+    _collectors[name] = collect
+
+def render_prometheus():
+    lines = []
+    for metric in _METRICS:
+        lines += metric.render()
+    for name, collect in list(_collectors.items()):
+        try:
+            values = collect()
+        except Exception:
+            continue
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metric = f"rag_{name}_{key}"
+                lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+    return "\n".join(lines) + "\n"
+
+_span_logger = get_logger("trace")
+
+def record_span(name: str, seconds: float, failed: bool = False, **attrs):
+    # For spans whose name is only known once the block has run (see span() for the usual case)
+    if failed:
+        SPAN_ERRORS.inc(span=name)
+    SPAN_SECONDS.observe(seconds, span=name)
+    _span_logger.debug("span", extra={"span": name, "ms": round(seconds * 1000, 2), **attrs})
+
+@contextmanager
+def span(name: str, **attrs):
+    # Times a block (sync or inside async code) into rag_span_duration_seconds{span=name}
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield attrs
+    except Exception:
+        failed = True
+        raise
+    finally:
+        record_span(name, time.perf_counter() - start, failed, **attrs)
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records call counts, token counts and tokens/sec for any LangChain chat model it is attached to."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self._runs = {} # run_id -> [start, streamed tokens]
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._runs[run_id] = [time.perf_counter(), 0]
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._runs[run_id] = [time.perf_counter(), 0]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id in self._runs:
+            self._runs[run_id][1] += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start, streamed = self._runs.pop(run_id, [time.perf_counter(), 0])
+        seconds = time.perf_counter() - start
+        info = {}
+        for generations in response.generations:
+            for generation in generations:
+                info.update(generation.generation_info or {})
+        # Ollama reports exact counts; otherwise fall back to the number of streamed chunks
+        completion = info.get("eval_count") or streamed
+        prompt = info.get("prompt_eval_count") or 0
+        LLM_CALLS.inc(llm=self.label)
+        LLM_PROMPT_TOKENS.inc(prompt, llm=self.label)
+        LLM_COMPLETION_TOKENS.inc(completion, llm=self.label)
+        if completion and seconds > 0:
+            LLM_TOKENS_PER_SECOND.observe(completion / seconds, llm=self.label)
+        SPAN_SECONDS.observe(seconds, span=f"llm.{self.label}")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
+        SPAN_ERRORS.inc(span=f"llm.{self.label}")
@@ -2,18 +2,36 @@ import streamlit as st
 import requests
 import os
 import shutil
-
-import time
-
-def stream_data(text):
-    for word in text.split(" "):
-        yield word + " "
-        time.sleep(0.04)
+import json
+import uuid
 
 # Config
-API_URL = "http://localhost:8000/query"
+STREAM_URL = "http://localhost:8000/query/stream"
+SESSIONS_URL = "http://localhost:8000/sessions"
 DATA_DIR = "data"
 
+def stream_answer(response, result):
+    # Parse the Server-Sent Events from /query/stream, yielding answer tokens as they arrive
+    # and collecting route/documents into `result` for rendering afterwards.
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            data = json.loads(line[len("data: "):])
+            if event == "token":
+                yield data["token"]
+            elif event == "rewrite":
+                result["standalone_question"] = data["standalone_question"]
+            elif event == "route":
+                result["datasource"] = data["datasource"]
+            elif event == "documents":
+                result["documents"] = data["documents"]
+            elif event == "error":
+                result["error"] = data["detail"]
+            elif event == "done":
+                result["ttft_ms"] = data.get("ttft_ms")
+
 st.set_page_config(page_title="Agentic RAG Assistant", layout="wide")
 
 st.title("🤖 Agentic RAG Assistant")
@@ -46,20 +64,29 @@ with st.sidebar:
         
         # Ingest if files exist (either uploaded or pre-existing)
         if existing_files or uploaded_files:
-            with st.spinner("Ingesting documents into Milvus (this may take a while)..."):
+            with st.spinner("Ingesting documents into the vector store (this may take a while)..."):
                 import subprocess
+                # Builds a new index generation; the current one keeps answering questions meanwhile
                 subprocess.run(["python", "-m", "app.ingestion.ingest"], check=True)
-            st.success("Ingestion Complete!")
+            st.success("Ingestion Complete! The API switches to the new index on its next search.")
         else:
             st.warning("No files found to ingest. Please upload data.")
 
     if st.button("Clear Chat"):
         st.session_state.messages = []
+        if "session_id" in st.session_state:
+            # Forget the conversation server-side too; the next question starts a new session
+            try:
+                requests.delete(f"{SESSIONS_URL}/{st.session_state.pop('session_id')}")
+            except requests.exceptions.ConnectionError:
+                pass
         st.rerun()
 
 # Chat Interface
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
@@ -71,16 +98,20 @@ if prompt := st.chat_input("What would you like to know?"):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                response = requests.post(API_URL, json={"question": prompt})
+        try:
+            with requests.post(STREAM_URL, json={"question": prompt, "session_id": st.session_state.session_id},
+                               stream=True) as response:
                 if response.status_code == 200:
-                    data = response.json()
-                    answer = data.get("answer", "No answer.")
-                    datasource = data.get("datasource", "unknown")
-                    docs = data.get("documents", [])
+                    result = {}
+                    answer = st.write_stream(stream_answer(response, result)) or "No answer."
+                    datasource = result.get("datasource", "unknown")
+                    docs = result.get("documents", [])
                     
-                    st.write_stream(stream_data(answer))
+                    if "standalone_question" in result:
+                        st.caption(f"Searched for: {result['standalone_question']}")
+
+                    if "error" in result:
+                        st.error(f"Error: {result['error']}")
                     
                     if docs:
                         with st.expander(f"📚 Sources ({datasource})"):
@@ -92,6 +123,6 @@ if prompt := st.chat_input("What would you like to know?"):
                     st.session_state.messages.append({"role": "assistant", "content": answer})
                 else:
                     st.error(f"Error: {response.text}")
-            except requests.exceptions.ConnectionError:
-                st.error("Cannot connect to Backend API. Is it running?")
+        except requests.exceptions.ConnectionError:
+            st.error("Cannot connect to Backend API. Is it running?")
 
@@ -0,0 +1,400 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+import numpy as np
+from typing import Iterable, Optional
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from app.core.config import config
+from app.core.telemetry import get_logger
+from app.index.sparse import _map_bytes, _replace_dir
+
+logger = get_logger("index.dense")
+
+# Embedded vector store: an in-process alternative to Milvus.
+#
+# On-disk layout (arrays are .npy so they can be memory-mapped without copying):
+#   vectors.npy                       N x dim matrix (float32 or float16), L2-normalized so dot product = cosine
+#   docs.bin / doc_offsets.npy        chunk JSON (id + page_content + metadata) + offsets
+#   field_<name>.npy                  per-chunk codes of each filterable metadata field (vocabularies in meta.json)
+#   ivf_centroids.npy, ivf_offsets.npy, ivf_rows.npy   inverted lists (index_type "ivf")
+#   hnsw.bin                          graph built by hnswlib (index_type "hnsw")
+#   meta.json                         counts, dtype, index type
+#
+# Writes (add/delete) are appended to <index_dir>.staging and merged into a fresh build by persist(),
+# which swaps it into place. Readers pick up the new build on their next search.
+
+SEARCH_BLOCK_ROWS = 8192 # Rows scored per matmul; bounds (and keeps in cache) the float32 copy of a float16 block
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _top_k(scores, k):
+    if len(scores) > k:
+        top = np.argpartition(-scores, k)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+def train_ivf(vectors, nlist: int, iterations: int = 10, seed: int = 0):
+    # Spherical k-means on a sample; returns the centroids and every row's list
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * 256)
+    sample = _normalize(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = np.bincount(assignment, minlength=nlist) == 0
+        sums[empty] = centroids[empty] # Keep empty lists where they were
+        centroids = _normalize(sums)
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+        assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return centroids, assignment
+
+class DenseIndex:
+    """Read-only vector index. The matrix and chunk store are memory-mapped, so loading is O(1)
+    and worker processes share the page cache."""
+
+    def __init__(self, index_dir: str = config.EMBEDDED_INDEX_DIR):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+        self.vectors = load("vectors")
+        self.doc_offsets = load("doc_offsets")
+        self._docs = _map_bytes(os.path.join(index_dir, "docs.bin"))
+        self.fields = {name: (load(f"field_{name}"), {value: code for code, value in enumerate(values)})
+                       for name, values in self.meta["fields"].items()}
+        self.index_type = self.meta["index_type"]
+        self._hnsw = None
+        if self.index_type == "ivf":
+            self.ivf_centroids = load("ivf_centroids")
+            self.ivf_offsets = load("ivf_offsets")
+            self.ivf_rows = load("ivf_rows")
+        elif self.index_type == "hnsw":
+            import hnswlib
+            self._hnsw = hnswlib.Index(space="ip", dim=self.meta["dim"])
+            self._hnsw.load_index(os.path.join(index_dir, "hnsw.bin"), max_elements=len(self))
+            self._hnsw.set_ef(config.EMBEDDED_HNSW_EF_SEARCH)
+
+    def __len__(self):
+        return self.meta["num_docs"]
+
+    def record(self, row: int):
+        return json.loads(self._docs[self.doc_offsets[row]:self.doc_offsets[row + 1]])
+
+    def document(self, row: int):
+        data = self.record(row)
+        return Document(id=data["id"], page_content=data["page_content"], metadata=data["metadata"])
+
+    def filter_rows(self, filter: dict):
+        # {"type": "excel"} or {"type": ["csv", "excel"], "source": ...}: AND across fields, OR within one
+        mask = np.ones(len(self), dtype=bool)
+        for name, wanted in filter.items():
+            if name not in self.fields:
+                raise ValueError(f"Metadata field '{name}' is not filterable (see EMBEDDED_FILTER_FIELDS)")
+            codes, vocabulary = self.fields[name]
+            values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            mask &= np.isin(codes, [vocabulary[v] for v in values if v in vocabulary])
+        return np.flatnonzero(mask)
+
+    def _score_rows(self, rows, query):
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), SEARCH_BLOCK_ROWS):
+            block = rows[start:start + SEARCH_BLOCK_ROWS]
+            scores[start:start + len(block)] = np.asarray(self.vectors[block], dtype=np.float32) @ query
+        return scores
+
+    def search(self, query_vector, k: int = 5, filter: Optional[dict] = None, nprobe: Optional[int] = None):
+        # Returns [(row, cosine similarity)] best first
+        if not len(self):
+            return []
+        query = _normalize(query_vector)
+        rows = self.filter_rows(filter) if filter else None
+        if self.index_type == "hnsw" and rows is None:
+            labels, distances = self._hnsw.knn_query(query, k=min(k, len(self)))
+            return [(int(row), 1.0 - float(d)) for row, d in zip(labels[0], distances[0])]
+        if self.index_type == "ivf":
+            nprobe = min(nprobe or config.EMBEDDED_IVF_NPROBE, len(self.ivf_centroids))
+            probed = _top_k(self.ivf_centroids @ query, nprobe)
+            candidates = np.sort(np.concatenate([self.ivf_rows[self.ivf_offsets[i]:self.ivf_offsets[i + 1]]
+                                                 for i in probed]))
+            rows = candidates if rows is None else np.intersect1d(candidates, rows, assume_unique=True)
+        if rows is None:
+            # Exact scan over the whole matrix, a block at a time
+            scores = np.empty(len(self), dtype=np.float32)
+            for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+                block = np.asarray(self.vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+                scores[start:start + len(block)] = block @ query
+            top = _top_k(scores, k)
+            return [(int(row), float(scores[row])) for row in top]
+        scores = self._score_rows(rows, query)
+        top = _top_k(scores, k)
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+def _staged_records(staging_dir: str, dim: int):
+    # Staged rows by id (a re-added id replaces the earlier row, so a replayed batch is harmless)
+    vectors_path = os.path.join(staging_dir, "vectors.f32")
+    latest = {}
+    if not dim or not os.path.exists(vectors_path):
+        return latest, None
+    rows = os.path.getsize(vectors_path) // (4 * dim)
+    with open(os.path.join(staging_dir, "docs.jsonl"), "a+b") as f:
+        f.seek(0)
+        for row in range(rows):
+            offset, line = f.tell(), f.readline()
+            if not line.endswith(b"\n"):
+                break # Partial line from an interrupted write
+            latest[json.loads(line)["id"]] = (row, offset, len(line) - 1)
+    vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(rows, dim)) if rows else None
+    return latest, vectors
+
+def build_dense_index(index_dir: str, staging_dir: str, dtype: str = config.EMBEDDED_DTYPE,
+                      index_type: str = config.EMBEDDED_INDEX_TYPE, fields=config.EMBEDDED_FILTER_FIELDS):
+    # Merges the current index (minus deleted / replaced ids) with the staged rows into a fresh build
+    with open(os.path.join(staging_dir, "state.json")) as f:
+        state = json.load(f)
+    deleted_path = os.path.join(staging_dir, "deleted.txt")
+    deleted = set()
+    if os.path.exists(deleted_path):
+        with open(deleted_path) as f:
+            deleted = {line.rstrip("\n") for line in f if line.strip()}
+
+    base = None
+    base_dir = state.get("base_dir") or index_dir # copy_from() bases the build on another index
+    if not state["drop_base"] and os.path.exists(os.path.join(base_dir, "meta.json")):
+        base = DenseIndex(base_dir)
+    dim = state.get("dim") or (base.meta["dim"] if base else 0)
+    latest, staged_vectors = _staged_records(staging_dir, dim)
+    for chunk_id in deleted:
+        latest.pop(chunk_id, None)
+    keep = []
+    if base is not None:
+        for row in range(len(base)):
+            chunk_id = base.record(row)["id"]
+            if chunk_id not in deleted and chunk_id not in latest:
+                keep.append(row)
+    staged = sorted(latest.values())
+    num_docs = len(keep) + len(staged)
+
+    build_dir = f"{index_dir}.build"
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+    matrix = np.lib.format.open_memmap(os.path.join(build_dir, "vectors.npy"), mode="w+",
+                                       dtype=np.dtype(dtype), shape=(num_docs, dim))
+    doc_offsets = [0]
+    vocabularies = {name: {} for name in fields}
+    codes = {name: np.empty(num_docs, dtype=np.int32) for name in fields}
+    out = 0
+    with open(os.path.join(build_dir, "docs.bin"), "wb") as docs, \
+         open(os.path.join(staging_dir, "docs.jsonl"), "a+b") as staged_docs:
+        def write(record, blob):
+            for name in fields:
+                value = record["metadata"].get(name)
+                codes[name][out] = vocabularies[name].setdefault(value, len(vocabularies[name]))
+            docs.write(blob)
+            doc_offsets.append(doc_offsets[-1] + len(blob))
+
+        keep = np.asarray(keep, dtype=np.int64)
+        for start in range(0, len(keep), SEARCH_BLOCK_ROWS):
+            block = keep[start:start + SEARCH_BLOCK_ROWS]
+            matrix[out:out + len(block)] = base.vectors[block]
+            for row in block:
+                blob = base._docs[base.doc_offsets[row]:base.doc_offsets[row + 1]]
+                write(json.loads(blob), blob)
+                out += 1
+        for start in range(0, len(staged), SEARCH_BLOCK_ROWS):
+            block = staged[start:start + SEARCH_BLOCK_ROWS]
+            matrix[out:out + len(block)] = _normalize(staged_vectors[[row for row, _, _ in block]])
+            for _, offset, length in block:
+                staged_docs.seek(offset)
+                blob = staged_docs.read(length)
+                write(json.loads(blob), blob)
+                out += 1
+    matrix.flush()
+
+    np.save(os.path.join(build_dir, "doc_offsets.npy"), np.asarray(doc_offsets, dtype=np.int64))
+    for name in fields:
+        np.save(os.path.join(build_dir, f"field_{name}.npy"), codes[name])
+
+    if index_type != "flat" and num_docs < config.EMBEDDED_ANN_MIN_ROWS:
+        index_type = "flat" # Exact search is fast enough, and exact
+    if index_type == "hnsw":
+        try:
+            import hnswlib
+        except ImportError:
+            logger.warning("hnswlib is not installed; building a flat index instead")
+            index_type = "flat"
+    if index_type == "ivf":
+        nlist = config.EMBEDDED_IVF_NLIST or int(4 * np.sqrt(num_docs))
+        centroids, assignment = train_ivf(matrix, nlist)
+        np.save(os.path.join(build_dir, "ivf_centroids.npy"), centroids)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=nlist), out=offsets[1:])
+        np.save(os.path.join(build_dir, "ivf_offsets.npy"), offsets)
+        np.save(os.path.join(build_dir, "ivf_rows.npy"), np.argsort(assignment, kind="stable").astype(np.int32))
+    elif index_type == "hnsw":
+        graph = hnswlib.Index(space="ip", dim=dim)
+        graph.init_index(max_elements=num_docs, ef_construction=config.EMBEDDED_HNSW_EF_CONSTRUCTION,
+                         M=config.EMBEDDED_HNSW_M)
+        for start in range(0, num_docs, SEARCH_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            graph.add_items(block, np.arange(start, start + len(block)))
+        graph.save_index(os.path.join(build_dir, "hnsw.bin"))
+
+    with open(os.path.join(build_dir, "meta.json"), "w") as f:
+        json.dump({"num_docs": num_docs, "dim": dim, "dtype": str(np.dtype(dtype)), "index_type": index_type,
+                   "fields": {name: list(vocabularies[name]) for name in fields}}, f)
+    del matrix
+    base = None
+    _replace_dir(build_dir, index_dir)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    logger.info("Built dense index", extra={"chunks": num_docs, "dim": dim, "index_type": index_type})
+    return num_docs
+
+class EmbeddedVectorStore(VectorStore):
+    """LangChain vector store over a DenseIndex, so it can stand in for Milvus."""
+
+    def __init__(self, embedding_function, index_dir: str = config.EMBEDDED_INDEX_DIR, drop_old: bool = False):
+        self.embedding_function = embedding_function
+        self.index_dir = index_dir
+        self.staging_dir = f"{index_dir}.staging"
+        self._index = None
+        self._index_stamp = None
+        self._lock = threading.Lock()
+        if drop_old:
+            # Like Milvus' drop_old, but the old index keeps serving until persist() swaps in the new one
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+            self._staging_state(drop_base=True)
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    @property
+    def index(self):
+        # Reopen when a newer build has been swapped in (e.g. by an ingest in another process)
+        meta_path = os.path.join(self.index_dir, "meta.json")
+        try:
+            stat = os.stat(meta_path)
+        except FileNotFoundError:
+            self._index, self._index_stamp = None, None
+            return None
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp != self._index_stamp:
+            with self._lock:
+                if stamp != self._index_stamp:
+                    self._index, self._index_stamp = DenseIndex(self.index_dir), stamp
+        return self._index
+
+    def __len__(self):
+        index = self.index
+        return len(index) if index is not None else 0
+
+    def _staging_state(self, **updates):
+        os.makedirs(self.staging_dir, exist_ok=True)
+        path = os.path.join(self.staging_dir, "state.json")
+        state = {"drop_base": False, "dim": None, "base_dir": None}
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+        if updates:
+            state.update(updates)
+            with open(path, "w") as f:
+                json.dump(state, f)
+        return state
+
+    def add_embeddings(self, texts: list, embeddings: list, metadatas: Optional[list] = None,
+                       ids: Optional[list] = None):
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if not len(vectors):
+            return []
+        with self._lock:
+            state = self._staging_state()
+            if state["dim"] is None:
+                state = self._staging_state(dim=vectors.shape[1])
+            elif state["dim"] != vectors.shape[1]:
+                raise ValueError(f"Expected {state['dim']}-dimensional vectors, got {vectors.shape[1]}")
+            # Vectors first: a crash between the two writes leaves rows without docs, which are ignored
+            with open(os.path.join(self.staging_dir, "vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(os.path.join(self.staging_dir, "docs.jsonl"), "a", encoding="utf-8") as f:
+                for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                    f.write(json.dumps({"id": chunk_id, "page_content": text, "metadata": metadata}) + "\n")
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[list] = None, ids: Optional[list] = None,
+                  **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embedding_function.embed_documents(texts), metadatas, ids)
+
+    def delete(self, ids: Optional[list] = None, **kwargs):
+        if not ids:
+            return False
+        with self._lock:
+            self._staging_state()
+            with open(os.path.join(self.staging_dir, "deleted.txt"), "a") as f:
+                f.writelines(f"{chunk_id}\n" for chunk_id in ids)
+        return True
+
+    def copy_from(self, index_dir: str, exclude_ids=()):
+        # Starts the next build from another index (e.g. the previous generation's) minus exclude_ids;
+        # its rows are copied by persist(), without re-embedding
+        with self._lock:
+            self._staging_state(base_dir=index_dir, drop_base=False)
+            with open(os.path.join(self.staging_dir, "deleted.txt"), "a") as f:
+                f.writelines(f"{chunk_id}\n" for chunk_id in exclude_ids)
+
+    def persist(self):
+        # Merge staged writes into a new build and swap it in; returns the number of indexed chunks
+        if not os.path.exists(os.path.join(self.staging_dir, "state.json")):
+            return len(self)
+        with self._lock:
+            return build_dense_index(self.index_dir, self.staging_dir)
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, filter: Optional[dict] = None,
+                                               **kwargs):
+        index = self.index
+        if index is None:
+            return []
+        return [(index.document(row), score) for row, score in
+                index.search(embedding, k, filter=filter, nprobe=kwargs.get("nprobe"))]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, filter: Optional[dict] = None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs):
+        if not len(self):
+            return [] # Nothing indexed yet: skip embedding the query
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k,
+                                                           filter, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0 # Cosine similarity -> [0, 1]
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        store.persist()
+        return store
+
+if __name__ == "__main__":
+    from app.core.embeddings import CachedEmbeddings
+    store = EmbeddedVectorStore(CachedEmbeddings())
+    print(f"{len(store)} chunks in {store.index_dir}")
+    for doc in store.similarity_search("refund policy", k=3):
+        print(f"{doc.metadata.get('source')}: {doc.page_content[:100]}...")
@@ -0,0 +1,209 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Optional
+from app.core.config import config
+from app.core.telemetry import get_logger
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+logger = get_logger("index.generations")
+
+# Every ingest builds a complete new index generation next to the one being served, then publishes it
+# by atomically replacing the CURRENT pointer file:
+#   <INDEX_ROOT>/CURRENT              id of the published generation
+#   <INDEX_ROOT>/.build.lock          held by the ingest that is building (see build_lock)
+#   <INDEX_ROOT>/<id>/generation.json  backend, Milvus collection, created / published times
+#   <INDEX_ROOT>/<id>/sparse/          BM25 index
+#   <INDEX_ROOT>/<id>/vectors/         embedded dense index (VECTOR_STORE_BACKEND = "embedded")
+#   <INDEX_ROOT>/<id>/faq/             FAQ index (+ faq.chunks.json)
+#   <INDEX_ROOT>/<id>/manifest.json    files and chunk IDs the generation contains
+# With Milvus the dense side is a collection per generation (<COLLECTION_NAME>_<id>). A generation is never
+# modified once published, so readers that resolve the pointer see a whole index, never a half-built one.
+
+ID_PATTERN = re.compile(r"\d{14}_[0-9a-f]{6}") # Sorts by creation time; also valid in a Milvus collection name
+
+@dataclass(frozen=True)
+class Generation:
+    id: Optional[str] # None: the pre-generation layout (config.SPARSE_INDEX_DIR etc.)
+    sparse_dir: str
+    dense_dir: str
+    faq_dir: str
+    manifest_path: str
+    collection: str
+    backend: Optional[str] = None
+    created_at: float = 0.0
+    published_at: Optional[float] = None
+
+class BuildInProgress(Exception):
+    pass
+
+def _pointer_path(root: str):
+    return os.path.join(root, "CURRENT")
+
+def _generation(generation_id: str, root: str, **info):
+    path = os.path.join(root, generation_id)
+    return Generation(id=generation_id, sparse_dir=os.path.join(path, "sparse"), dense_dir=os.path.join(path, "vectors"),
+                      faq_dir=os.path.join(path, "faq"), manifest_path=os.path.join(path, "manifest.json"),
+                      collection=f"{config.COLLECTION_NAME}_{generation_id}", **info)
+
+def legacy_generation():
+    # Indexes written before generations existed; served until the first generation is published
+    return Generation(id=None, sparse_dir=config.SPARSE_INDEX_DIR, dense_dir=config.EMBEDDED_INDEX_DIR,
+                      faq_dir=config.FAQ_INDEX_DIR, manifest_path=config.INGEST_MANIFEST_PATH,
+                      collection=config.COLLECTION_NAME, backend=config.VECTOR_STORE_BACKEND)
+
+def _write_info(generation: Generation, root: str):
+    path = os.path.join(root, generation.id, "generation.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"backend": generation.backend, "created_at": generation.created_at,
+                   "published_at": generation.published_at}, f)
+    os.replace(tmp_path, path)
+
+def load_generation(generation_id: str, root: str = config.INDEX_ROOT):
+    # None if the generation does not exist (e.g. collected, or never fully created)
+    try:
+        with open(os.path.join(root, generation_id, "generation.json")) as f:
+            info = json.load(f)
+    except FileNotFoundError:
+        return None
+    return _generation(generation_id, root, **info)
+
+def new_generation(root: str = config.INDEX_ROOT):
+    generation_id = f"{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    generation = _generation(generation_id, root, backend=config.VECTOR_STORE_BACKEND, created_at=time.time())
+    os.makedirs(os.path.join(root, generation_id))
+    _write_info(generation, root)
+    return generation
+
+def current_generation(root: str = config.INDEX_ROOT):
+    # The published generation, the legacy layout if nothing was published yet, or None if neither exists
+    try:
+        with open(_pointer_path(root)) as f:
+            generation_id = f.read().strip()
+    except FileNotFoundError:
+        legacy = legacy_generation()
+        return legacy if os.path.exists(legacy.manifest_path) or os.path.exists(legacy.sparse_dir) else None
+    return load_generation(generation_id, root)
+
+def publish(generation: Generation, root: str = config.INDEX_ROOT):
+    # Atomically makes `generation` the one every reader serves; returns it with published_at set
+    generation = replace(generation, published_at=time.time())
+    _write_info(generation, root)
+    tmp_path = f"{_pointer_path(root)}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(generation.id)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, _pointer_path(root))
+    logger.info("Published index generation", extra={"generation": generation.id})
+    return generation
+
+def _try_lock(f):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def build_lock(root: str = config.INDEX_ROOT):
+    # Held by an ingest from choosing its generation until it is published, so a second ingest cannot
+    # build alongside it and collect_garbage() cannot remove it. The OS drops the lock if the process dies.
+    # Raises BuildInProgress if another process holds it.
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".build.lock"), "a+") as f:
+        if not _try_lock(f):
+            raise BuildInProgress(f"Another ingest is building an index generation in {root}")
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+def collect_garbage(keep: int = config.INDEX_GENERATIONS_KEEP, root: str = config.INDEX_ROOT, drop_collection=None,
+                    locked: bool = False):
+    # Removes every generation except the current one and the `keep` most recently published, including
+    # builds that were never published (abandoned ingests). drop_collection(name) drops a generation's
+    # Milvus collection; a generation whose collection or files cannot be removed yet is retried next time.
+    # Takes build_lock() (locked=True: the caller already holds it) and does nothing while an ingest is
+    # building. Returns the removed generation IDs.
+    if not os.path.isdir(root):
+        return []
+    if not locked:
+        try:
+            with build_lock(root):
+                return collect_garbage(keep, root, drop_collection, locked=True)
+        except BuildInProgress:
+            logger.info("An ingest is building; not removing index generations")
+            return []
+    current = current_generation(root)
+    generations = []
+    for name in sorted(os.listdir(root)):
+        if ID_PATTERN.fullmatch(name):
+            generations.append(load_generation(name, root) or _generation(name, root, backend=None))
+    published = sorted((g for g in generations if g.published_at), key=lambda g: g.published_at)
+    keep_ids = {g.id for g in published[-keep:]} | {current.id if current else None}
+    removed = []
+    for generation in generations:
+        if generation.id in keep_ids:
+            continue
+        try:
+            if generation.backend == "milvus" and drop_collection is not None:
+                drop_collection(generation.collection)
+            shutil.rmtree(os.path.join(root, generation.id))
+        except Exception as e:
+            # e.g. Milvus is down, or (on Windows) a worker still has the files memory-mapped
+            logger.warning("Could not remove index generation", extra={"generation": generation.id, "error": str(e)})
+            continue
+        removed.append(generation.id)
+    if removed:
+        logger.info("Removed old index generations", extra={"generations": removed})
+    return removed
+
+class GenerationWatcher:
+    """Tracks the published generation for a long-lived reader. current() only re-reads the
+    pointer when its file changed, so calling it on every search costs one stat()."""
+
+    def __init__(self, root: str = config.INDEX_ROOT):
+        self.root = root
+        self._stamp = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _pointer_stamp(self):
+        try:
+            stat = os.stat(_pointer_path(self.root))
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def current(self):
+        stamp = self._pointer_stamp()
+        if stamp != self._stamp or (stamp is None and self._generation is None):
+            with self._lock:
+                generation = current_generation(self.root)
+                if generation is not None or stamp is None:
+                    self._generation, self._stamp = generation, stamp
+        return self._generation
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from app.core.config import config
+
+# One pool for the process rather than one per HybridRetriever: a retriever is built for every index
+# generation a worker switches to, and nothing would shut down the pools of the retired ones
+_leg_pool = ThreadPoolExecutor(max_workers=config.HYBRID_LEG_THREADS, thread_name_prefix="hybrid-leg")
+
+@dataclass
+class RetrievalLeg:
+    name: str
+    retriever: object # Any langchain retriever (invoke / ainvoke)
+    weight: float = 1.0
+    timeout: float = 5.0
+    filterable: bool = False # Retriever accepts a metadata filter dict (invoke(query, filter=...))
+
+@dataclass
+class HybridResult:
+    documents: list
+    timings: dict = field(default_factory=dict) # leg -> {"ms", "status", "hits"}
+    error: str = None # Set when the search failed (documents is then empty)
+
+def doc_key(doc):
+    return doc.metadata.get("chunk_id") or (doc.metadata.get("source"), doc.page_content)
+
+def reciprocal_rank_fusion(ranked_lists, weights, rrf_k=config.HYBRID_RRF_K, top_k=config.HYBRID_TOP_K):
+    # Weighted RRF: score(d) = sum_leg w_leg / (rrf_k + rank_leg(d)), deduplicated by chunk ID
+    scores, docs = {}, {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, doc in enumerate(ranked, start=1):
+            key = doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    order = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [docs[key] for key in order]
+
+class HybridRetriever:
+    """Runs every retrieval leg concurrently with its own timeout and fuses whatever came back."""
+
+    def __init__(self, legs, rrf_k=config.HYBRID_RRF_K, top_k=config.HYBRID_TOP_K):
+        self.legs = legs
+        self.rrf_k = rrf_k
+        self.top_k = top_k
+
+    def _fuse(self, outcomes):
+        weights = [leg.weight for leg in self.legs]
+        return reciprocal_rank_fusion(outcomes, weights, self.rrf_k, self.top_k)
+
+    def _result(self, outcomes, timings):
+        # One leg answering is enough; if none did, the search failed rather than found nothing
+        if any(timing["status"] == "ok" for timing in timings.values()):
+            return HybridResult(self._fuse(outcomes), timings)
+        failures = ", ".join(f"{leg}: {timing.get('error', timing['status'])}" for leg, timing in timings.items())
+        return HybridResult([], timings, error=f"every retrieval leg failed ({failures})")
+
+    @staticmethod
+    def _leg_kwargs(leg, filter):
+        return {"filter": filter} if filter and leg.filterable else {}
+
+    @classmethod
+    def _timed_invoke(cls, leg, query, filter=None):
+        start = time.perf_counter()
+        docs = leg.retriever.invoke(query, **cls._leg_kwargs(leg, filter))
+        return docs, (time.perf_counter() - start) * 1000
+
+    def retrieve(self, query: str, filter: dict = None):
+        start = time.perf_counter()
+        futures = [_leg_pool.submit(self._timed_invoke, leg, query, filter) for leg in self.legs]
+        outcomes, timings = [], {}
+        for leg, future in zip(self.legs, futures):
+            remaining = max(0.0, leg.timeout - (time.perf_counter() - start))
+            try:
+                docs, ms = future.result(timeout=remaining)
+                timings[leg.name] = {"ms": round(ms, 1), "status": "ok", "hits": len(docs)}
+            except FutureTimeoutError:
+                docs = []
+                timings[leg.name] = {"ms": round(leg.timeout * 1000, 1), "status": "timeout", "hits": 0}
+            except Exception as e:
+                docs = []
+                timings[leg.name] = {"ms": round((time.perf_counter() - start) * 1000, 1), "status": "error",
+                                     "hits": 0, "error": str(e)}
+            outcomes.append(docs)
+        return self._result(outcomes, timings)
+
+    async def _arun_leg(self, leg, query, filter=None):
+        start = time.perf_counter()
+        try:
+            docs = await asyncio.wait_for(leg.retriever.ainvoke(query, **self._leg_kwargs(leg, filter)),
+                                          timeout=leg.timeout)
+            return docs, {"ms": round((time.perf_counter() - start) * 1000, 1), "status": "ok", "hits": len(docs)}
+        except asyncio.TimeoutError:
+            return [], {"ms": round(leg.timeout * 1000, 1), "status": "timeout", "hits": 0}
+        except Exception as e:
+            return [], {"ms": round((time.perf_counter() - start) * 1000, 1), "status": "error", "hits": 0,
+                        "error": str(e)}
+
+    async def aretrieve(self, query: str, filter: dict = None):
+        results = await asyncio.gather(*(self._arun_leg(leg, query, filter) for leg in self.legs))
+        timings = {leg.name: timing for leg, (_, timing) in zip(self.legs, results)}
+        return self._result([docs for docs, _ in results], timings)
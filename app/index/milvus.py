@@ -0,0 +1,176 @@
+import json
+from langchain_community.vectorstores import Milvus
+from langchain_core.documents import Document
+from app.core.config import config
+from app.core.telemetry import get_logger
+
+logger = get_logger("index.milvus")
+
+# Typed scalar columns: name -> (Milvus type, value stored when a chunk has none). Every other
+# metadata key goes into the EXTRA_FIELD JSON column, so nothing is lost and nothing is stringified.
+SCALAR_FIELDS = {
+    "source": ("VARCHAR", ""),
+    "type": ("VARCHAR", ""),
+    "chunk_id": ("VARCHAR", ""),
+    "page": ("INT64", -1),
+    "row": ("INT64", -1),
+}
+VARCHAR_MAX_LENGTH = {"source": 1024, "type": 32, "chunk_id": 128}
+PARTITION_KEY = "type" # Chunks are partitioned by document type; filters on it only scan those partitions
+EXTRA_FIELD = "extra"
+
+def index_params(index_type: str = config.MILVUS_INDEX_TYPE):
+    params = {
+        "HNSW": {"M": config.MILVUS_HNSW_M, "efConstruction": config.MILVUS_HNSW_EF_CONSTRUCTION},
+        "IVF_FLAT": {"nlist": config.MILVUS_IVF_NLIST},
+        "IVF_PQ": {"nlist": config.MILVUS_IVF_NLIST, "m": config.MILVUS_PQ_M, "nbits": config.MILVUS_PQ_NBITS},
+        "AUTOINDEX": {},
+    }
+    if index_type not in params:
+        raise ValueError(f"Unsupported MILVUS_INDEX_TYPE: {index_type!r}")
+    return {"index_type": index_type, "metric_type": config.MILVUS_METRIC_TYPE, "params": params[index_type]}
+
+def search_params(index_type: str, metric_type: str = config.MILVUS_METRIC_TYPE):
+    params = {
+        "HNSW": {"ef": config.MILVUS_HNSW_EF},
+        "IVF_FLAT": {"nprobe": config.MILVUS_IVF_NPROBE},
+        "IVF_PQ": {"nprobe": config.MILVUS_IVF_NPROBE},
+    }
+    return {"metric_type": metric_type, "params": params.get(index_type, {})}
+
+def filter_expr(filter: dict):
+    # {"type": ["csv", "excel"], "source": "a.csv"} -> 'type in ["csv", "excel"] and source == "a.csv"'
+    clauses = []
+    for name, wanted in filter.items():
+        if name not in SCALAR_FIELDS:
+            raise ValueError(f"Metadata field '{name}' is not a Milvus scalar field")
+        values = list(wanted) if isinstance(wanted, (list, tuple, set)) else [wanted]
+        if len(values) == 1:
+            clauses.append(f"{name} == {json.dumps(values[0])}")
+        else:
+            clauses.append(f"{name} in {json.dumps(values)}")
+    return " and ".join(clauses)
+
+def _row(metadata: dict):
+    # Chunk metadata -> one value per schema column
+    row = {}
+    for name, (dtype, default) in SCALAR_FIELDS.items():
+        value = metadata.get(name, default)
+        try:
+            row[name] = int(value) if dtype == "INT64" else str(value)[:VARCHAR_MAX_LENGTH[name]]
+        except (TypeError, ValueError):
+            row[name] = default
+    row[EXTRA_FIELD] = {k: v for k, v in metadata.items() if k not in SCALAR_FIELDS}
+    return row
+
+class ManagedMilvus(Milvus):
+    """Milvus collection with an explicit typed schema partitioned by document type, index and search
+    params from Config, and metadata filters (the same dicts EmbeddedVectorStore takes) as search expressions."""
+
+    def __init__(self, embedding_function, collection_name: str = config.COLLECTION_NAME, drop_old: bool = False,
+                 **kwargs):
+        super().__init__(
+            embedding_function=embedding_function,
+            collection_name=collection_name,
+            connection_args={"host": config.MILVUS_HOST, "port": config.MILVUS_PORT},
+            index_params=index_params(),
+            drop_old=drop_old,
+            partition_key_field=PARTITION_KEY,
+            **kwargs
+        )
+        # Collections created by the old auto-schema ingest keep working, just without typed filters
+        self.managed = self.col is None or EXTRA_FIELD in self.fields
+        if not self.managed:
+            logger.warning("Collection uses the legacy auto-generated schema; filtered search is disabled "
+                           "until it is rebuilt with `python -m app.ingestion.ingest --full`",
+                           extra={"collection": self.collection_name})
+
+    def _create_collection(self, embeddings: list, metadatas=None):
+        from pymilvus import Collection, CollectionSchema, DataType, FieldSchema
+        fields = [FieldSchema(self._primary_field, DataType.VARCHAR, is_primary=True, auto_id=False, max_length=512)]
+        for name, (dtype, _) in SCALAR_FIELDS.items():
+            extra = {"max_length": VARCHAR_MAX_LENGTH[name]} if dtype == "VARCHAR" else {}
+            fields.append(FieldSchema(name, getattr(DataType, dtype), is_partition_key=name == PARTITION_KEY, **extra))
+        fields.append(FieldSchema(EXTRA_FIELD, DataType.JSON))
+        fields.append(FieldSchema(self._text_field, DataType.VARCHAR, max_length=65_535))
+        fields.append(FieldSchema(self._vector_field, DataType.FLOAT_VECTOR, dim=len(embeddings[0])))
+        schema = CollectionSchema(fields, description=self.collection_description)
+        self.col = Collection(name=self.collection_name, schema=schema, consistency_level=self.consistency_level,
+                              using=self.alias, num_partitions=config.MILVUS_NUM_PARTITIONS)
+        logger.info("Created collection", extra={"collection": self.collection_name, "dim": len(embeddings[0]),
+                                                 "index": self.index_params})
+
+    def _create_search_params(self):
+        # Search params follow the index the collection actually has, tuned from Config
+        from pymilvus import Collection
+        if isinstance(self.col, Collection) and self.search_params is None:
+            index = self._get_index()
+            if index is not None:
+                built = index["index_param"]
+                if built["index_type"] != config.MILVUS_INDEX_TYPE:
+                    logger.warning("Collection index differs from MILVUS_INDEX_TYPE; re-ingest with --full to change it",
+                                   extra={"index": built["index_type"], "configured": config.MILVUS_INDEX_TYPE})
+                self.search_params = search_params(built["index_type"], built["metric_type"])
+
+    def copy_from(self, collection_name: str, exclude_ids=(), batch_size: int = 1000):
+        # Fills this (new, empty) collection with the rows of another managed collection, e.g. the previous
+        # index generation's, minus exclude_ids; vectors are copied, not re-embedded. Returns the rows copied.
+        from pymilvus import Collection, utility
+        if not utility.has_collection(collection_name, using=self.alias):
+            raise ValueError(f"Collection {collection_name!r} does not exist")
+        source = Collection(collection_name, using=self.alias)
+        fields = [field.name for field in source.schema.fields]
+        if EXTRA_FIELD not in fields:
+            raise ValueError(f"Collection {collection_name!r} uses the legacy schema; re-ingest with --full")
+        source.load()
+        exclude = set(exclude_ids)
+        copied = 0
+        iterator = source.query_iterator(batch_size=batch_size, output_fields=fields)
+        try:
+            while rows := iterator.next():
+                rows = [row for row in rows if row[self._primary_field] not in exclude]
+                if not rows:
+                    continue
+                if self.col is None:
+                    self._init(embeddings=[rows[0][self._vector_field]])
+                self.col.insert(rows)
+                copied += len(rows)
+        finally:
+            iterator.close()
+        logger.info("Copied collection", extra={"source": collection_name, "target": self.collection_name,
+                                                "rows": copied, "excluded": len(exclude)})
+        return copied
+
+    def persist(self):
+        # Seal what was inserted so every client sees the whole collection once its generation is published
+        if self.col is not None:
+            self.col.flush()
+        return self.col.num_entities if self.col is not None else 0
+
+    def drop_collection(self, collection_name: str):
+        from pymilvus import utility
+        if utility.has_collection(collection_name, using=self.alias):
+            utility.drop_collection(collection_name, using=self.alias)
+            logger.info("Dropped collection", extra={"collection": collection_name})
+
+    def add_texts(self, texts, metadatas=None, timeout=None, batch_size=1000, *, ids=None, **kwargs):
+        texts = list(texts)
+        if self.managed:
+            metadatas = [_row(metadata) for metadata in (metadatas or [{} for _ in texts])]
+        return super().add_texts(texts, metadatas, timeout, batch_size, ids=ids, **kwargs)
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, param=None, expr=None, timeout=None,
+                                               filter=None, **kwargs):
+        if filter and self.managed:
+            clause = filter_expr(filter)
+            expr = f"({expr}) and ({clause})" if expr else clause
+        return super().similarity_search_with_score_by_vector(embedding, k, param, expr, timeout, **kwargs)
+
+    def _parse_document(self, data: dict):
+        if not self.managed:
+            return super()._parse_document(data)
+        text = data.pop(self._text_field)
+        extra = data.pop(EXTRA_FIELD, None) or {}
+        # Columns holding the "missing" placeholder were not in the chunk's metadata
+        metadata = {k: v for k, v in data.items() if k not in SCALAR_FIELDS or v != SCALAR_FIELDS[k][1]}
+        return Document(page_content=text, metadata={**metadata, **extra})
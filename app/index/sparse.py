@@ -0,0 +1,208 @@
+import json
+import mmap
+import os
+import re
+import shutil
+from collections import Counter
+import numpy as np
+from typing import Any
+from pydantic import PrivateAttr
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from app.core.config import config
+from app.core.telemetry import get_logger
+
+logger = get_logger("index.sparse")
+
+# On-disk layout (all arrays are .npy so they can be memory-mapped without copying):
+#   terms.bin / term_offsets.npy      sorted vocabulary, utf-8 bytes + offsets (term id = position)
+#   idf.npy                           per-term IDF
+#   postings_offsets.npy              CSR row pointers into postings_docs / postings_tf
+#   postings_docs.npy, postings_tf.npy
+#   doc_lengths.npy                   tokens per chunk
+#   docs.bin / doc_offsets.npy        chunk JSON (page_content + metadata) + offsets
+#   meta.json                         counts and BM25 parameters
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text: str):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def _replace_dir(src: str, dst: str):
+    # Swap a freshly built directory into place; readers holding the old mmaps keep working
+    if os.path.exists(dst):
+        old = f"{dst}.old"
+        shutil.rmtree(old, ignore_errors=True)
+        os.rename(dst, old)
+        os.rename(src, dst)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.rename(src, dst)
+
+def build_sparse_index(documents, index_dir: str = config.SPARSE_INDEX_DIR, k1=config.BM25_K1, b=config.BM25_B):
+    build_dir = f"{index_dir}.building"
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+
+    postings = {}
+    doc_lengths = []
+    doc_offsets = [0]
+    with open(os.path.join(build_dir, "docs.bin"), "wb") as store:
+        for doc_id, doc in enumerate(documents):
+            blob = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}).encode()
+            store.write(blob)
+            doc_offsets.append(doc_offsets[-1] + len(blob))
+            counts = Counter(tokenize(doc.page_content))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+    num_docs = len(doc_lengths)
+    terms = sorted(postings, key=lambda t: t.encode())
+    encoded = [t.encode() for t in terms]
+    with open(os.path.join(build_dir, "terms.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(t) for t in encoded], out=term_offsets[1:])
+
+    postings_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(postings[t]) for t in terms], out=postings_offsets[1:])
+    postings_docs = np.empty(postings_offsets[-1], dtype=np.int32)
+    postings_tf = np.empty(postings_offsets[-1], dtype=np.float32)
+    for i, term in enumerate(terms):
+        entries = np.asarray(postings[term], dtype=np.int64).reshape(-1, 2)
+        postings_docs[postings_offsets[i]:postings_offsets[i + 1]] = entries[:, 0]
+        postings_tf[postings_offsets[i]:postings_offsets[i + 1]] = entries[:, 1]
+
+    doc_freq = np.diff(postings_offsets).astype(np.float64)
+    idf = np.log(1.0 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+
+    arrays = {
+        "term_offsets": term_offsets,
+        "idf": idf,
+        "postings_offsets": postings_offsets,
+        "postings_docs": postings_docs,
+        "postings_tf": postings_tf,
+        "doc_lengths": np.asarray(doc_lengths, dtype=np.float32),
+        "doc_offsets": np.asarray(doc_offsets, dtype=np.int64),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(build_dir, f"{name}.npy"), array)
+    avgdl = float(np.mean(doc_lengths)) if doc_lengths else 0.0
+    with open(os.path.join(build_dir, "meta.json"), "w") as f:
+        json.dump({"num_docs": num_docs, "num_terms": len(terms), "avgdl": avgdl, "k1": k1, "b": b}, f)
+
+    _replace_dir(build_dir, index_dir)
+    logger.info("Built sparse index", extra={"chunks": num_docs, "terms": len(terms)})
+    return num_docs
+
+def _map_bytes(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class SparseIndex:
+    """Read-only BM25 index. Arrays and chunk text are memory-mapped, so loading is O(1) and
+    every worker process shares the same page cache."""
+
+    def __init__(self, index_dir: str = config.SPARSE_INDEX_DIR):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+        self.term_offsets = load("term_offsets")
+        self.idf = load("idf")
+        self.postings_offsets = load("postings_offsets")
+        self.postings_docs = load("postings_docs")
+        self.postings_tf = load("postings_tf")
+        self.doc_lengths = load("doc_lengths")
+        self.doc_offsets = load("doc_offsets")
+        self._terms = _map_bytes(os.path.join(index_dir, "terms.bin"))
+        self._docs = _map_bytes(os.path.join(index_dir, "docs.bin"))
+
+    def __len__(self):
+        return self.meta["num_docs"]
+
+    def term_id(self, term: str):
+        # Binary search over the sorted, memory-mapped vocabulary
+        target = term.encode()
+        lo, hi = 0, self.meta["num_terms"]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            candidate = self._terms[self.term_offsets[mid]:self.term_offsets[mid + 1]]
+            if candidate < target:
+                lo = mid + 1
+            elif candidate > target:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def document(self, doc_id: int):
+        data = json.loads(self._docs[self.doc_offsets[doc_id]:self.doc_offsets[doc_id + 1]])
+        return Document(page_content=data["page_content"], metadata=data["metadata"])
+
+    def iter_documents(self):
+        for doc_id in range(len(self)):
+            yield self.document(doc_id)
+
+    def search(self, query: str, k: int = 5):
+        # Returns [(doc_id, score)] best first; work is proportional to the query terms' postings
+        term_ids = {tid for tid in (self.term_id(t) for t in tokenize(query)) if tid is not None}
+        if not term_ids:
+            return []
+        k1, b, avgdl = self.meta["k1"], self.meta["b"], self.meta["avgdl"] or 1.0
+        docs, contributions = [], []
+        for tid in term_ids:
+            start, end = self.postings_offsets[tid], self.postings_offsets[tid + 1]
+            doc_ids = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end]
+            norm = k1 * (1.0 - b + b * self.doc_lengths[doc_ids] / avgdl)
+            docs.append(doc_ids)
+            contributions.append(self.idf[tid] * tf * (k1 + 1.0) / (tf + norm))
+        unique_docs, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contributions))
+        top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(unique_docs[i]), float(scores[i])) for i in top]
+
+def matches_filter(metadata: dict, filter: dict):
+    # Same filter dicts as the vector stores: AND across fields, a list means any of its values
+    for name, wanted in filter.items():
+        values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+        if metadata.get(name) not in values:
+            return False
+    return True
+
+def _stamp(index_dir: str):
+    try:
+        stat = os.stat(os.path.join(index_dir, "meta.json"))
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+class SparseRetriever(BaseRetriever):
+    index: Any
+    k: int = 5
+    filter_overfetch: int = 4 # With a filter, score this many times k candidates and keep the matching ones
+    watch: bool = True # Reopen the index when ingestion swaps in a new build (so every API worker picks it up)
+    _stamp: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        self._stamp = _stamp(self.index.index_dir)
+
+    def current_index(self):
+        if self.watch:
+            stamp = _stamp(self.index.index_dir)
+            if stamp is not None and stamp != self._stamp:
+                # Searches already running keep the old mapping; its files stay readable until it is dropped
+                self.index, self._stamp = SparseIndex(self.index.index_dir), stamp
+        return self.index
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None, filter: dict = None):
+        index = self.current_index()
+        if not filter:
+            return [index.document(doc_id) for doc_id, _ in index.search(query, self.k)]
+        docs = (index.document(doc_id) for doc_id, _ in index.search(query, self.k * self.filter_overfetch))
+        return [doc for doc in docs if matches_filter(doc.metadata, filter)][:self.k]
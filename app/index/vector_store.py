@@ -0,0 +1,26 @@
+from app.core.config import config
+from app.index.dense import EmbeddedVectorStore
+from app.index.generations import Generation, current_generation, legacy_generation
+from app.index.milvus import ManagedMilvus
+
+def create_vector_store(embedding_function, generation: Generation = None, drop_old: bool = False):
+    # Both backends speak LangChain's VectorStore interface (add_documents / delete / as_retriever).
+    # Opens the dense index of `generation`, by default the published one.
+    generation = generation or current_generation() or legacy_generation()
+    backend = config.VECTOR_STORE_BACKEND
+    if backend == "embedded":
+        return EmbeddedVectorStore(embedding_function, index_dir=generation.dense_dir, drop_old=drop_old)
+    if backend == "milvus":
+        return ManagedMilvus(embedding_function, collection_name=generation.collection, drop_old=drop_old)
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {backend!r}")
+
+def carry_over(vector_store, base: Generation, exclude_ids=()):
+    # Seeds a new generation's dense index with the chunks of `base` (minus exclude_ids), without re-embedding
+    if isinstance(vector_store, EmbeddedVectorStore):
+        vector_store.copy_from(base.dense_dir, exclude_ids)
+    else:
+        vector_store.copy_from(base.collection, exclude_ids)
+
+def supports_filter(vector_store):
+    # Whether similarity_search takes a metadata filter dict ({"type": [...], "source": ...})
+    return isinstance(vector_store, EmbeddedVectorStore) or getattr(vector_store, "managed", False)
@@ -0,0 +1,204 @@
+import json
+import multiprocessing
+import os
+import queue
+import time
+from langchain_core.documents import Document
+from app.core.config import config
+from app.core.telemetry import get_logger
+
+logger = get_logger("ingestion.documents")
+
+# Document files (PDF / DOCX / PPTX / TXT) are parsed in worker processes, one process per file, and stream
+# their text back page by page. Spreadsheets/CSVs are streamed separately (see tabular.py).
+
+# Legacy binary .doc / .ppt are not listed: the OOXML parsers cannot read them (see ingest.UNSUPPORTED_EXTENSIONS)
+DOCUMENT_TYPES = {".pdf": "pdf", ".txt": "text", ".docx": "docx", ".pptx": "pptx"}
+# Bump when extraction output changes so cached parses are not reused
+EXTRACTOR_VERSION = 1
+POLL_SECONDS = 0.5 # How often a waiting reader checks that its worker is still alive
+
+def iter_pdf_pages(path: str):
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        # One bad page (broken content stream, unsupported font) is skipped, not the whole file
+        try:
+            text = page.extract_text() or ""
+        except Exception as e:
+            logger.warning("Skipping unreadable page", extra={"file": os.path.basename(path), "page": number,
+                                                              "error": str(e)})
+            continue
+        if text.strip():
+            yield text, {"page": number}
+
+def iter_pptx_slides(path: str):
+    from pptx import Presentation
+    for number, slide in enumerate(Presentation(path).slides, start=1):
+        text = "\n".join(shape.text for shape in slide.shapes if hasattr(shape, "text") and shape.text)
+        if text.strip():
+            yield text, {"slide": number}
+
+def iter_docx(path: str):
+    # docx has no stored page breaks; the whole body is one page
+    import docx2txt
+    yield docx2txt.process(path), {}
+
+def iter_text(path: str):
+    with open(path, encoding="utf-8") as f:
+        yield f.read(), {}
+
+EXTRACTORS = {"pdf": iter_pdf_pages, "pptx": iter_pptx_slides, "docx": iter_docx, "text": iter_text}
+
+def document_type(path: str):
+    return DOCUMENT_TYPES.get(os.path.splitext(path)[1].lower())
+
+def extract_worker(path: str, results):
+    # Runs in its own process: sends ("page", text, metadata) messages, then ("done",) or ("error", message)
+    try:
+        for text, metadata in EXTRACTORS[document_type(path)](path):
+            results.put(("page", text, metadata))
+        results.put(("done",))
+    except BaseException as e:
+        results.put(("error", f"{type(e).__name__}: {e}"))
+
+def _context():
+    # A fork of the multi-threaded ingest pipeline can inherit held locks; forkserver forks from a clean process
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+class ExtractionError(Exception):
+    pass
+
+class DocumentExtractor:
+    """Parses document files in worker processes, at most `workers` files ahead of the reader, and streams
+    their pages back in file order. A file whose worker crashes or runs longer than `timeout` seconds is
+    killed without affecting the others, and its pages() raises ExtractionError. Parsed pages are cached
+    by file content hash."""
+
+    def __init__(self, jobs, workers: int = config.INGEST_WORKERS, timeout: float = config.INGEST_FILE_TIMEOUT,
+                 cache_dir: str = config.INGEST_PARSE_CACHE_DIR):
+        self.jobs = iter(jobs) # (path, content hash), in the order pages() will be called
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        self.context = _context()
+        self.running = {} # path -> (process, results queue, start time)
+        self.stats = {"parsed": 0, "cached": 0, "failed": 0, "pages": 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._fill()
+
+    def cache_path(self, content_hash: str):
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"{content_hash}.v{EXTRACTOR_VERSION}.jsonl")
+
+    def _cached(self, content_hash: str):
+        path = self.cache_path(content_hash)
+        return path is not None and os.path.exists(path)
+
+    def _fill(self):
+        # Keep `workers` files parsing ahead of the reader; cached files need no worker
+        while len(self.running) < self.workers:
+            job = next(self.jobs, None)
+            if job is None:
+                return
+            path, content_hash = job
+            if self._cached(content_hash):
+                continue
+            results = self.context.Queue()
+            process = self.context.Process(target=extract_worker, args=(path, results), daemon=True)
+            process.start()
+            self.running[path] = (process, results, time.monotonic())
+
+    def _messages(self, path: str):
+        process, results, started = self.running[path]
+        while True:
+            try:
+                message = results.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if not process.is_alive():
+                    try:
+                        message = results.get(timeout=POLL_SECONDS) # Sent just before exiting
+                    except queue.Empty:
+                        raise ExtractionError(f"worker exited with code {process.exitcode}")
+                elif self.timeout and time.monotonic() - started > self.timeout:
+                    raise ExtractionError(f"timed out after {self.timeout}s")
+                else:
+                    continue
+            if message[0] == "error":
+                raise ExtractionError(message[1])
+            if message[0] == "done":
+                return
+            yield message[1], message[2]
+
+    def _stop(self, path: str):
+        process, results, _ = self.running.pop(path)
+        process.join(timeout=POLL_SECONDS)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        results.close()
+        self._fill()
+
+    def pages(self, path: str, content_hash: str):
+        # Yields one Document per page (PDF), slide (PPTX) or file (DOCX / TXT); raises ExtractionError
+        # (after the pages read so far) if the file could not be parsed
+        filename = os.path.basename(path)
+        metadata = {"source": filename, "type": document_type(path)}
+        cache_path = self.cache_path(content_hash)
+        if path not in self.running and self._cached(content_hash):
+            self.stats["cached"] += 1
+            with open(cache_path) as f:
+                for line in f:
+                    page = json.loads(line)
+                    self.stats["pages"] += 1
+                    yield Document(page_content=page["text"], metadata={**metadata, **page["metadata"]})
+            return
+        if path not in self.running:
+            raise ValueError(f"{filename} was not queued next; pages() must follow the job order")
+        logger.info("Loading document", extra={"file": filename, "type": metadata["type"]})
+        parsed = []
+        try:
+            for text, page_metadata in self._messages(path):
+                parsed.append({"text": text, "metadata": page_metadata})
+                self.stats["pages"] += 1
+                yield Document(page_content=text, metadata={**metadata, **page_metadata})
+        except ExtractionError as e:
+            self.stats["failed"] += 1
+            raise ExtractionError(f"{e} ({len(parsed)} pages read)") from e
+        finally:
+            self._stop(path)
+        self.stats["parsed"] += 1
+        if cache_path:
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, "w") as f:
+                for page in parsed:
+                    f.write(json.dumps(page) + "\n")
+            os.replace(tmp_path, cache_path)
+
+    def close(self):
+        for process, results, _ in self.running.values():
+            process.kill()
+            process.join()
+            results.close()
+        self.running.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def prune_parse_cache(keep_hashes, cache_dir: str = config.INGEST_PARSE_CACHE_DIR):
+    # Drops cached parses of files that are no longer in the data directory
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return 0
+    keep = {f"{content_hash}.v{EXTRACTOR_VERSION}.jsonl" for content_hash in keep_hashes}
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name not in keep:
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
@@ -0,0 +1,115 @@
+import json
+import os
+import sys
+import time
+from app.core.config import config
+from app.index.dense import EmbeddedVectorStore
+
+# Ingest stage that stores generated question/answer pairs per chunk in an embedded vector index
+# (question vectors, answer + cited chunk in metadata). Entries are keyed by chunk ID, so they follow
+# the ingest manifest: chunks of changed or removed files take their FAQ entries with them.
+
+FAQ_TYPES = ("pdf", "text", "docx", "pptx") # Spreadsheet rows are answered by the SQL agent
+# Bump when the prompt or entry format changes so every chunk is regenerated
+FAQ_VERSION = 1
+
+def faq_entry_id(chunk_id: str, index: int):
+    return f"{chunk_id}:{index}"
+
+def eligible(doc, sources=None):
+    return doc.metadata.get("type") in FAQ_TYPES and (sources is None or doc.metadata.get("source") in sources)
+
+def load_processed(path: str):
+    # {chunk_id: number of entries stored}; chunks with zero entries are recorded too so they are not retried
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    return data["chunks"] if data.get("faq_version") == FAQ_VERSION else None
+
+def save_processed(processed: dict, path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"faq_version": FAQ_VERSION, "chunks": processed}, f)
+    os.replace(tmp_path, path)
+
+def _entry_metadata(doc, answer: str):
+    metadata = {"chunk_id": doc.metadata["chunk_id"], "source": doc.metadata.get("source", "unknown"),
+                "type": doc.metadata.get("type", "unknown"), "answer": answer, "chunk": doc.page_content}
+    for key in ("page", "slide"):
+        if key in doc.metadata:
+            metadata[key] = doc.metadata[key]
+    return metadata
+
+def update_faq_index(chunks, chunk_ids, embeddings, agent=None, index_dir: str = config.FAQ_INDEX_DIR,
+                     base_dir: str = None, sources=config.FAQ_SOURCES, batch_size: int = config.FAQ_BATCH_SIZE):
+    # chunks: every indexed chunk (Documents with chunk_id metadata); chunk_ids: the chunk IDs in the manifest.
+    # Drops entries of chunks that left the manifest and generates entries for chunks not seen before.
+    # base_dir: the previous generation's FAQ index, whose entries index_dir starts from.
+    if agent is None:
+        from app.agents.faq import FAQAgent
+        agent = FAQAgent()
+    processed_path = f"{index_dir}.chunks.json"
+    processed = load_processed(processed_path)
+    carry = processed is None and base_dir is not None and load_processed(f"{base_dir}.chunks.json") is not None
+    if carry:
+        processed = load_processed(f"{base_dir}.chunks.json")
+    rebuild = processed is None
+    store = EmbeddedVectorStore(embeddings, index_dir=index_dir, drop_old=rebuild)
+    if carry:
+        store.copy_from(base_dir)
+    processed = processed or {}
+
+    stale = [chunk_id for chunk_id in processed if chunk_id not in chunk_ids]
+    if stale:
+        store.delete(ids=[faq_entry_id(chunk_id, i) for chunk_id in stale for i in range(processed[chunk_id])])
+        for chunk_id in stale:
+            del processed[chunk_id]
+    todo = [doc for doc in chunks if eligible(doc, sources)
+            and doc.metadata.get("chunk_id") in chunk_ids and doc.metadata["chunk_id"] not in processed]
+    print(f"FAQ: {len(todo)} new chunks, {len(stale)} stale chunks")
+
+    embed = getattr(embeddings, "embed_queries", embeddings.embed_documents) # Stored questions are matched against user questions
+    start = time.perf_counter()
+    stats = {"chunks": 0, "entries": 0, "failed": 0, "stale": len(stale)}
+    for i in range(0, len(todo), batch_size):
+        batch = todo[i:i + batch_size]
+        questions, metadatas, ids = [], [], []
+        for doc, pairs in zip(batch, agent.generate(batch)):
+            if pairs is None:
+                stats["failed"] += 1
+                continue
+            chunk_id = doc.metadata["chunk_id"]
+            for n, pair in enumerate(pairs):
+                questions.append(pair["question"])
+                metadatas.append(_entry_metadata(doc, pair["answer"]))
+                ids.append(faq_entry_id(chunk_id, n))
+            processed[chunk_id] = len(pairs)
+            stats["chunks"] += 1
+        if questions:
+            store.add_embeddings(questions, embed(questions), metadatas, ids)
+            stats["entries"] += len(questions)
+        # Staged entries survive an interrupted run, so progress is saved per batch
+        save_processed(processed, processed_path)
+        print(f"FAQ: {min(i + batch_size, len(todo))}/{len(todo)} chunks, {stats['entries']} entries")
+    if stale or todo or rebuild or carry:
+        store.persist()
+    save_processed(processed, processed_path)
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    print(f"FAQ index: {len(store)} entries ({stats})")
+    return stats
+
+if __name__ == "__main__":
+    # Builds or refreshes the FAQ index of the published generation (e.g. after turning FAQ_ENABLED on);
+    # the server picks up the rebuilt FAQ index on its next lookup
+    from app.core.embeddings import CachedEmbeddings
+    from app.index.generations import current_generation
+    from app.index.sparse import SparseIndex
+    from app.ingestion.ingest import load_manifest
+    generation = current_generation()
+    if generation is None:
+        sys.exit("Nothing is ingested yet; run python -m app.ingestion.ingest first")
+    manifest = load_manifest(generation.manifest_path) or {}
+    chunk_ids = {chunk_id for entry in manifest.values() for chunk_id in entry["chunk_ids"]}
+    update_faq_index(SparseIndex(generation.sparse_dir).iter_documents(), chunk_ids, CachedEmbeddings(),
+                     index_dir=generation.faq_dir)
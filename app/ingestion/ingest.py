@@ -1,171 +1,389 @@
 import os
-import pandas as pd
-from langchain_community.document_loaders import PyPDFLoader, TextLoader, Docx2txtLoader, CSVLoader
-from pptx import Presentation
+import sys
+import json
+import time
+import hashlib
+from dataclasses import dataclass, field
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.vectorstores import Milvus
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from app.core.config import config
+from app.core.embeddings import CachedEmbeddings
+from app.core.index_version import bump_index_version
+from app.core.telemetry import configure_logging
+from app.index.generations import (BuildInProgress, build_lock, collect_garbage, current_generation, load_generation,
+                                   new_generation, publish)
+from app.index.sparse import SparseIndex, build_sparse_index
+from app.index.vector_store import carry_over, create_vector_store
+from app.ingestion.documents import DocumentExtractor, prune_parse_cache
+from app.ingestion.faq import update_faq_index
+from app.ingestion.pipeline import Pipeline
+from app.ingestion.tabular import TABULAR_EXTENSIONS, iter_tabular_batches
 
-def ingest_documents():
-    data_dir = "data"
+SUPPORTED_EXTENSIONS = (".pdf", ".xlsx", ".xls", ".txt", ".csv", ".docx", ".pptx")
+# Legacy binary Office formats: skipped with a notice instead of failing (and being retried) on every ingest
+UNSUPPORTED_EXTENSIONS = (".doc", ".ppt")
+# Bump when parsing/chunking/embedding changes so existing manifests trigger a full rebuild
+# (2: embeddings come from the batched /api/embed endpoint, which L2-normalizes vectors;
+#  3: BM25 moved from chunks.pkl to the memory-mapped sparse index;
+#  4: CSV rows use the same "col: val, ..." text as Excel rows;
+#  5: PDFs are indexed, documents are split page by page / slide by slide;
+#  6: indexes are built as a new generation and swapped in, see app/index/generations.py)
+PIPELINE_VERSION = 6
+
+def file_hash(file_path: str):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_id(filename: str, content_hash: str, index: int):
+    # Stable per file version: unchanged files keep their IDs, edited files get fresh ones
+    return hashlib.sha1(f"{filename}:{content_hash}:{index}".encode()).hexdigest()
+
+def load_manifest(path: str = None):
+    # Returns {filename: {"hash": ..., "chunk_ids": [...]}}, or None if there is no usable manifest.
+    # Defaults to the manifest of the published index generation.
+    if path is None:
+        generation = current_generation()
+        path = generation.manifest_path if generation else None
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("pipeline_version") != PIPELINE_VERSION:
+        return None
+    return manifest["files"]
+
+def save_manifest(files: dict, path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"pipeline_version": PIPELINE_VERSION, "files": files}, f, indent=2)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path: str = config.INGEST_CHECKPOINT_PATH):
+    # Progress of an interrupted ingest: {"full_rebuild", "spool_bytes", "generation" (being built), "base" (it
+    # started from), "carried_over", "files": {filename: {"hash", "inserted", "done"}}}
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("pipeline_version") != PIPELINE_VERSION:
+        return None
+    return checkpoint
+
+def save_checkpoint(checkpoint: dict, path: str = config.INGEST_CHECKPOINT_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({**checkpoint, "pipeline_version": PIPELINE_VERSION}, f)
+    os.replace(tmp_path, path)
+
+def sanitize_metadata(doc: Document):
+    # Keep scalar metadata with its type (the vector store schema has typed page / row columns)
+    doc.metadata = {k: v for k, v in doc.metadata.items() if isinstance(v, (str, int, float, bool))}
+
+def _chain(*iterables):
+    for iterable in iterables:
+        yield from iterable
+
+def _unique_chunks(documents):
+    # A file re-run after an interruption or failure can appear twice in the spool
+    seen = set()
+    for doc in documents:
+        if doc.metadata["chunk_id"] not in seen:
+            seen.add(doc.metadata["chunk_id"])
+            yield doc
+
+def _read_spool(path: str):
+    with open(path) as f:
+        for line in f:
+            data = json.loads(line)
+            yield Document(page_content=data["page_content"], metadata=data["metadata"])
+
+@dataclass
+class ChunkBatch:
+    # Unit of work passed between pipeline stages; batches never span files
+    filename: str
+    documents: list
+    last: bool = False # Final batch of its file
+    error: str = None # Set on the final batch of a file that could not be read completely
+    start: int = 0 # Chunk index of documents[0] within the file
+    ids: list = field(default_factory=list)
+    vectors: list = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.documents)
+
+class PrecomputedEmbeddings(Embeddings):
+    # Hands the vector store the vectors produced by the embed stage, so the insert stage does not embed again
+    def __init__(self):
+        self.vectors = []
+
+    def embed_documents(self, texts):
+        vectors, self.vectors = self.vectors, []
+        return vectors
+
+    def embed_query(self, text):
+        raise NotImplementedError("PrecomputedEmbeddings is insert-only")
+
+def ingest_documents(full_rebuild: bool = False, vector_store_factory=create_vector_store, embeddings=None):
+    # Returns a summary (chunks, seconds, sparse index build time, per-stage StageStats), or None if nothing ran
+    try:
+        with build_lock():
+            return _ingest(full_rebuild, vector_store_factory, embeddings)
+    except BuildInProgress as e:
+        print(f"{e}; not starting another one.")
+        return None
+
+def _ingest(full_rebuild: bool, vector_store_factory, embeddings):
+    data_dir = config.DATA_DIR
     if not os.path.exists(data_dir):
         os.makedirs(data_dir)
     
     print(f"Scanning directory: {os.path.abspath(data_dir)}")
-    files = os.listdir(data_dir)
+    files = sorted(f for f in os.listdir(data_dir) if f.endswith(SUPPORTED_EXTENSIONS))
     print(f"Found files: {files}")
-        
-    all_documents = []
-    
-    # scan directory
-    for filename in os.listdir(data_dir):
-        file_path = os.path.join(data_dir, filename)
-        
-        # Process PDF
-        if filename.endswith(".pdf"):
-            print(f"Skipping PDF (Corrupt): {filename}")
-            continue
-            # was: if filename.endswith(".pdf"):
-            print(f"Loading PDF: {filename}")
-            try:
-                loader = PyPDFLoader(file_path)
-                docs = loader.load()
-                # Initial split
-                text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-                splits = text_splitter.split_documents(docs)
-                for split in splits:
-                    split.metadata["source"] = filename
-                    split.metadata["type"] = "pdf"
-                all_documents.extend(splits)
-            except Exception as e:
-                print(f"Error loading PDF {filename}: {e}")
-
-        # Process Excel
-        elif filename.endswith(".xlsx") or filename.endswith(".xls"):
-            print(f"Loading Excel: {filename}")
-            try:
-                df = pd.read_excel(file_path)
-                # Convert rows to documents
-                for index, row in df.iterrows():
-                    # Create a text representation of the row
-                    row_text = ", ".join([f"{col}: {val}" for col, val in row.items() if pd.notna(val)])
-                    doc = Document(
-                        page_content=row_text,
-                        metadata={
-                            "source": filename,
-                            "row": index,
-                            "type": "excel"
-                        }
-                    )
-                    all_documents.append(doc)
-            except Exception as e:
-                print(f"Error loading Excel {filename}: {e}")
-
-        # Process Text Files
-        elif filename.endswith(".txt"):
-            print(f"Loading Text File: {filename}")
-            try:
-                loader = TextLoader(file_path, encoding="utf-8")
-                docs = loader.load()
-                # Split text
-                text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-                splits = text_splitter.split_documents(docs)
-                for split in splits:
-                    split.metadata["source"] = filename
-                    split.metadata["type"] = "text"
-                all_documents.extend(splits)
-            except Exception as e:
-                print(f"Error loading Text File {filename}: {e}")
-
-        # Process CSV
-        elif filename.endswith(".csv"):
-            print(f"Loading CSV: {filename}")
-            try:
-                loader = CSVLoader(file_path=file_path)
-                docs = loader.load()
-                # CSV loader creates one doc per row usually, so we might just extend
-                for doc in docs:
-                    doc.metadata["source"] = filename
-                    doc.metadata["type"] = "csv"
-                all_documents.extend(docs)
-            except Exception as e:
-                print(f"Error loading CSV {filename}: {e}")
-
-        # Process Word (DOCX)
-        elif filename.endswith(".docx") or filename.endswith(".doc"):
-            print(f"Loading Word Doc: {filename}")
-            try:
-                loader = Docx2txtLoader(file_path)
-                docs = loader.load()
-                text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-                splits = text_splitter.split_documents(docs)
-                for split in splits:
-                    split.metadata["source"] = filename
-                    split.metadata["type"] = "docx"
-                all_documents.extend(splits)
-            except Exception as e:
-                print(f"Error loading DOCX {filename}: {e}")
-
-        # Process PowerPoint (PPTX)
-        elif filename.endswith(".pptx") or filename.endswith(".ppt"):
-            print(f"Loading PowerPoint: {filename}")
-            try:
-                prs = Presentation(file_path)
-                text_content = ""
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if hasattr(shape, "text"):
-                            text_content += shape.text + "\n"
-                
-                doc = Document(page_content=text_content, metadata={"source": filename, "type": "pptx"})
-                
-                text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-                splits = text_splitter.split_documents([doc])
-                all_documents.extend(splits)
-            except Exception as e:
-                print(f"Error loading PPTX {filename}: {e}")
-
-    if not all_documents:
+    unsupported = sorted(f for f in os.listdir(data_dir) if f.endswith(UNSUPPORTED_EXTENSIONS))
+    if unsupported:
+        print(f"Skipping legacy .doc/.ppt files (save them as .docx/.pptx to index them): {unsupported}")
+
+    # The new index generation starts from the published one (base) and is swapped in when complete
+    base = current_generation()
+    generation = None
+    # An interrupted ingest left a checkpoint: pick up where it stopped (unless asked to start over)
+    checkpoint = None if full_rebuild else load_checkpoint()
+    if checkpoint is not None:
+        generation = load_generation(checkpoint["generation"])
+        base = load_generation(checkpoint["base"]) if checkpoint["base"] else None
+        if generation is None or (checkpoint["base"] and base is None):
+            print("The interrupted build is gone; starting over")
+            checkpoint, generation, base = None, None, current_generation()
+    resuming = checkpoint is not None
+    manifest = load_manifest(base.manifest_path) if base else None
+    if resuming:
+        print(f"Resuming interrupted ingest of index generation {generation.id} from {config.INGEST_CHECKPOINT_PATH}")
+        full_rebuild = checkpoint["full_rebuild"]
+    elif manifest is None:
+        # No record of what is indexed: rebuild the collection from scratch
+        full_rebuild = True
+    elif base.backend != config.VECTOR_STORE_BACKEND:
+        print(f"Vector store backend changed ({base.backend} -> {config.VECTOR_STORE_BACKEND}); rebuilding")
+        full_rebuild = True
+    if full_rebuild:
+        manifest = {}
+        base = None
+    checkpoint = checkpoint or {"full_rebuild": full_rebuild, "spool_bytes": 0, "files": {}}
+    progress = checkpoint["files"]
+
+    hashes = {filename: file_hash(os.path.join(data_dir, filename)) for filename in files}
+    changed = [f for f in files if manifest.get(f, {}).get("hash") != hashes[f]]
+    removed = [f for f in manifest if f not in hashes]
+    print(f"Changed/new: {changed}, removed: {removed}, unchanged: {len(files) - len(changed)}")
+
+    if not changed and not removed and not full_rebuild:
+        print("Index is up to date. Nothing to ingest.")
+        return
+
+    if full_rebuild and not files:
         print("No documents found to ingest!")
         return
 
-    print(f"Total documents to ingest: {len(all_documents)}")
+    stale_ids = [doc_id for f in changed + removed for doc_id in manifest.get(f, {}).get("chunk_ids", [])]
+    # Chunks a previous run inserted for a file that has since changed again are stale too
+    for filename, entry in list(progress.items()):
+        if hashes.get(filename) != entry["hash"]:
+            stale_ids.extend(chunk_id(filename, entry["hash"], i) for i in range(entry["inserted"]))
+            del progress[filename]
+    print(f"Chunks to delete: {len(stale_ids)}")
+    if generation is None:
+        generation = new_generation()
+        checkpoint.update(generation=generation.id, base=base.id if base else None)
     
-    print("Initializing Embeddings (nomic-embed-text)...")
-    embeddings = OllamaEmbeddings(
-        model=config.EMBEDDING_MODEL,
-        base_url=config.OLLAMA_BASE_URL
-    )
-    
-    # Sanitize metadata for Milvus (Auto-schema prefers consistent types)
-    for doc in all_documents:
-        new_metadata = {}
-        for k, v in doc.metadata.items():
-            if isinstance(v, (str, int, float, bool)):
-                new_metadata[k] = str(v)  # Convert everything to string for safety
-        doc.metadata = new_metadata
-
-    print(f"Indexing to Milvus collection '{config.COLLECTION_NAME}'...")
+    print(f"Initializing Embeddings ({config.EMBEDDING_MODEL})...")
+    embeddings = embeddings or CachedEmbeddings()
+    precomputed = PrecomputedEmbeddings()
+
+    # Stages: load -> split -> sanitize -> embed -> insert, each in its own thread with bounded queues between
+    def load():
+        pending = [f for f in changed if not progress.get(f, {}).get("done")]
+        jobs = [(os.path.join(data_dir, f), hashes[f]) for f in pending if not f.endswith(TABULAR_EXTENSIONS)]
+        # Only INGEST_WORKERS files are parsed ahead of the consumer; each page is passed on as soon as it is read
+        with DocumentExtractor(jobs) as extractor:
+            for filename in pending:
+                path = os.path.join(data_dir, filename)
+                error = None
+                try:
+                    if filename.endswith(TABULAR_EXTENSIONS):
+                        for docs in iter_tabular_batches(path):
+                            yield ChunkBatch(filename, docs)
+                    else:
+                        for page in extractor.pages(path, hashes[filename]):
+                            yield ChunkBatch(filename, [page])
+                except Exception as e: # ExtractionError (worker crashed / timed out) or a spreadsheet read error
+                    print(f"Error loading {filename}: {e}")
+                    error = str(e)
+                yield ChunkBatch(filename, [], last=True, error=error)
+            extraction_stats.update(extractor.stats)
+
+    def split(batches):
+        # Re-batches into fixed-size INGEST_BATCH_SIZE chunk batches; spreadsheet rows are already chunks
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+        size = config.INGEST_BATCH_SIZE
+        buffer = []
+        for batch in batches:
+            if batch.filename.endswith(TABULAR_EXTENSIONS):
+                buffer.extend(batch.documents)
+            else:
+                buffer.extend(text_splitter.split_documents(batch.documents))
+            while len(buffer) >= size:
+                yield ChunkBatch(batch.filename, buffer[:size])
+                buffer = buffer[size:]
+            if batch.last:
+                yield ChunkBatch(batch.filename, [] if batch.error else buffer, last=True, error=batch.error)
+                buffer = []
+
+    def sanitize(batches):
+        next_index = {}
+        for batch in batches:
+            filename = batch.filename
+            start = next_index.get(filename, 0)
+            next_index[filename] = start + len(batch)
+            # Skip the chunks an interrupted run already inserted (chunk IDs are deterministic)
+            skip = min(len(batch), max(0, progress.get(filename, {}).get("inserted", 0) - start))
+            batch.documents = batch.documents[skip:]
+            batch.start = start + skip
+            batch.ids = [chunk_id(filename, hashes[filename], batch.start + i) for i in range(len(batch))]
+            for doc, doc_id in zip(batch.documents, batch.ids):
+                doc.metadata["chunk_id"] = doc_id
+                sanitize_metadata(doc)
+            yield batch
+
+    def embed(batches):
+        for batch in batches:
+            if batch.documents:
+                batch.vectors = embeddings.embed_documents([doc.page_content for doc in batch.documents])
+            yield batch
+
+    def insert(batches):
+        with open(spool_path, "a") as spool:
+            for batch in batches:
+                if batch.error:
+                    # Drop what was inserted of a file that failed to load: it stays out of the checkpoint and
+                    # the manifest, so the next ingest tries it again instead of treating it as indexed
+                    entry = progress.pop(batch.filename, None)
+                    if entry and entry["inserted"]:
+                        vector_store.delete(ids=[chunk_id(batch.filename, entry["hash"], i) for i in range(entry["inserted"])])
+                    failed[batch.filename] = batch.error
+                    save_checkpoint(checkpoint)
+                    yield batch
+                    continue
+                if batch.documents:
+                    precomputed.vectors = batch.vectors
+                    vector_store.add_documents(batch.documents, ids=batch.ids)
+                    for doc in batch.documents:
+                        spool.write(json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}) + "\n")
+                    spool.flush()
+                entry = progress.setdefault(batch.filename, {"hash": hashes[batch.filename], "inserted": 0, "done": False})
+                entry["inserted"] = batch.start + len(batch)
+                entry["done"] = batch.last
+                checkpoint["spool_bytes"] = spool.tell()
+                save_checkpoint(checkpoint)
+                if batch.last:
+                    print(f"Indexed {entry['inserted']} chunks from {batch.filename}.")
+                yield batch
+
+    print(f"Indexing to {config.VECTOR_STORE_BACKEND} vector store (index generation {generation.id})...")
+    # New chunks, replayed into the BM25 build; kept alongside the checkpoint until the ingest completes
+    spool_path = f"{config.INGEST_CHECKPOINT_PATH}.spool.jsonl"
+    pipeline = Pipeline()
+    extraction_stats = {}
+    failed = {} # filename -> error, for files that could not be loaded
+    summary = None
+    start = time.perf_counter()
     try:
-        Milvus.from_documents(
-            all_documents,
-            embeddings,
-            collection_name=config.COLLECTION_NAME,
-            connection_args={"host": config.MILVUS_HOST, "port": config.MILVUS_PORT},
-            drop_old=True # Reset collection for fresh start
-        )
-        print("Indexing to Milvus Complete!")
+        carry = base is not None and not checkpoint.get("carried_over")
+        # A carry-over interrupted half way is redone from an empty collection
+        vector_store = vector_store_factory(precomputed, generation=generation, drop_old=carry and resuming)
+        if carry:
+            # Unchanged files' chunks move to the new generation as they are (no re-embedding)
+            carry_over(vector_store, base, exclude_ids=stale_ids)
+            checkpoint["carried_over"] = True
+        if stale_ids:
+            vector_store.delete(ids=stale_ids)
+        with open(spool_path, "a") as spool:
+            spool.truncate(checkpoint["spool_bytes"]) # Drop lines written after the last checkpoint
+        save_checkpoint(checkpoint)
+
+        pipeline.run(("load", load), ("split", split), ("sanitize", sanitize), ("embed", embed), ("insert", insert))
+        if hasattr(vector_store, "persist"):
+            vector_store.persist() # Embedded store: merge the staged batches into a new index build; Milvus: flush
+        total_new = sum(entry["inserted"] for entry in progress.values())
+        print(f"Indexing Complete! ({total_new} chunks embedded)")
+        
+        # Build the generation's BM25 index (Hybrid Search): untouched files' chunks from the base, plus the new
+        # ones of every completely loaded file (the spool may also hold chunks of failed or re-run files)
+        stale = set(stale_ids)
+        chunks = []
+        if base is not None and os.path.exists(os.path.join(base.sparse_dir, "meta.json")):
+            chunks = (doc for doc in SparseIndex(base.sparse_dir).iter_documents()
+                      if doc.metadata.get("chunk_id") not in stale)
+        indexed = {chunk_id(filename, entry["hash"], i) for filename, entry in progress.items()
+                   if entry["done"] for i in range(entry["inserted"])}
+        new_chunks = _unique_chunks(doc for doc in _read_spool(spool_path) if doc.metadata.get("chunk_id") in indexed)
+        sparse_start = time.perf_counter()
+        num_chunks = build_sparse_index(_chain(chunks, new_chunks), generation.sparse_dir)
+        sparse_seconds = time.perf_counter() - sparse_start
+        print(f"Indexed {num_chunks} chunks for Hybrid Search.")
         
-        # Save chunks for BM25 (Hybrid Search)
-        import pickle
-        with open(os.path.join(data_dir, "chunks.pkl"), "wb") as f:
-            pickle.dump(all_documents, f)
-        print("Saved chunks for Hybrid Search.")
+        for filename in removed:
+            manifest.pop(filename, None)
+        for filename in changed:
+            if filename in failed:
+                manifest.pop(filename, None) # Not indexed: retried by the next ingest
+                continue
+            count = progress.get(filename, {}).get("inserted", 0)
+            manifest[filename] = {"hash": hashes[filename],
+                                  "chunk_ids": [chunk_id(filename, hashes[filename], i) for i in range(count)]}
+        save_manifest(manifest, generation.manifest_path)
+        prune_parse_cache(hashes.values())
+
+        faq_stats = None
+        if config.FAQ_ENABLED:
+            # FAQ entries follow the manifest: stale chunks lose theirs, new chunks get generated ones
+            chunk_ids = {doc_id for entry in manifest.values() for doc_id in entry["chunk_ids"]}
+            faq_stats = update_faq_index(SparseIndex(generation.sparse_dir).iter_documents(), chunk_ids, embeddings,
+                                         index_dir=generation.faq_dir, base_dir=base.faq_dir if base else None)
+
+        # Swap the complete generation in: running servers switch on their next search, and drop cached answers
+        publish(generation)
+        bump_index_version(generation.id)
+        print(f"Published index generation {generation.id}")
+        print(f"Embedding stats: {embeddings.stats}")
+        print(f"Extraction stats: {extraction_stats}")
+        if failed:
+            print(f"Files that failed to load (retried on the next ingest): {failed}")
+        os.remove(config.INGEST_CHECKPOINT_PATH)
+        os.remove(spool_path)
+        removed_generations = collect_garbage(drop_collection=getattr(vector_store, "drop_collection", None), locked=True)
+        if removed_generations:
+            print(f"Removed old index generations: {removed_generations}")
+        summary = {"generation": generation.id, "files": len(changed) - len(failed), "failed": failed, "chunks": total_new,
+                   "seconds": time.perf_counter() - start,
+                   "sparse_build_seconds": sparse_seconds, "extraction": extraction_stats, "faq": faq_stats,
+                   "stages": pipeline.stats}
         
     except Exception as e:
-        print(f"Failed to ingest to Milvus: {e}")
+        print(f"Failed to ingest: {e}")
+        if os.path.exists(config.INGEST_CHECKPOINT_PATH):
+            print("Progress was checkpointed; run ingestion again to resume.")
+    finally:
+        if pipeline.stats:
+            print("Stage throughput:")
+            for stats in pipeline.stats:
+                print(f"  {stats}")
+    return summary
 
 if __name__ == "__main__":
-    ingest_documents()
+    configure_logging() # Index and extraction progress is logged, the ingest summary printed
+    ingest_documents(full_rebuild="--full" in sys.argv)
@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from app.core.config import config
+
+_DONE = object()
+
+@dataclass
+class StageStats:
+    name: str
+    batches: int = 0
+    items: int = 0
+    seconds: float = 0.0 # Time spent in the stage itself, excluding waits on its neighbours
+
+    @property
+    def throughput(self):
+        return self.items / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.name:<10} {self.batches:>6} batches {self.items:>9} items "
+                f"{self.seconds:>8.2f}s busy {self.throughput:>10.1f} items/s")
+
+class _Input:
+    # Iterates an upstream queue, keeping track of how long the consumer was blocked on it
+    def __init__(self, q, stop):
+        self.q = q
+        self.stop = stop
+        self.wait = 0.0
+
+    def __iter__(self):
+        while True:
+            start = time.perf_counter()
+            while True:
+                try:
+                    item = self.q.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    if self.stop.is_set():
+                        return
+            self.wait += time.perf_counter() - start
+            if item is _DONE:
+                return
+            yield item
+
+class Pipeline:
+    """Runs generator stages in their own threads, joined by bounded queues."""
+
+    def __init__(self, queue_size: int = config.INGEST_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.stats = []
+        self._stop = threading.Event()
+        self._error = None
+
+    def _put(self, q, item):
+        # Blocks while the queue is full (backpressure), unless another stage has failed
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run_stage(self, stage, stats, upstream, downstream):
+        inp = _Input(upstream, self._stop) if upstream is not None else None
+        it = None
+        try:
+            it = iter(stage(inp) if inp is not None else stage())
+            while True:
+                start = time.perf_counter()
+                waited = inp.wait if inp else 0.0
+                try:
+                    batch = next(it)
+                except StopIteration:
+                    break
+                stats.seconds += time.perf_counter() - start - ((inp.wait if inp else 0.0) - waited)
+                stats.batches += 1
+                stats.items += len(batch)
+                if not self._put(downstream, batch):
+                    return
+            self._put(downstream, _DONE)
+        except BaseException as e:
+            self._error = self._error or e
+            self._stop.set()
+        finally:
+            if hasattr(it, "close"):
+                it.close() # Release the stage's resources (files, worker pools) even when stopped early
+
+    def run(self, source, *stages):
+        # source: (name, fn() -> iterable of batches); stages: (name, fn(iterable) -> iterable of batches).
+        # Returns the per-stage StageStats; the last stage's output is drained and discarded.
+        self.stats = [StageStats(name) for name, _ in (source, *stages)]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stats]
+        threads = []
+        for i, (_, fn) in enumerate((source, *stages)):
+            upstream = queues[i - 1] if i else None
+            threads.append(threading.Thread(target=self._run_stage, args=(fn, self.stats[i], upstream, queues[i]),
+                                            name=f"ingest-{self.stats[i].name}", daemon=True))
+        for thread in threads:
+            thread.start()
+        for _ in _Input(queues[-1], self._stop):
+            pass
+        for thread in threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.stats
@@ -0,0 +1,59 @@
+import os
+from itertools import islice
+import pandas as pd
+from openpyxl import load_workbook
+from langchain_core.documents import Document
+from app.core.config import config
+
+TABULAR_EXTENSIONS = (".xlsx", ".xls", ".csv")
+
+def rows_to_text(df: pd.DataFrame):
+    # "col: val, col2: val2" per row, skipping empty cells, built column by column instead of row by row
+    text = pd.Series("", index=df.index, dtype=object)
+    for col in df.columns:
+        values = df[col]
+        present = values.notna()
+        text = text + (f"{col}: " + values.astype(str) + ", ").where(present, "")
+    return text.str.slice(stop=-2).tolist() # Drop the trailing ", "
+
+def _documents(df: pd.DataFrame, filename: str, doc_type: str, first_row: int):
+    texts = rows_to_text(df)
+    return [
+        Document(page_content=text, metadata={"source": filename, "row": first_row + i, "type": doc_type})
+        for i, text in enumerate(texts) if text
+    ]
+
+def _iter_xlsx_frames(file_path: str, batch_rows: int):
+    # openpyxl read-only mode streams rows from the sheet XML instead of loading the workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        while True:
+            batch = list(islice(rows, batch_rows))
+            if not batch:
+                return
+            yield pd.DataFrame.from_records(batch, columns=columns)
+    finally:
+        workbook.close()
+
+def iter_tabular_batches(file_path: str, batch_rows: int = config.INGEST_BATCH_SIZE):
+    # Yields lists of row Documents, at most batch_rows at a time
+    filename = os.path.basename(file_path)
+    if filename.endswith(".csv"):
+        frames, doc_type = pd.read_csv(file_path, chunksize=batch_rows), "csv"
+    elif filename.endswith(".xlsx"):
+        frames, doc_type = _iter_xlsx_frames(file_path, batch_rows), "excel"
+    else:
+        # Legacy .xls has no streaming reader; read it once and slice
+        df = pd.read_excel(file_path)
+        frames, doc_type = (df.iloc[i:i + batch_rows] for i in range(0, len(df), batch_rows)), "excel"
+
+    first_row = 0
+    for df in frames:
+        df = df.reset_index(drop=True)
+        yield _documents(df, filename, doc_type, first_row)
+        first_row += len(df)
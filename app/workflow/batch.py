@@ -0,0 +1,83 @@
+import asyncio
+import json
+import time
+from app.core.config import config
+from app.core.telemetry import get_logger
+
+logger = get_logger("workflow.batch")
+
+def parse_batch(body: str):
+    # JSONL: one {"id": ..., "question": ...} object (or a bare JSON string) per line; ids default to the line number
+    items = []
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {line_number}: invalid JSON ({e.msg})")
+        if isinstance(data, str):
+            data = {"question": data}
+        if not isinstance(data, dict) or not isinstance(data.get("question"), str) or not data["question"].strip():
+            raise ValueError(f"Line {line_number}: expected an object with a non-empty 'question'")
+        items.append({"id": data.get("id", line_number), "question": data["question"]})
+    return items
+
+async def run_batch(graph, router, embeddings, items: list, concurrency: int = config.BATCH_CONCURRENCY):
+    # Yields one result per question as it completes (not in input order), then a {"summary": ...} record
+    start = time.perf_counter()
+    questions = [item["question"] for item in items]
+
+    # Batched embedding: all questions in a few /api/embed calls up front. The router's centroid tier
+    # and the dense retrieval leg then find them in the embedding cache.
+    if hasattr(embeddings, "aembed_queries"):
+        try:
+            await embeddings.aembed_queries(questions)
+        except Exception as e:
+            logger.warning("Batch query embedding failed", extra={"error": str(e)})
+    # Batched routing, so the graph skips its router node
+    routes = await router.aroute_batch(questions)
+    routed_at = time.perf_counter()
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(item, route):
+        async with semaphore:
+            item_start = time.perf_counter()
+            try:
+                state = await graph.ainvoke({"question": item["question"], "datasource": route["datasource"],
+                                             "filter": route.get("filter")})
+                return {
+                    "id": item["id"],
+                    "question": item["question"],
+                    "answer": state.get("generation", "No answer generated."),
+                    "datasource": state.get("datasource", "unknown"),
+                    "sources": sorted({doc.metadata.get("source", "unknown") for doc in state.get("documents", [])}),
+                    "cached": state.get("cached", False),
+                    "ms": round((time.perf_counter() - item_start) * 1000, 1),
+                }
+            except Exception as e:
+                logger.error("Batch question failed", extra={"id": item["id"], "error": str(e)})
+                return {"id": item["id"], "question": item["question"], "error": str(e)}
+
+    tasks = [asyncio.ensure_future(run_one(item, route)) for item, route in zip(items, routes)]
+    errors = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            errors += "error" in result
+            yield result
+    finally:
+        for task in tasks:
+            task.cancel() # Client went away: don't keep generating answers nobody will read
+
+    seconds = time.perf_counter() - start
+    summary = {
+        "questions": len(items),
+        "errors": errors,
+        "routing_ms": round((routed_at - start) * 1000, 1),
+        "seconds": round(seconds, 3),
+        "questions_per_second": round(len(items) / seconds, 2) if seconds else None,
+    }
+    logger.info("Batch complete", extra={"batch": summary})
+    yield {"summary": summary}
@@ -0,0 +1,182 @@
+from typing import TypedDict, List
+from langgraph.graph import StateGraph, END
+from langgraph.config import get_stream_writer
+from langchain_core.runnables import RunnableLambda
+
+from app.agents.answer import ERROR_ANSWER
+from app.agents.sql_agent import ERROR_ANSWER as SQL_ERROR_ANSWER
+from app.core.concurrency import stage_limiter
+from app.core.telemetry import span
+from langchain_core.documents import Document
+
+# Define State
+class AgentState(TypedDict):
+    question: str
+    documents: List[Document]
+    generation: str
+    datasource: str
+    filter: dict # Metadata filter for retrieval, chosen by the router
+    reuse_documents: List[Document] # Chunks from the previous turn of the conversation, reused instead of searching
+    speculation: int # Token of the retrieval started alongside routing (see speculation.py)
+    retrieval_timings: dict
+    context_stats: dict
+    error: str # Set by a node that fell back after a failure; such states are never cached
+
+def retrieved(result):
+    # State update for a HybridResult; a failed search marks the state so its answer is not cached
+    update = {"documents": result.documents, "retrieval_timings": result.timings}
+    if result.error:
+        update["error"] = f"retrieval: {result.error}"
+    return update
+
+def answered(answer, fallback, stage):
+    update = {"generation": answer}
+    if answer == fallback:
+        update["error"] = f"{stage} failed"
+    return update
+
+# Determine Next Step
+def route_query(state: AgentState):
+    datasource = state.get("datasource")
+    if datasource == "vector_store" or datasource == "excel_sheet":
+        return "retrieval"
+    elif datasource == "structured_query":
+        return "sql_agent"
+    else:
+        return "answer"
+
+def build_graph(router, retriever, answerer, sql_agent, reranker=None, speculation=None):
+    # Each node has a sync body for app_graph.invoke and an async body for app_graph.ainvoke,
+    # the async one gated by the per-stage concurrency limiter.
+    # With a reranker, retrieved chunks go through rerank + token-budget packing before the answer.
+    # With a SpeculativeRetrieval, the async router node starts retrieval before the route is known.
+
+    # Define Nodes (each one is a span: rag_span_duration_seconds{span="node.<name>"})
+    def router_node(state: AgentState):
+        if state.get("datasource"):
+            return {} # Routed ahead of time (batch jobs route all questions in one pass)
+        with span("node.router"):
+            question = state["question"]
+            route_result = router.route(question)
+        return {"datasource": route_result["datasource"], "filter": route_result.get("filter")}
+
+    async def arouter_node(state: AgentState):
+        if state.get("datasource"):
+            return {}
+        question = state["question"]
+        token = None
+        if speculation is not None and not state.get("reuse_documents"):
+            speculative_filter = router.speculative_filter(question)
+            token = speculation.start(question, speculative_filter)
+        try:
+            with span("node.router"):
+                async with stage_limiter.stage("router"):
+                    route_result = await router.aroute(question)
+        except BaseException:
+            if token is not None:
+                speculation.cancel(token)
+            raise
+        if token is not None and route_query(route_result) != "retrieval":
+            speculation.cancel(token)
+            token = None
+        return {"datasource": route_result["datasource"], "filter": route_result.get("filter"), "speculation": token}
+
+    def retrieve_node(state: AgentState):
+        if state.get("reuse_documents"):
+            # Same-topic follow-up in a conversation: the previous turn's chunks are reused
+            documents = state["reuse_documents"]
+            return {"documents": documents, "retrieval_timings": {"memory": {"ms": 0.0, "status": "reused", "hits": len(documents)}}}
+        with span("node.retrieval"):
+            question = state["question"]
+            # We retrieve from the vector store for both vector_store and excel_sheet 
+            # (since we indexed excel rows as text)
+            result = retriever.search(question, filter=state.get("filter"))
+        return retrieved(result)
+
+    async def aretrieve_node(state: AgentState):
+        if state.get("reuse_documents"):
+            return retrieve_node(state)
+        if speculation is not None and state.get("speculation"):
+            result = await speculation.take(state["speculation"], state["question"], state.get("filter"))
+            if result is not None:
+                return retrieved(result)
+        with span("node.retrieval"):
+            async with stage_limiter.stage("retrieval"):
+                result = await retriever.asearch(state["question"], filter=state.get("filter"))
+        return retrieved(result)
+
+    def rerank_node(state: AgentState):
+        with span("node.rerank"):
+            result = reranker.rerank(state["question"], state.get("documents", []))
+        return {"documents": result.documents, "context_stats": result.stats}
+
+    async def arerank_node(state: AgentState):
+        with span("node.rerank"):
+            async with stage_limiter.stage("retrieval"):
+                result = await reranker.arerank(state["question"], state.get("documents", []))
+        return {"documents": result.documents, "context_stats": result.stats}
+
+    def generate_node(state: AgentState):
+        with span("node.answer"):
+            question = state["question"]
+            docs = state.get("documents", [])
+            answer = answerer.generate_answer(question, docs)
+        return answered(answer, ERROR_ANSWER, "answer")
+
+    async def agenerate_node(state: AgentState):
+        # Tokens go out on the "custom" stream as they arrive (a no-op unless the caller streams)
+        writer = get_stream_writer()
+        tokens = []
+        with span("node.answer"):
+            async with stage_limiter.stage("answer"):
+                async for token in answerer.astream_answer(state["question"], state.get("documents", [])):
+                    writer({"token": token})
+                    tokens.append(token)
+        update = {"generation": "".join(tokens)}
+        if tokens and tokens[-1] == ERROR_ANSWER:
+            update["error"] = "answer failed" # Possibly after some tokens were already streamed
+        return update
+
+    def sql_node(state: AgentState):
+        with span("node.sql_agent"):
+            question = state["question"]
+            answer = sql_agent.query(question)
+        return {**answered(answer, SQL_ERROR_ANSWER, "sql_agent"), "datasource": "structured_db"} # structured_db source
+
+    async def asql_node(state: AgentState):
+        with span("node.sql_agent"):
+            async with stage_limiter.stage("sql_agent"):
+                answer = await sql_agent.aquery(state["question"])
+        return {**answered(answer, SQL_ERROR_ANSWER, "sql_agent"), "datasource": "structured_db"}
+
+    # Build Graph
+    workflow = StateGraph(AgentState)
+
+    workflow.add_node("router", RunnableLambda(router_node, afunc=arouter_node))
+    workflow.add_node("retrieval", RunnableLambda(retrieve_node, afunc=aretrieve_node))
+    workflow.add_node("answer", RunnableLambda(generate_node, afunc=agenerate_node))
+    workflow.add_node("sql_agent", RunnableLambda(sql_node, afunc=asql_node)) # Add node
+    if reranker is not None:
+        workflow.add_node("rerank", RunnableLambda(rerank_node, afunc=arerank_node))
+
+    workflow.set_entry_point("router")
+
+    workflow.add_conditional_edges(
+        "router",
+        route_query,
+        {
+            "retrieval": "retrieval",
+            "sql_agent": "sql_agent",
+            "answer": "answer"
+        }
+    )
+
+    if reranker is not None:
+        workflow.add_edge("retrieval", "rerank")
+        workflow.add_edge("rerank", "answer")
+    else:
+        workflow.add_edge("retrieval", "answer")
+    workflow.add_edge("answer", END)
+    workflow.add_edge("sql_agent", END) # SQL agent ends directly
+
+    return workflow.compile()
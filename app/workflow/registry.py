@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+from app.agents.answer import AnswerAgent
+from app.agents.condense import CondenseAgent
+from app.agents.rerank import RerankAgent
+from app.agents.retrieval import RetrievalAgent
+from app.agents.router import RouterAgent
+from app.agents.sql_agent import SQLAgent
+from app.core.answer_cache import AnswerCache, CachedGraph
+from app.core.config import config
+from app.core.concurrency import stage_limiter
+from app.core.conversation import ConversationalGraph, ConversationStore
+from app.core.embeddings import CachedEmbeddings
+from app.core.faq import FAQGraph, FAQIndex
+from app.core.llm import GatewayChatModel, get_gateway
+from app.core.telemetry import LLMMetricsCallback, get_logger, register_collector
+from app.workflow.builder import build_graph
+from app.workflow.speculation import SpeculativeRetrieval
+
+logger = get_logger("workflow.registry")
+
+def default_agents(registry):
+    embeddings = registry.embeddings()
+    retriever = RetrievalAgent(embeddings=embeddings) # Opens the published index generation, and each new one
+    router = RouterAgent(llm=registry.llm(format="json", temperature=0), embeddings=embeddings)
+    answerer = AnswerAgent(llm=registry.llm(temperature=0.1)) # Low temp for factual answers
+    sql_agent = SQLAgent(llm=registry.llm(temperature=0))
+    reranker = RerankAgent(embeddings=embeddings) if config.RERANK_ENABLED else None
+    return router, retriever, answerer, sql_agent, reranker
+
+class AgentRegistry:
+    """Builds the agents and the compiled graph once per process, on first use or in the background,
+    and hands out shared clients (LLMs, embeddings) so agents don't each open their own."""
+
+    def __init__(self, build_agents=default_agents):
+        self.build_agents = build_agents
+        self.timings = {} # component -> seconds spent constructing it
+        self.agents = {} # name -> agent, once built
+        self.error = None
+        self._graph = None
+        self._resources = {}
+        self._build_lock = threading.Lock()
+        self._resource_lock = threading.RLock()
+        self._last_failure = 0.0
+
+    @property
+    def ready(self):
+        return self._graph is not None
+
+    def status(self):
+        return {"ready": self.ready, "error": self.error,
+                "timings": {name: round(seconds, 3) for name, seconds in self.timings.items()}}
+
+    def _resource(self, name, factory):
+        with self._resource_lock:
+            if name not in self._resources:
+                start = time.perf_counter()
+                self._resources[name] = factory()
+                self.timings[name] = time.perf_counter() - start
+            return self._resources[name]
+
+    def embeddings(self):
+        return self._resource("embeddings", CachedEmbeddings)
+
+    def llm_gateway(self):
+        return self._resource("llm_gateway", get_gateway)
+
+    def llm(self, **params):
+        # One model per distinct parameter set (e.g. JSON-mode router vs. answer generation),
+        # all sending through the same gateway and its pooled connections
+        name = "llm(" + ", ".join(f"{k}={v}" for k, v in sorted(params.items())) + ")"
+        label = "json" if params.get("format") == "json" else f"t{params.get('temperature', 'default')}"
+        return self._resource(name, lambda: GatewayChatModel(gateway=self.llm_gateway(),
+                                                             callbacks=[LLMMetricsCallback(label)], **params))
+
+    def _build(self):
+        start = time.perf_counter()
+        router, retriever, answerer, sql_agent, reranker = self.build_agents(self)
+        self.agents = {"router": router, "retriever": retriever, "answer": answerer,
+                       "sql_agent": sql_agent, "rerank": reranker}
+        speculation = SpeculativeRetrieval(retriever) if config.SPECULATIVE_RETRIEVAL_ENABLED else None
+        graph = build_graph(router, retriever, answerer, sql_agent, reranker, speculation=speculation)
+        if speculation is not None:
+            register_collector("speculation", speculation.stats)
+        if config.FAQ_ENABLED:
+            # Questions matching a precomputed FAQ entry are answered without routing, retrieval or generation
+            graph = FAQGraph(graph, FAQIndex(retriever.embeddings))
+            register_collector("faq", graph.faq.stats)
+        if config.ANSWER_CACHE_ENABLED:
+            # Repeated and near-duplicate questions are answered from cache without touching the LLM
+            graph = CachedGraph(graph, AnswerCache(embeddings=retriever.embeddings))
+            register_collector("answer_cache", graph.cache.stats)
+        if config.MEMORY_ENABLED:
+            # Requests with a session_id are rewritten against their conversation (outside the answer cache,
+            # so a rewritten follow-up can still hit it)
+            graph = ConversationalGraph(graph, ConversationStore(), CondenseAgent(llm=self.llm(temperature=0)),
+                                        embeddings=retriever.embeddings)
+            register_collector("conversations", graph.store.stats)
+        if hasattr(retriever.embeddings, "stats"):
+            register_collector("embeddings", lambda: retriever.embeddings.stats)
+        if hasattr(retriever, "index_stats"):
+            register_collector("index", retriever.index_stats)
+        register_collector("sql_cache", lambda: sql_agent.cache_stats)
+        register_collector("in_flight", lambda: stage_limiter.in_flight)
+        if "llm_gateway" in self._resources:
+            register_collector("llm_gateway", lambda: self._resources["llm_gateway"].stats)
+        self.timings["total"] = time.perf_counter() - start
+        return graph
+
+    def get_graph(self):
+        if self._graph is not None:
+            return self._graph
+        with self._build_lock:
+            if self._graph is None:
+                if self.error and time.time() - self._last_failure < config.AGENT_INIT_RETRY_SECONDS:
+                    raise RuntimeError(f"Agents failed to initialize: {self.error}")
+                logger.info("Initializing agents")
+                try:
+                    self._graph = self._build()
+                    self.error = None
+                    logger.info("Agents ready", extra={"timings": self.status()["timings"]})
+                except Exception as e:
+                    self.error = str(e)
+                    self._last_failure = time.time()
+                    logger.error("Agent initialization failed", extra={"error": str(e)})
+                    raise
+        return self._graph
+
+    async def aget_graph(self, timeout: float = config.STARTUP_WAIT_SECONDS):
+        if self._graph is not None:
+            return self._graph
+        return await asyncio.wait_for(asyncio.to_thread(self.get_graph), timeout=timeout)
+
+    def start_background(self):
+        # Warm up without blocking startup; failures are recorded and retried on demand
+        def warm():
+            try:
+                self.get_graph()
+            except Exception:
+                pass
+        threading.Thread(target=warm, name="agent-init", daemon=True).start()
@@ -0,0 +1,89 @@
+import asyncio
+import itertools
+import threading
+import time
+from app.core.concurrency import stage_limiter
+from app.core.config import config
+from app.core.telemetry import get_logger, span
+
+logger = get_logger("workflow.speculation")
+
+class SpeculativeRetrieval:
+    """Starts retrieval (query embedding + hybrid search) while the router is still deciding.
+    Retrieval routes pick up the in-flight search; other routes cancel it. Async graph only."""
+
+    def __init__(self, retriever, max_age_seconds=config.SPECULATIVE_MAX_AGE_SECONDS):
+        self.retriever = retriever
+        self.max_age_seconds = max_age_seconds
+        self._tokens = itertools.count(1)
+        self._pending = {} # token -> {"task", "question", "filter", "started", "finished"}
+        self._lock = threading.Lock()
+        # saved_ms: retrieval time that overlapped routing; wasted_ms: retrieval time spent on discarded searches
+        self.counters = {"started": 0, "used": 0, "cancelled": 0, "discarded": 0, "saved_ms": 0.0, "wasted_ms": 0.0}
+
+    def stats(self):
+        with self._lock:
+            return {**{k: round(v, 1) for k, v in self.counters.items()}, "pending": len(self._pending)}
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    async def _search(self, question: str, filter):
+        with span("node.retrieval.speculative"):
+            async with stage_limiter.stage("retrieval"):
+                return await self.retriever.asearch(question, filter=filter)
+
+    def _expire(self):
+        # Searches nobody collected (the graph failed between router and retrieval)
+        now = time.perf_counter()
+        for token in [t for t, entry in self._pending.items() if now - entry["started"] > self.max_age_seconds]:
+            self._drop(token, "discarded")
+
+    def start(self, question: str, filter=None):
+        # Returns a token for take() / cancel(); must be called from the event loop running the graph
+        self._expire()
+        token = next(self._tokens)
+        entry = {"question": question, "filter": filter, "started": time.perf_counter(), "finished": None}
+        entry["task"] = asyncio.ensure_future(self._search(question, filter))
+        entry["task"].add_done_callback(lambda _: entry.update(finished=time.perf_counter()))
+        self._pending[token] = entry
+        self._count(started=1)
+        return token
+
+    def _drop(self, token, outcome: str):
+        entry = self._pending.pop(token, None)
+        if entry is None:
+            return
+        entry["task"].cancel()
+        if entry["task"].done() and not entry["task"].cancelled():
+            entry["task"].exception() # Retrieve it so a failed search is not reported as never retrieved
+        wasted = (entry["finished"] or time.perf_counter()) - entry["started"]
+        self._count(**{outcome: 1, "wasted_ms": wasted * 1000})
+        logger.debug("Speculative retrieval dropped", extra={"outcome": outcome, "wasted_ms": round(wasted * 1000, 1)})
+
+    def cancel(self, token):
+        # The route does not retrieve (structured_query / general_chat)
+        self._drop(token, "cancelled")
+
+    async def take(self, token, question: str, filter=None):
+        # The speculative SearchResult, or None if there is none for this question + filter (search normally)
+        entry = self._pending.get(token)
+        if entry is None:
+            return None
+        if entry["question"] != question or entry["filter"] != filter:
+            self._drop(token, "discarded") # The route chose a different filter (e.g. excel_sheet)
+            return None
+        del self._pending[token]
+        asked = time.perf_counter()
+        result = await entry["task"]
+        if result.error:
+            # RetrievalAgent.asearch reports failures on the result instead of raising
+            logger.warning("Speculative retrieval failed, searching again", extra={"error": result.error})
+            self._count(discarded=1, wasted_ms=(time.perf_counter() - entry["started"]) * 1000)
+            return None
+        saved = max(0.0, min(entry["finished"] or asked, asked) - entry["started"])
+        self._count(used=1, saved_ms=saved * 1000)
+        result.timings["speculative"] = {"ms": round(saved * 1000, 1), "status": "saved", "hits": len(result.documents)}
+        return result
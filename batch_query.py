@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import time
+import requests
+
+# Replays a JSONL file of questions through POST /query/batch and appends the answers to a JSONL file.
+# Each input line is {"id": ..., "question": ...} (or just a JSON string; the line number becomes the id).
+# Re-running with the same output file skips ids already answered, so an interrupted job resumes.
+#
+#   python batch_query.py tickets.jsonl -o answers.jsonl --concurrency 4
+
+def read_questions(path):
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if isinstance(data, str):
+                data = {"question": data}
+            items.append({"id": data.get("id", line_number), "question": data["question"]})
+    return items
+
+def answered_ids(path):
+    done = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # Partial line from an interrupted run
+                if "error" not in result:
+                    done.add(json.dumps(result["id"]))
+    return done
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", help="JSONL file of questions")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl")
+    parser.add_argument("--url", default="http://localhost:8000/query/batch")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Questions per request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent generations on the server")
+    args = parser.parse_args()
+
+    items = read_questions(args.input)
+    done = answered_ids(args.output)
+    pending = [item for item in items if json.dumps(item["id"]) not in done]
+    print(f"{len(items)} questions, {len(items) - len(pending)} already answered, {len(pending)} to go")
+
+    start = time.perf_counter()
+    answered, errors = 0, 0
+    with open(args.output, "a", encoding="utf-8") as out:
+        for i in range(0, len(pending), args.chunk_size):
+            chunk = pending[i:i + args.chunk_size]
+            body = "\n".join(json.dumps(item) for item in chunk)
+            try:
+                response = requests.post(args.url, params={"concurrency": args.concurrency}, data=body.encode("utf-8"),
+                                         headers={"Content-Type": "application/x-ndjson"}, stream=True)
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line:
+                        continue
+                    result = json.loads(line)
+                    if "summary" in result:
+                        print(f"  chunk: {result['summary']}")
+                        continue
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+                    answered += 1
+                    errors += "error" in result
+            except Exception as e:
+                print(f"Error: {e}")
+                print("Progress is saved; re-run the same command to resume.")
+                break
+            elapsed = time.perf_counter() - start
+            print(f"{answered}/{len(pending)} answered ({errors} errors), {answered / elapsed:.2f} questions/sec")
+
+    elapsed = time.perf_counter() - start
+    if answered:
+        print(f"Done: {answered} answers in {elapsed:.1f}s ({answered / elapsed:.2f} questions/sec) -> {args.output}")
+
+if __name__ == "__main__":
+    main()
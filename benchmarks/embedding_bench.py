@@ -0,0 +1,47 @@
+import argparse
+import os
+import tempfile
+import time
+from langchain_community.embeddings import OllamaEmbeddings
+from app.core.embeddings import CachedEmbeddings
+from benchmarks.stubs import StubEmbeddingServer
+
+# Usage: python -m benchmarks.embedding_bench --texts 2000
+# Embeds synthetic Excel-style rows against a local stub Ollama server: one request per text
+# (langchain's OllamaEmbeddings) vs. the batched/concurrent client, cold and with a warm cache.
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding client throughput against a stub server")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--request-latency", type=float, default=0.02)
+    parser.add_argument("--baseline-texts", type=int, default=200, help="Texts for the slow per-text baseline")
+    args = parser.parse_args()
+
+    texts = [f"Order ID: {i}, Customer: C{i % 97}, Status: {'Shipped' if i % 3 else 'Pending'}, Price: {i % 500}"
+             for i in range(args.texts)]
+
+    with StubEmbeddingServer(request_latency=args.request_latency) as server, tempfile.TemporaryDirectory() as tmp:
+        baseline = OllamaEmbeddings(model="stub", base_url=server.base_url)
+        n = min(args.baseline_texts, len(texts))
+        baseline_rate = n / timed(lambda: baseline.embed_documents(texts[:n]))
+
+        client = CachedEmbeddings(model="stub", base_url=server.base_url, batch_size=args.batch_size,
+                                  max_concurrency=args.concurrency, cache_path=os.path.join(tmp, "cache.sqlite"))
+        cold = timed(lambda: client.embed_documents(texts))
+        requests_cold = client.stats["requests"]
+        warm = timed(lambda: client.embed_documents(texts))
+
+        print(f"\n{'client':<28} {'texts/s':>10} {'requests':>9}")
+        print(f"{'per-text (OllamaEmbeddings)':<28} {baseline_rate:>10.0f} {n:>9}")
+        print(f"{'batched, cold cache':<28} {len(texts) / cold:>10.0f} {requests_cold:>9}")
+        print(f"{'batched, warm cache':<28} {len(texts) / warm:>10.0f} {client.stats['requests'] - requests_cold:>9}")
+
+if __name__ == "__main__":
+    main()
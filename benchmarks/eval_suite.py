@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import zipfile
+from xml.sax.saxutils import escape
+import httpx
+import pandas as pd
+from pptx import Presentation
+from langchain_core.vectorstores import InMemoryVectorStore
+from app.core.config import config
+from app.core.embeddings import CachedEmbeddings
+from app.core.llm import GatewayChatModel, LLMGateway, StubBackend
+from benchmarks.stubs import StubEmbeddingServer, bow_vector
+
+# Usage: python -m benchmarks.eval_suite --facts 2000 --queries 200 --json results.json
+# Offline regression suite. Everything runs in a throwaway workspace with a local stub embedding server,
+# the stub LLM backend and an in-memory vector store standing in for Milvus.
+#  1. builds a synthetic corpus (txt / csv / xlsx / docx / pptx) of --facts support articles
+#  2. ingest: end-to-end throughput, per-stage throughput, sparse index build time
+#  3. cold start: agents + indexes ready, first query
+#  4. retrieval: p50/p95/p99 latency and recall@k for dense, BM25 and hybrid
+#  5. end-to-end POST /query latency and questions/sec at each --concurrency level
+
+PRODUCTS = ["router", "thermostat", "doorbell", "camera", "smart plug", "speaker", "hub", "light strip",
+            "sensor", "lock", "vacuum", "air purifier"]
+SYMPTOMS = ["a blinking amber light", "no power", "a solid red light", "intermittent Wi-Fi drops",
+            "a clicking noise", "an overheating warning", "a frozen display", "pairing failures",
+            "a low battery alert", "a firmware update loop", "distorted audio", "slow response times",
+            "an offline status in the app", "a factory reset prompt", "a missing schedule"]
+FIXES = ["hold the reset button for ten seconds", "replace the power adapter", "move it closer to the hub",
+         "reinstall the latest firmware", "clear the device from the app and pair it again",
+         "check the breaker and wiring", "contact support for a replacement unit", "clean the vents",
+         "swap in fresh batteries", "disable battery saver mode", "restart the hub and wait five minutes"]
+FORMATS = [".txt", ".csv", ".xlsx", ".docx", ".pptx"]
+
+def make_fact(n):
+    return {
+        "code": f"KB{n:05d}",
+        "product": PRODUCTS[n % len(PRODUCTS)],
+        "model": f"X{n}",
+        "symptom": SYMPTOMS[(n // len(PRODUCTS)) % len(SYMPTOMS)],
+        "fix": FIXES[(n * 7) % len(FIXES)],
+    }
+
+def fact_text(fact):
+    return (f"Article {fact['code']}: if the {fact['product']} model {fact['model']} shows {fact['symptom']}, "
+            f"{fact['fix']}.")
+
+def fact_question(fact):
+    return f"What should I do when my {fact['product']} {fact['model']} has {fact['symptom']}?"
+
+def write_docx(path, paragraphs):
+    # Minimal WordprocessingML package: enough for docx2txt
+    body = "".join(f"<w:p><w:r><w:t>{escape(p)}</w:t></w:r></w:p>" for p in paragraphs)
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("[Content_Types].xml",
+                   '<?xml version="1.0" encoding="UTF-8"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                   '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                   '<Default Extension="xml" ContentType="application/xml"/>'
+                   '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>')
+        z.writestr("_rels/.rels",
+                   '<?xml version="1.0" encoding="UTF-8"?><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/></Relationships>')
+        z.writestr("word/document.xml",
+                   '<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                   f"<w:body>{body}</w:body></w:document>")
+
+def write_pptx(path, paragraphs):
+    prs = Presentation()
+    for paragraph in paragraphs:
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = paragraph.split(":")[0]
+        slide.placeholders[1].text = paragraph
+    prs.save(path)
+
+def build_corpus(data_dir, num_facts, facts_per_file):
+    # Facts are spread round-robin over the formats; returns the facts, files and bytes written
+    facts = [make_fact(n) for n in range(num_facts)]
+    paths = []
+    for file_index, first in enumerate(range(0, num_facts, facts_per_file)):
+        group = facts[first:first + facts_per_file]
+        extension = FORMATS[file_index % len(FORMATS)]
+        path = os.path.join(data_dir, f"kb_{file_index:04d}{extension}")
+        paths.append(path)
+        if extension == ".txt":
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n\n".join(fact_text(fact) for fact in group))
+        elif extension in (".csv", ".xlsx"):
+            df = pd.DataFrame([{"code": fact["code"], "product": fact["product"], "model": fact["model"],
+                                "symptom": fact["symptom"], "resolution": fact["fix"]} for fact in group])
+            df.to_csv(path, index=False) if extension == ".csv" else df.to_excel(path, index=False)
+        elif extension == ".docx":
+            write_docx(path, [fact_text(fact) for fact in group])
+        else:
+            write_pptx(path, [fact_text(fact) for fact in group])
+    return facts, len(paths), sum(os.path.getsize(path) for path in paths)
+
+def percentiles(values):
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+    return {"p50": pick(50), "p95": pick(95), "p99": pick(99)}
+
+def recall(results, targets, k):
+    return sum(any(target in doc.page_content for doc in docs[:k]) for docs, target in zip(results, targets)) / len(targets)
+
+def bench_retrieval(agent, questions, targets, ks):
+    legs = {
+        "dense": lambda q: agent.milvus_retriever.invoke(q),
+        "bm25": lambda q: agent.bm25_retriever.invoke(q),
+        "hybrid": lambda q: agent.hybrid_retriever.retrieve(q).documents,
+    }
+    report = {}
+    for name, search in legs.items():
+        latencies, results = [], []
+        for question in questions:
+            start = time.perf_counter()
+            results.append(search(question))
+            latencies.append((time.perf_counter() - start) * 1000)
+        report[name] = {**{k: round(v, 2) for k, v in percentiles(latencies).items()},
+                        **{f"recall@{k}": round(recall(results, targets, k), 3) for k in ks}}
+    return report
+
+async def bench_e2e(app, questions, concurrency_levels, requests_per_level):
+    report = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        for concurrency in concurrency_levels:
+            pending = iter(questions[i % len(questions)] for i in range(requests_per_level))
+            latencies, errors = [], 0
+
+            async def worker():
+                nonlocal errors
+                for question in pending:
+                    start = time.perf_counter()
+                    response = await client.post("/query", json={"question": question})
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    errors += response.status_code != 200
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            seconds = time.perf_counter() - start
+            report[concurrency] = {**{k: round(v, 1) for k, v in percentiles(latencies).items()},
+                                   "qps": round(len(latencies) / seconds, 2), "errors": errors}
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingest / retrieval / end-to-end benchmark")
+    parser.add_argument("--facts", type=int, default=2000, help="Synthetic support articles in the corpus")
+    parser.add_argument("--facts-per-file", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--e2e-requests", type=int, default=64, help="/query requests per concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stub LLM time to first token (s)")
+    parser.add_argument("--llm-slots", type=int, default=2, help="Stub LLM generations in parallel")
+    parser.add_argument("--embed-latency", type=float, default=0.005, help="Stub /api/embed time per request (s)")
+    parser.add_argument("--vector-store", choices=["memory", "embedded"], default="memory",
+                        help="LangChain InMemoryVectorStore, or the embedded mmap index (VECTOR_STORE_BACKEND='embedded')")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--keep", action="store_true", help="Keep the workspace directory")
+    args = parser.parse_args()
+
+    from app.agents.answer import AnswerAgent
+    from app.agents.rerank import RerankAgent
+    from app.agents.retrieval import RetrievalAgent
+    from app.agents.router import RouterAgent
+    from app.agents.sql_agent import SQLAgent
+    from app.index.vector_store import create_vector_store
+    from app.ingestion.ingest import ingest_documents
+    from app.workflow.registry import AgentRegistry
+    import app.api.server as server
+
+    config.ANSWER_CACHE_ENABLED = False # Measure the pipeline, not the cache
+    results_path = os.path.abspath(args.json) if args.json else None
+    cwd = os.getcwd()
+    workspace = tempfile.mkdtemp(prefix="rag-bench-")
+    os.chdir(workspace) # All data/ paths in config are relative
+    os.makedirs(config.DATA_DIR)
+    results = {"facts": args.facts, "queries": args.queries}
+    try:
+        with StubEmbeddingServer(request_latency=args.embed_latency, per_text_latency=0.0, dim=256,
+                                 vectorizer=bow_vector) as embed_server:
+            embeddings = CachedEmbeddings(base_url=embed_server.base_url)
+
+            start = time.perf_counter()
+            facts, files, size = build_corpus(config.DATA_DIR, args.facts, args.facts_per_file)
+            results["corpus"] = {"files": files, "mb": round(size / 2**20, 2),
+                                 "seconds": round(time.perf_counter() - start, 2)}
+            print(f"Corpus: {args.facts} facts in {results['corpus']['files']} files "
+                  f"({results['corpus']['mb']} MB) under {workspace}")
+
+            stores = []
+            def store_factory(embedding_function, generation=None, drop_old=False):
+                stores.append(InMemoryVectorStore(embedding_function))
+                return stores[-1]
+            if args.vector_store == "embedded":
+                config.VECTOR_STORE_BACKEND = "embedded"
+                store_factory = create_vector_store
+            with contextlib.redirect_stdout(io.StringIO()):
+                summary = ingest_documents(full_rebuild=True, vector_store_factory=store_factory, embeddings=embeddings)
+            if args.vector_store == "embedded":
+                store = create_vector_store(embeddings)
+            else:
+                store = stores[-1]
+                store.embedding = embeddings # Ingest inserted precomputed vectors; queries need the real embedder
+            results["ingest"] = {
+                "chunks": summary["chunks"], "seconds": round(summary["seconds"], 2),
+                "chunks_per_second": round(summary["chunks"] / summary["seconds"], 1),
+                "sparse_build_seconds": round(summary["sparse_build_seconds"], 3),
+                "stages": {s.name: round(s.throughput, 1) for s in summary["stages"]},
+            }
+            print(f"\nIngest: {summary['chunks']} chunks in {summary['seconds']:.2f}s "
+                  f"({results['ingest']['chunks_per_second']} chunks/s), "
+                  f"sparse index build {summary['sparse_build_seconds'] * 1000:.0f} ms")
+            for stats in summary["stages"]:
+                print(f"  {stats}")
+
+            gateway = LLMGateway(StubBackend(latency=args.llm_latency, slots=args.llm_slots))
+            def build_agents(registry):
+                llm = lambda **params: GatewayChatModel(gateway=gateway, **params)
+                return (RouterAgent(llm=llm(format="json", temperature=0), embeddings=embeddings),
+                        RetrievalAgent(embeddings=embeddings, vector_store=store),
+                        AnswerAgent(llm=llm(temperature=0.1)),
+                        SQLAgent(llm=llm(temperature=0), db_uri="sqlite://"),
+                        RerankAgent(embeddings=embeddings))
+
+            registry = AgentRegistry(build_agents=build_agents)
+            start = time.perf_counter()
+            graph = registry.get_graph()
+            ready = time.perf_counter() - start
+            start = time.perf_counter()
+            graph.invoke({"question": fact_question(facts[0])})
+            first = time.perf_counter() - start
+            results["cold_start"] = {"ready_ms": round(ready * 1000, 1), "first_query_ms": round(first * 1000, 1)}
+            print(f"\nCold start: agents + indexes ready in {ready * 1000:.1f} ms, first query {first * 1000:.1f} ms")
+
+            sample = random.Random(0).sample(facts, min(args.queries, len(facts)))
+            questions = [fact_question(fact) for fact in sample]
+            targets = [fact["code"] for fact in sample]
+            embeddings.embed_queries(questions) # Pre-warm: latencies below are search + fusion only
+            retriever = registry.agents["retriever"]
+            results["retrieval"] = bench_retrieval(retriever, questions, targets, args.k)
+            header = "".join(f"{f'recall@{k}':>10}" for k in args.k)
+            print(f"\nRetrieval ({len(questions)} queries, ms)\n{'mode':<8}{'p50':>8}{'p95':>8}{'p99':>8}{header}")
+            for mode, row in results["retrieval"].items():
+                recalls = "".join(f"{row[f'recall@{k}']:>10.3f}" for k in args.k)
+                print(f"{mode:<8}{row['p50']:>8.2f}{row['p95']:>8.2f}{row['p99']:>8.2f}{recalls}")
+
+            server.registry = registry
+            results["e2e"] = asyncio.run(bench_e2e(server.app, questions, args.concurrency, args.e2e_requests))
+            print(f"\nEnd-to-end POST /query ({args.e2e_requests} requests per level, ms)")
+            print(f"{'clients':<8}{'p50':>9}{'p95':>9}{'p99':>9}{'q/s':>8}{'errors':>8}")
+            for concurrency, row in results["e2e"].items():
+                print(f"{concurrency:<8}{row['p50']:>9.1f}{row['p95']:>9.1f}{row['p99']:>9.1f}"
+                      f"{row['qps']:>8.2f}{row['errors']:>8}")
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    if results_path:
+        with open(results_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {results_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import time
+from langchain.retrievers import EnsembleRetriever
+from langchain_core.documents import Document
+from app.index.hybrid import HybridRetriever, RetrievalLeg
+from benchmarks.stubs import StubRetriever
+
+# Usage: python -m benchmarks.hybrid_bench --dense-latency 0.08 --sparse-latency 0.03
+# Sequential EnsembleRetriever vs. the parallel HybridRetriever, plus the degraded cases
+# (one leg failing, one leg timing out).
+
+def docs(prefix, n=5):
+    return [Document(page_content=f"{prefix} {i}", metadata={"chunk_id": f"{prefix}-{i}"}) for i in range(n)]
+
+def timed(fn, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = fn()
+    return (time.perf_counter() - start) / runs * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs. parallel hybrid retrieval")
+    parser.add_argument("--dense-latency", type=float, default=0.08)
+    parser.add_argument("--sparse-latency", type=float, default=0.03)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    shared = docs("shared", 2)
+    dense = StubRetriever(documents=shared + docs("dense"), latency=args.dense_latency)
+    sparse = StubRetriever(documents=docs("sparse") + shared, latency=args.sparse_latency)
+
+    ensemble = EnsembleRetriever(retrievers=[dense, sparse], weights=[0.5, 0.5])
+    hybrid = HybridRetriever([RetrievalLeg("dense", dense, 0.5, 1.0), RetrievalLeg("sparse", sparse, 0.5, 1.0)])
+
+    ms, _ = timed(lambda: ensemble.invoke("q"), args.runs)
+    print(f"{'EnsembleRetriever (sequential)':<36} {ms:8.1f} ms")
+    ms, result = timed(lambda: hybrid.retrieve("q"), args.runs)
+    print(f"{'HybridRetriever (threads)':<36} {ms:8.1f} ms  {len(result.documents)} docs  {result.timings}")
+    ms, result = timed(lambda: asyncio.run(hybrid.aretrieve("q")), args.runs)
+    print(f"{'HybridRetriever (async)':<36} {ms:8.1f} ms  {len(result.documents)} docs  {result.timings}")
+
+    failing = HybridRetriever([RetrievalLeg("dense", StubRetriever(fail=True), 0.5, 1.0),
+                               RetrievalLeg("sparse", sparse, 0.5, 1.0)])
+    ms, result = timed(lambda: failing.retrieve("q"), 1)
+    print(f"{'dense leg failing':<36} {ms:8.1f} ms  {len(result.documents)} docs  {result.timings}")
+
+    slow = HybridRetriever([RetrievalLeg("dense", StubRetriever(documents=docs('dense'), latency=2.0), 0.5, 0.2),
+                            RetrievalLeg("sparse", sparse, 0.5, 1.0)])
+    ms, result = timed(lambda: asyncio.run(slow.aretrieve("q")), 1)
+    print(f"{'dense leg timing out (200 ms)':<36} {ms:8.1f} ms  {len(result.documents)} docs  {result.timings}")
+
+if __name__ == "__main__":
+    main()
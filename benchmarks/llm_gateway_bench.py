@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+import time
+from app.core.llm import LLMGateway, OllamaBackend, StubBackend
+
+# Usage: python -m benchmarks.llm_gateway_bench            (stub backend, deterministic)
+#        python -m benchmarks.llm_gateway_bench --ollama   (real model; keep-alive + prefix reuse show up in latency)
+# Fires bursts of concurrent prompts where only --distinct of them are unique, with coalescing off and on,
+# and reports wall time and how many generations the backend actually ran.
+
+SYSTEM = "You are a helpful assistant. Answer in one short sentence."
+
+def prompts(total, distinct):
+    return [[{"role": "system", "content": SYSTEM}, {"role": "user", "content": f"What is error code E{i % distinct}?"}]
+            for i in range(total)]
+
+async def burst(gateway, messages, stream):
+    async def one(m):
+        if stream:
+            return "".join([chunk["content"] async for chunk in gateway.astream(m)])
+        return (await gateway.achat(m))["content"]
+    start = time.perf_counter()
+    await asyncio.gather(*[one(m) for m in messages])
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--distinct", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Stub time per word (s)")
+    parser.add_argument("--slots", type=int, default=1, help="Stub generations in parallel (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--ollama", action="store_true")
+    args = parser.parse_args()
+
+    if args.ollama:
+        backend = OllamaBackend()
+    else:
+        backend = StubBackend(latency=args.latency, token_latency=args.token_latency, slots=args.slots)
+    messages = prompts(args.requests, args.distinct)
+    print(f"{args.requests} concurrent requests, {args.distinct} distinct prompts\n")
+    print(f"{'mode':<10} {'coalesce':<9} {'wall s':>8} {'backend calls':>14} {'coalesced':>10}")
+    for stream in (False, True):
+        for coalesce in (False, True):
+            gateway = LLMGateway(backend=backend, coalesce=coalesce)
+            seconds = asyncio.run(burst(gateway, messages, stream))
+            print(f"{'stream' if stream else 'invoke':<10} {str(coalesce):<9} {seconds:>8.2f} "
+                  f"{gateway.stats['backend_calls']:>14} {gateway.stats['coalesced']:>10}")
+
+if __name__ == "__main__":
+    main()
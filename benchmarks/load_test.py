@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import time
+from app.workflow.builder import build_graph
+from benchmarks.stubs import stub_agents
+
+# Usage: python -m benchmarks.load_test --clients 1 4 16 --requests 64
+# Runs the real graph with stubbed LLMs and an in-memory vector store to show that
+# app_graph.ainvoke overlaps requests instead of serving them one at a time.
+
+def build_stub_graph(router_latency, answer_latency):
+    return build_graph(*stub_agents(router_latency=router_latency, answer_latency=answer_latency))
+
+async def run_clients(graph, clients, total_requests):
+    queue = asyncio.Queue()
+    for i in range(total_requests):
+        queue.put_nowait(f"What does a blinking amber light mean? (#{i})")
+
+    async def client():
+        while not queue.empty():
+            question = queue.get_nowait()
+            await graph.ainvoke({"question": question})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /query load benchmark (stubbed LLM + vector store)")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--router-latency", type=float, default=0.05)
+    parser.add_argument("--answer-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    graph = build_stub_graph(args.router_latency, args.answer_latency)
+
+    # Baseline: the old blocking path, one request at a time
+    start = time.perf_counter()
+    for i in range(min(args.requests, 8)):
+        graph.invoke({"question": f"What does a blinking amber light mean? (#{i})"})
+    sync_rps = min(args.requests, 8) / (time.perf_counter() - start)
+
+    results = []
+    for clients in args.clients:
+        elapsed = asyncio.run(run_clients(graph, clients, args.requests))
+        results.append((clients, args.requests / elapsed))
+
+    print(f"\n{'clients':>8} {'req/s':>8} {'speedup':>8}")
+    print(f"{'sync':>8} {sync_rps:>8.2f} {1.0:>8.2f}")
+    for clients, rps in results:
+        print(f"{clients:>8} {rps:>8.2f} {rps / sync_rps:>8.2f}")
+
+if __name__ == "__main__":
+    main()
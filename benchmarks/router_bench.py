@@ -0,0 +1,91 @@
+import argparse
+import time
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.agents.router import RouterAgent
+from app.core.embeddings import CachedEmbeddings
+from benchmarks.stubs import stub_router_llm
+
+# Usage: python -m benchmarks.router_bench            (needs Ollama for the LLM + embeddings)
+#        python -m benchmarks.router_bench --stub     (offline smoke run, agreement is meaningless)
+# Reports per-query routing latency of the tiered router vs. the LLM-only router, which tier
+# answered, and how often the two agree (and match the labels below).
+
+LABELED_QUERIES = [
+    ("How do I reset the Wi-Fi?", "vector_store"),
+    ("What does the purple light mean?", "vector_store"),
+    ("Can I get my money back after 30 days?", "vector_store"),
+    ("What is error code E-505?", "vector_store"),
+    ("How do I clean the filter?", "vector_store"),
+    ("Is there a warranty on refurbished units?", "vector_store"),
+    ("What should I do if the device overheats?", "vector_store"),
+    ("How are refunds processed?", "vector_store"),
+    # Policy questions that mention orders, items or amounts (once misrouted by the rules tier)
+    ("How many days do I have to return my order?", "vector_store"),
+    ("What is the maximum refund amount?", "vector_store"),
+    ("How many items can I return at once?", "vector_store"),
+    ("What is the minimum order amount for free shipping?", "vector_store"),
+    ("How many orders can I place per day?", "vector_store"),
+    ("How many orders are in the database?", "structured_query"),
+    ("List all orders with status 'Shipped'.", "structured_query"),
+    ("What is the total value of all orders?", "structured_query"),
+    ("What's the average order price?", "structured_query"),
+    ("How many pending orders do we have?", "structured_query"),
+    ("Which product has the highest sales?", "structured_query"),
+    ("Count the cancelled orders", "structured_query"),
+    ("Show me all orders over $100", "structured_query"),
+    ("Hello!", "general_chat"),
+    ("Hey, thanks a lot", "general_chat"),
+    ("Who are you?", "general_chat"),
+    ("Good evening", "general_chat"),
+    ("What can you help me with?", "general_chat"),
+    ("Bye!", "general_chat"),
+]
+
+def run(router, queries):
+    results = []
+    for question, label in queries:
+        start = time.perf_counter()
+        decision = router.route(question)
+        results.append((question, label, decision.get("datasource"), decision.get("tier", "llm"),
+                        (time.perf_counter() - start) * 1000))
+    return results
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiered router vs. LLM router: latency and agreement")
+    parser.add_argument("--stub", action="store_true", help="Use stub LLM/embeddings (no Ollama)")
+    args = parser.parse_args()
+
+    if args.stub:
+        llm, embeddings = stub_router_llm(latency=0.3), DeterministicFakeEmbedding(size=64)
+    else:
+        llm, embeddings = None, CachedEmbeddings(cache_path=None)
+
+    llm_router = RouterAgent(llm=llm, fast_path=False)
+    tiered_router = RouterAgent(llm=llm, embeddings=embeddings)
+    tiered_router.route("warm up") # Embed the centroid seed questions outside the timed loop
+
+    llm_results = run(llm_router, LABELED_QUERIES)
+    tiered_results = run(tiered_router, LABELED_QUERIES)
+
+    print(f"\n{'question':<45} {'label':<17} {'llm':<17} {'tiered':<17} {'tier':<9} {'ms':>7}")
+    for (question, label, llm_route, _, _), (_, _, route, tier, ms) in zip(llm_results, tiered_results):
+        print(f"{question[:44]:<45} {label:<17} {str(llm_route):<17} {str(route):<17} {tier:<9} {ms:>7.1f}")
+
+    n = len(LABELED_QUERIES)
+    agreement = sum(a[2] == b[2] for a, b in zip(llm_results, tiered_results)) / n
+    for name, results in (("llm", llm_results), ("tiered", tiered_results)):
+        latencies = [r[4] for r in results]
+        accuracy = sum(r[1] == r[2] for r in results) / n
+        print(f"{name:<7} p50 {percentile(latencies, 50):7.1f} ms  p95 {percentile(latencies, 95):7.1f} ms  "
+              f"accuracy {accuracy:.0%}")
+    tiers = {}
+    for r in tiered_results:
+        tiers[r[3]] = tiers.get(r[3], 0) + 1
+    print(f"tiered/llm agreement {agreement:.0%}, tiers used: {tiers}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import multiprocessing
+import os
+import pickle
+import random
+import resource
+import tempfile
+import time
+from langchain_core.documents import Document
+from app.index.sparse import SparseIndex, build_sparse_index
+
+# Usage: python -m benchmarks.sparse_index_bench --sizes 1000 10000 100000
+# Cold start and memory of the old chunks.pkl + BM25Retriever path vs. the memory-mapped
+# sparse index. Each load runs in a fresh process so RSS numbers are not polluted.
+
+WORDS = ("refund policy amber light blinking error code reset router wifi warranty shipping order "
+         "return damaged device filter overheats power cable firmware update account invoice").split()
+
+def synthetic_corpus(size, seed=7):
+    rng = random.Random(seed)
+    return [Document(page_content=" ".join(rng.choice(WORDS) for _ in range(60)) + f" E{i}",
+                     metadata={"source": f"doc_{i % 50}.txt", "type": "text", "chunk_id": str(i)})
+            for i in range(size)]
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # Linux reports KiB
+
+def load_pickle_bm25(path, queue):
+    from langchain_community.retrievers import BM25Retriever
+    base = rss_mb()
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        chunks = pickle.load(f)
+    retriever = BM25Retriever.from_documents(chunks, k=5)
+    load = time.perf_counter() - start
+    start = time.perf_counter()
+    for word in WORDS:
+        retriever.invoke(f"{word} error code")
+    queue.put((load, (time.perf_counter() - start) / len(WORDS), rss_mb() - base))
+
+def load_sparse(path, queue):
+    base = rss_mb()
+    start = time.perf_counter()
+    index = SparseIndex(path)
+    load = time.perf_counter() - start
+    start = time.perf_counter()
+    for word in WORDS:
+        [index.document(doc_id) for doc_id, _ in index.search(f"{word} error code", 5)]
+    queue.put((load, (time.perf_counter() - start) / len(WORDS), rss_mb() - base))
+
+def measure(target, path):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=(path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="chunks.pkl + BM25Retriever vs. mmap sparse index")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    print(f"{'chunks':>8} {'backend':<14} {'build s':>8} {'load ms':>9} {'query ms':>9} {'RSS MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            docs = synthetic_corpus(size)
+            pickle_path = os.path.join(tmp, f"chunks_{size}.pkl")
+            with open(pickle_path, "wb") as f:
+                pickle.dump(docs, f)
+            index_dir = os.path.join(tmp, f"sparse_{size}")
+            start = time.perf_counter()
+            build_sparse_index(docs, index_dir)
+            build = time.perf_counter() - start
+
+            for name, target, path, build_s in (("pickle+bm25", load_pickle_bm25, pickle_path, 0.0),
+                                                ("sparse-mmap", load_sparse, index_dir, build)):
+                load, query, rss = measure(target, path)
+                print(f"{size:>8} {name:<14} {build_s:>8.2f} {load * 1000:>9.1f} {query * 1000:>9.2f} {rss:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableLambda
+from app.agents.answer import AnswerAgent
+from app.agents.retrieval import RetrievalAgent
+from app.agents.router import RouterAgent
+from app.agents.sql_agent import SQLAgent
+from app.core.config import config
+from app.workflow.builder import build_graph
+from app.workflow.speculation import SpeculativeRetrieval
+from benchmarks.stubs import StubChatModel, stub_vector_store
+
+# Usage: python -m benchmarks.speculation_bench --router-latency 0.4 --embed-latency 0.15 --retrieval-share 0.8
+# End-to-end latency of the async graph with and without speculative retrieval, on a mix of questions
+# where --retrieval-share of them route to vector_store and the rest to structured_query / general_chat.
+# Reports p50 per route, the retrieval time saved, and the time spent on searches that were thrown away.
+
+class SlowEmbeddings(DeterministicFakeEmbedding):
+    # Stands in for the Ollama round trip of the query embedding
+    latency: float = 0.1
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(self.latency)
+        return self.embed_query(text)
+
+def router_llm(latency):
+    # LLM router stand-in: the route is encoded in the question ("[sql] ...", "[chat] ...")
+    async def route(prompt):
+        await asyncio.sleep(latency)
+        question = prompt.to_messages()[-1].content
+        datasource = ("structured_query" if question.startswith("[sql]") else
+                      "general_chat" if question.startswith("[chat]") else "vector_store")
+        return json.dumps({"datasource": datasource, "reasoning": "stub"})
+    return RunnableLambda(lambda prompt: asyncio.run(route(prompt)), afunc=route)
+
+def questions(count, retrieval_share, seed=3):
+    rng = np.random.default_rng(seed)
+    mix = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < retrieval_share:
+            mix.append(("vector_store", f"How do I fix error E{i} on the amber light?"))
+        elif roll < retrieval_share + (1 - retrieval_share) / 2:
+            mix.append(("structured_query", f"[sql] How many orders does customer {i} have?"))
+        else:
+            mix.append(("general_chat", f"[chat] Hello number {i}"))
+    return mix
+
+async def run(graph, mix):
+    latencies = {}
+    for route, question in mix:
+        start = time.perf_counter()
+        await graph.ainvoke({"question": question})
+        latencies.setdefault(route, []).append(time.perf_counter() - start)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Speculative retrieval during routing")
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--router-latency", type=float, default=0.4)
+    parser.add_argument("--embed-latency", type=float, default=0.15)
+    parser.add_argument("--answer-latency", type=float, default=0.2)
+    parser.add_argument("--retrieval-share", type=float, default=0.8)
+    args = parser.parse_args()
+
+    _, store = stub_vector_store()
+    embeddings = SlowEmbeddings(size=64, latency=args.embed_latency)
+    store.embedding = embeddings
+    config.ROUTER_FAST_PATH_ENABLED = False # Every question pays for the LLM router
+    retriever = RetrievalAgent(embeddings=embeddings, vector_store=store)
+    agents = (RouterAgent(llm=router_llm(args.router_latency), fast_path=False), retriever,
+              AnswerAgent(llm=StubChatModel(latency=args.answer_latency)),
+              SQLAgent(llm=StubChatModel(latency=args.answer_latency), db_uri="sqlite://"))
+    mix = questions(args.queries, args.retrieval_share)
+    speculation = SpeculativeRetrieval(retriever)
+    results = {
+        "sequential": asyncio.run(run(build_graph(*agents), mix)),
+        "speculative": asyncio.run(run(build_graph(*agents, speculation=speculation), mix)),
+    }
+
+    print(f"{args.queries} questions, {args.retrieval_share:.0%} retrieval; router {args.router_latency * 1000:.0f} ms, "
+          f"query embedding {args.embed_latency * 1000:.0f} ms\n")
+    print(f"{'mode':<12} {'route':<17} {'n':>4} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode, latencies in results.items():
+        for route, samples in sorted(latencies.items()):
+            p50, p95 = np.percentile(np.asarray(samples) * 1000, [50, 95])
+            print(f"{mode:<12} {route:<17} {len(samples):>4} {p50:>8.1f} {p95:>8.1f}")
+    stats = speculation.stats()
+    print(f"\nSpeculative searches: {stats['started']} started, {stats['used']} used, "
+          f"{stats['cancelled']} cancelled, {stats['discarded']} discarded")
+    print(f"Retrieval time saved: {stats['saved_ms']:.0f} ms total "
+          f"({stats['saved_ms'] / max(stats['used'], 1):.0f} ms per retrieval question)")
+    print(f"Wasted retrieval time: {stats['wasted_ms']:.0f} ms total "
+          f"({stats['wasted_ms'] / max(stats['cancelled'] + stats['discarded'], 1):.0f} ms per cancelled search)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import subprocess
+import sys
+import time
+from fastapi.testclient import TestClient
+from app.workflow.registry import AgentRegistry
+from benchmarks.stubs import stub_agents
+
+# Usage: python -m benchmarks.startup_bench
+# Measures (1) the cost of importing the API module, which no longer builds any agent,
+# (2) how long the lifespan takes to report ready with stub backends, and the per-component timings.
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.api.server; print(time.perf_counter() - t)"
+
+def main():
+    parser = argparse.ArgumentParser(description="API import time and time-to-ready")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    imports = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-W", "ignore", "-c", IMPORT_SNIPPET],
+                             capture_output=True, text=True, check=True)
+        imports.append(float(out.stdout.strip().splitlines()[-1]))
+    print(f"import app.api.server: {min(imports) * 1000:.0f} ms (best of {args.runs})")
+
+    import app.api.server as server
+    server.registry = AgentRegistry(build_agents=stub_agents)
+    start = time.perf_counter()
+    with TestClient(server.app) as client:
+        accepting = time.perf_counter() - start
+        while client.get("/health/ready").status_code != 200:
+            time.sleep(0.01)
+        ready = time.perf_counter() - start
+        status = client.get("/health/ready").json()
+    print(f"accepting requests after {accepting * 1000:.0f} ms, ready after {ready * 1000:.0f} ms")
+    print(f"component timings (s): {status['timings']}")
+
+if __name__ == "__main__":
+    main()
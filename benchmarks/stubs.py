@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import InMemoryVectorStore
+
+# Local stand-ins for Ollama and Milvus so benchmarks run offline and deterministically
+
+class StubChatModel(BaseChatModel):
+    response: str = "Stub answer."
+    latency: float = 0.2 # Seconds before the first token, simulating prompt processing
+    token_latency: float = 0.0 # Seconds per generated word
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _tokens(self):
+        words = self.response.split(" ")
+        return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency + self.token_latency * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency + self.token_latency * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for token in self._tokens():
+            await asyncio.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+def stub_router_llm(datasource="vector_store", latency=0.05):
+    return StubChatModel(response=f'{{"datasource": "{datasource}", "reasoning": "stub"}}', latency=latency)
+
+def stub_vector_store(num_docs=200, dim=64):
+    embeddings = DeterministicFakeEmbedding(size=dim)
+    store = InMemoryVectorStore(embeddings)
+    store.add_documents([
+        Document(page_content=f"Support article {i}: the amber light blinks when error E{i % 50} occurs.",
+                 metadata={"source": f"doc_{i % 10}.txt", "type": "text"})
+        for i in range(num_docs)
+    ])
+    return embeddings, store
+
+class StubRetriever(BaseRetriever):
+    # Returns fixed documents after a delay; fail=True raises instead
+    documents: list = []
+    latency: float = 0.05
+    fail: bool = False
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("stub retriever failure")
+        return list(self.documents)
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None):
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("stub retriever failure")
+        return list(self.documents)
+
+def stub_vector(text, dim=64):
+    # Deterministic pseudo-embedding derived from the text hash
+    digest = hashlib.sha256(text.encode()).digest()
+    return [((digest[i % len(digest)] + i) % 255) / 255.0 for i in range(dim)]
+
+def bow_vector(text, dim=256):
+    # Feature-hashed bag of words: texts sharing words get similar vectors, so dense recall means something
+    vector = [0.0] * dim
+    for token in re.findall(r"\w+", text.lower()):
+        digest = hashlib.md5(token.encode()).digest()
+        vector[int.from_bytes(digest[:4], "little") % dim] += 1.0 if digest[4] & 1 else -1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+class StubEmbeddingServer:
+    """Ollama-compatible /api/embed (batched) and /api/embeddings (single) endpoints on localhost,
+    with a fixed per-request latency plus a per-text cost."""
+
+    def __init__(self, request_latency=0.02, per_text_latency=0.001, dim=64, port=0, vectorizer=stub_vector):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path == "/api/embed":
+                    texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                    payload = {"embeddings": [vectorizer(t, stub.dim) for t in texts]}
+                else:
+                    texts = [body["prompt"]]
+                    payload = {"embedding": vectorizer(body["prompt"], stub.dim)}
+                stub.requests += 1
+                time.sleep(stub.request_latency + stub.per_text_latency * len(texts))
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.request_latency = request_latency
+        self.per_text_latency = per_text_latency
+        self.dim = dim
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def stub_agents(registry=None, router_latency=0.05, answer_latency=0.2, num_docs=200):
+    # Drop-in for AgentRegistry(build_agents=...) / build_graph(*stub_agents()) with no Ollama or Milvus
+    from app.agents.answer import AnswerAgent
+    from app.agents.rerank import RerankAgent
+    from app.agents.retrieval import RetrievalAgent
+    from app.agents.router import RouterAgent
+    from app.agents.sql_agent import SQLAgent
+    embeddings, store = stub_vector_store(num_docs)
+    return (
+        RouterAgent(llm=stub_router_llm(latency=router_latency)),
+        RetrievalAgent(embeddings=embeddings, vector_store=store),
+        AnswerAgent(llm=StubChatModel(latency=answer_latency)),
+        SQLAgent(llm=StubChatModel(latency=answer_latency), db_uri="sqlite://"),
+        RerankAgent(embeddings=embeddings),
+    )
@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import time
+from app.agents.answer import AnswerAgent
+from app.agents.retrieval import RetrievalAgent
+from app.agents.router import RouterAgent
+from app.agents.sql_agent import SQLAgent
+from app.workflow.builder import build_graph
+from benchmarks.stubs import StubChatModel, stub_router_llm, stub_vector_store
+
+# Usage: python -m benchmarks.ttft --words 120 --token-latency 0.02
+# Compares time-to-first-token of the blocking path (ainvoke, what /query does) against the
+# streaming path used by /query/stream.
+
+async def measure(graph, question, runs):
+    blocking, streaming, total = [], [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await graph.ainvoke({"question": question})
+        blocking.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        first = None
+        async for mode, chunk in graph.astream({"question": question}, stream_mode=["updates", "custom"]):
+            if mode == "custom" and first is None:
+                first = time.perf_counter() - start
+        streaming.append(first)
+        total.append(time.perf_counter() - start)
+    return blocking, streaming, total
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-first-token: blocking vs streaming answers")
+    parser.add_argument("--words", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub prompt-processing time (s)")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Stub time per word (s)")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    embeddings, store = stub_vector_store()
+    answer_llm = StubChatModel(
+        response=" ".join(["word"] * args.words), latency=args.latency, token_latency=args.token_latency
+    )
+    graph = build_graph(
+        RouterAgent(llm=stub_router_llm()),
+        RetrievalAgent(embeddings=embeddings, vector_store=store),
+        AnswerAgent(llm=answer_llm),
+        SQLAgent(llm=answer_llm, db_uri="sqlite://"),
+    )
+
+    blocking, streaming, total = asyncio.run(measure(graph, "What does a blinking amber light mean?", args.runs))
+    avg = lambda xs: sum(xs) / len(xs) * 1000
+    print(f"\nblocking  first byte: {avg(blocking):8.1f} ms")
+    print(f"streaming first token: {avg(streaming):8.1f} ms (full answer {avg(total):.1f} ms)")
+
+if __name__ == "__main__":
+    main()
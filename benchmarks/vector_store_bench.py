@@ -0,0 +1,148 @@
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import numpy as np
+from app.core.config import config
+from app.index.dense import DenseIndex, EmbeddedVectorStore, build_dense_index
+from app.index.milvus import index_params, search_params
+
+# Usage: python -m benchmarks.vector_store_bench --sizes 10000 100000 --dim 768
+#        python -m benchmarks.vector_store_bench --milvus --milvus-index HNSW IVF_FLAT IVF_PQ   (also a running Milvus)
+# Embedded index variants (flat float32 / float16, IVF, HNSW if hnswlib is installed) vs. Milvus:
+# build time, load time, query p50/p95, recall@k against exact search, RSS and size on disk.
+# Embedded loads run in a fresh process so RSS numbers are not polluted; Milvus memory lives in its
+# own server process (see `docker stats`), so only the client side is reported for it.
+
+def clustered_vectors(size, dim, seed=7):
+    # Real embeddings are clustered; uniform random vectors would make every ANN index look bad
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(size // 500, 8), dim))
+    vectors = centers[rng.integers(0, len(centers), size)] + 0.5 * rng.normal(size=(size, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def queries_for(vectors, count, seed=11):
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), count, replace=False)]
+    return (picked + 0.1 * rng.normal(size=picked.shape) / np.sqrt(vectors.shape[1])).astype(np.float32)
+
+def exact_top_k(vectors, queries, k):
+    return [set(np.argsort(-(vectors @ q))[:k]) for q in queries]
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # Linux reports KiB
+
+def disk_mb(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2**20
+
+def percentiles(samples):
+    return np.percentile(np.asarray(samples) * 1000, [50, 95])
+
+def query_embedded(index_dir, queries, k, nprobe, queue):
+    base = rss_mb()
+    start = time.perf_counter()
+    index = DenseIndex(index_dir)
+    load = time.perf_counter() - start
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        hits = index.search(q, k, nprobe=nprobe)
+        latencies.append(time.perf_counter() - start)
+        results.append({row for row, _ in hits})
+    queue.put((load, latencies, results, rss_mb() - base))
+
+def measure(index_dir, queries, k, nprobe):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=query_embedded, args=(index_dir, queries, k, nprobe, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def build_embedded(vectors, index_dir, dtype, index_type):
+    store = EmbeddedVectorStore(None, index_dir=index_dir, drop_old=True)
+    start = time.perf_counter()
+    for i in range(0, len(vectors), config.INGEST_BATCH_SIZE):
+        batch = vectors[i:i + config.INGEST_BATCH_SIZE]
+        rows = range(i, i + len(batch))
+        store.add_embeddings([f"chunk {row}" for row in rows], batch, [{"type": "text"} for _ in rows],
+                             [str(row) for row in rows])
+    build_dense_index(index_dir, store.staging_dir, dtype=dtype, index_type=index_type)
+    return time.perf_counter() - start
+
+def run_milvus(vectors, queries, k, index_type):
+    from pymilvus import MilvusClient
+    client = MilvusClient(uri=f"http://{config.MILVUS_HOST}:{config.MILVUS_PORT}")
+    name = "vector_store_bench"
+    if client.has_collection(name):
+        client.drop_collection(name)
+    start = time.perf_counter()
+    params = index_params(index_type)
+    milvus_index = client.prepare_index_params()
+    milvus_index.add_index(field_name="vector", **params)
+    client.create_collection(name, dimension=vectors.shape[1], metric_type=params["metric_type"], index_params=milvus_index)
+    for i in range(0, len(vectors), config.INGEST_BATCH_SIZE):
+        client.insert(name, [{"id": i + j, "vector": v.tolist()} for j, v in enumerate(vectors[i:i + config.INGEST_BATCH_SIZE])])
+    client.flush(name)
+    client.load_collection(name)
+    build = time.perf_counter() - start
+    base = rss_mb()
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        hits = client.search(name, data=[q.tolist()], limit=k, search_params=search_params(index_type))
+        latencies.append(time.perf_counter() - start)
+        results.append({hit["id"] for hit in hits[0]})
+    client.drop_collection(name)
+    return build, latencies, results, rss_mb() - base
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedded vector index vs. Milvus")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=768) # nomic-embed-text
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=config.EMBEDDED_IVF_NPROBE)
+    parser.add_argument("--milvus", action="store_true", help=f"Also benchmark Milvus at {config.MILVUS_HOST}:{config.MILVUS_PORT}")
+    parser.add_argument("--milvus-index", nargs="+", default=[config.MILVUS_INDEX_TYPE],
+                        choices=["HNSW", "IVF_FLAT", "IVF_PQ", "AUTOINDEX"], help="Milvus index types to compare")
+    args = parser.parse_args()
+
+    config.EMBEDDED_ANN_MIN_ROWS = 0 # Build the requested index type at every size
+    variants = [("flat-f32", "float32", "flat"), ("flat-f16", "float16", "flat"),
+                ("ivf-f16", "float16", "ivf"), ("hnsw-f32", "float32", "hnsw")]
+    print(f"dim={args.dim}, {args.queries} queries, recall@{args.k} vs. exact search\n")
+    print(f"{'vectors':>8} {'backend':<10} {'build s':>8} {'load ms':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'recall':>7} {'RSS MB':>8} {'disk MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            vectors = clustered_vectors(size, args.dim)
+            queries = queries_for(vectors, args.queries)
+            truth = exact_top_k(vectors, queries, args.k)
+            recall = lambda results: np.mean([len(r & t) / args.k for r, t in zip(results, truth)])
+            for name, dtype, index_type in variants:
+                index_dir = os.path.join(tmp, f"{name}_{size}")
+                build = build_embedded(vectors, index_dir, dtype, index_type)
+                built = DenseIndex(index_dir).index_type
+                if built != index_type:
+                    print(f"{size:>8} {name:<10} skipped (built '{built}' instead, is hnswlib installed?)")
+                    continue
+                load, latencies, results, rss = measure(index_dir, queries, args.k, args.nprobe)
+                p50, p95 = percentiles(latencies)
+                print(f"{size:>8} {name:<10} {build:>8.2f} {load * 1000:>8.1f} {p50:>8.2f} {p95:>8.2f} "
+                      f"{recall(results):>7.3f} {rss:>8.1f} {disk_mb(index_dir):>8.1f}")
+            for index_type in args.milvus_index if args.milvus else []:
+                label = f"milvus-{index_type.lower()}"
+                try:
+                    build, latencies, results, rss = run_milvus(vectors, queries, args.k, index_type)
+                except Exception as e:
+                    print(f"{size:>8} {label:<10} failed: {e}")
+                    continue
+                p50, p95 = percentiles(latencies)
+                print(f"{size:>8} {label:<10} {build:>8.2f} {'-':>8} {p50:>8.2f} {p95:>8.2f} "
+                      f"{recall(results):>7.3f} {rss:>8.1f} {'server':>8}")
+
+if __name__ == "__main__":
+    main()